@@ -1,10 +1,13 @@
 import logging, json, re
-from typing import Dict, Any, List
-from langchain_core.messages import HumanMessage
-from config.llmProvider import gemini_flash_llm
-from config.config import LLM_API_KEY
-from google import genai
-client = genai.Client(api_key=LLM_API_KEY)
+from typing import Dict, Any, List, Optional
+from config.llmProvider import image_part
+from utils.image_prep import get_model_image
+from utils.derived_cache import cached_llm_text
+from utils.telemetry import traced
+from utils.task_specificity import is_fully_specified, synthesize_task_description
+from utils.metrics import observe_direct_task
+from utils.layout_analysis import cleanup_tasks
+from utils import model_router, llm_transport
 
 CLEANUP_TASK_DESCRIPTION_PROMPT  = """
     You are an expert AI assistant acting as a bridge between a parsed user request and a PowerPoint code generator.
@@ -12,12 +15,9 @@ CLEANUP_TASK_DESCRIPTION_PROMPT  = """
     This description will guide the subsequent code generation step, focusing on improving layout, alignment, spacing, consistency, and ensuring all elements fit within the slide boundaries without drastic repositioning or deletion.
     
     **Input:**
-    Original User instruction: {original_instruction}
     Slide Number: {slide_number}
-    action: {action} # The initial classification of the user's intent
-    target_element_hint: {target_element_hint} # Hint for target elements, if any
-    params: {params} # Specific parameters from initial parsing
     Slide Context: slide_xml_structure: {slide_xml_structure} # XML structure for element identification
+    The sub-task to describe (Original User instruction, action, target_element_hint, params) follows after the slide image.
         
     **## Your Task (Conditional Analysis and Description Generation):**
 
@@ -91,7 +91,50 @@ CLEANUP_TASK_DESCRIPTION_PROMPT  = """
     }}
     """
 
-def cleanup_agent(classified_instruction: Dict[str, Any], slide_context: Dict[str, Any]) -> list[Dict[str, Any]]:
+CLEANUP_SUB_TASK_PROMPT = """
+    **Sub-task:**
+    Original User instruction: {original_instruction}
+    action: {action} # The initial classification of the user's intent
+    target_element_hint: {target_element_hint} # Hint for target elements, if any
+    params: {params} # Specific parameters from initial parsing
+"""
+
+# Narrow follow-up for general cleanups served from the layout analysis: only what geometry cannot measure
+CLEANUP_VISUAL_CHECK_PROMPT = """
+    You are reviewing slide {slide_number} (image below) for a cleanup request: "{original_instruction}".
+    Alignment, equal sizes, even spacing and elements extending past the slide edges are already handled; ignore them.
+    Look only for (1) text that overflows or is clipped by its box and (2) clutter such as overlapping elements.
+    For each problem you find, describe the fix in the same JSON shape as below; return an empty list if there is none.
+    {{"expanded_tasks": [{{"task_description": "...", "action": "fit_text" | "resolve_overlaps", "target_element_hint": "...", "params": {{}}}}]}}
+"""
+
+# Output A or B; anything else is retried on the full model
+_VALID_OUTPUT = model_router.has_json_keys("task_description", "expanded_tasks")
+_VALID_VISUAL_CHECK = model_router.has_json_keys("expanded_tasks")
+
+def _visual_check_tasks(slide_context: Dict[str, Any], slide_number: Any, original_instruction: str) -> List[Dict[str, Any]]:
+    """Text-overflow and clutter tasks from the image, for a slide whose geometric issues were precomputed."""
+    prompt = CLEANUP_VISUAL_CHECK_PROMPT.format(slide_number=slide_number, original_instruction=original_instruction)
+    model_image_bytes, model_image_mime = get_model_image(slide_context)
+    image = image_part(data=model_image_bytes, mime_type=model_image_mime)
+    try:
+        response_text = cached_llm_text(
+            slide_context, "cleanup_visual", [prompt, image],
+            lambda: model_router.generate_content([prompt, image], "cleanup_visual", _VALID_VISUAL_CHECK),
+            _VALID_VISUAL_CHECK
+        )
+        json_match = re.search(r'(\{[\s\S]*\})', response_text)
+        expanded_tasks = json.loads(json_match.group(0)).get("expanded_tasks", []) if json_match else []
+    except llm_transport.CallAbandoned:
+        raise
+    except Exception as e:
+        logging.warning(f"Cleanup visual check failed for slide {slide_number}, keeping the measured tasks only: {e}")
+        return []
+    return [task for task in expanded_tasks if isinstance(task, dict) and isinstance(task.get("task_description"), str)]
+
+@traced("agent.cleanup")
+def cleanup_agent(classified_instruction: Dict[str, Any], slide_context: Dict[str, Any],
+                  layout_analysis: Optional[Dict[str, Any]] = None) -> list[Dict[str, Any]]:
     processed_subtasks = []
     slide_number = classified_instruction.get("slide_number")
     original_instruction = classified_instruction.get("original_instruction", "")
@@ -110,6 +153,33 @@ def cleanup_agent(classified_instruction: Dict[str, Any], slide_context: Dict[st
             logging.warning(f"Skipping sub-task with no action: {sub_task} in instruction: '{original_instruction}'")
             continue
 
+        if is_fully_specified(action, target_hint, params):
+            # Nothing for the agent to work out; the refiner resolves the target on the slide
+            observe_direct_task("cleanup")
+            processed_subtasks.append({
+                "agent_name": "cleanup",
+                "slide_number": slide_number,
+                "original_instruction": original_instruction,
+                "task_description": synthesize_task_description(action, target_hint, params, slide_number, original_instruction),
+                "action": action,
+                "target_element_hint": target_hint,
+                "params": params
+            })
+            continue
+
+        measured = cleanup_tasks(layout_analysis) if layout_analysis and action.startswith("general_") else []
+        if measured:
+            # General cleanup served from the layout analysis precomputed at upload time, plus a
+            # narrow image check for what geometry cannot see instead of the full agent call
+            observe_direct_task("cleanup_layout")
+            processed_subtasks.extend({
+                "agent_name": "cleanup",
+                "slide_number": slide_number,
+                "original_instruction": original_instruction,
+                **expanded_task
+            } for expanded_task in measured + _visual_check_tasks(slide_context, slide_number, original_instruction))
+            continue
+
         slide_xml = slide_context.get("slide_xml_structure", "")
         slide_image_base64 = slide_context.get("slide_image_base64", "")
         slide_image_bytes = slide_context.get("slide_image_bytes", "")
@@ -117,25 +187,32 @@ def cleanup_agent(classified_instruction: Dict[str, Any], slide_context: Dict[st
         final_prompt = []
 
         main_prompt = CLEANUP_TASK_DESCRIPTION_PROMPT.format(
-            original_instruction=original_instruction,
             slide_number=slide_number,
+            slide_xml_structure=slide_xml,
+        )
+        sub_task_prompt = CLEANUP_SUB_TASK_PROMPT.format(
+            original_instruction=original_instruction,
             action=action,
             target_element_hint=target_hint,
             params=json.dumps(params),
-            slide_xml_structure=slide_xml,
         )
         final_prompt.append(main_prompt) 
 
         slide_image_text_prompt ="The below is the image of the slide. Please also use this as a reference to generate the description. Analyse what text, images, shapes, other elements, structure and layout are currently present on the slide"
         
         final_prompt.append(slide_image_text_prompt)
-        image = genai.types.Part.from_bytes(data=slide_image_bytes, mime_type="image/png") 
+        model_image_bytes, model_image_mime = get_model_image(slide_context)
+        image = image_part(data=model_image_bytes, mime_type=model_image_mime)
 
         try:
-            response = client.models.generate_content(model="gemini-2.0-flash", contents=[final_prompt, image])
-            logging.info(f"LLM cleanup_agent response: {response.text}")
+            response_text = cached_llm_text(
+                slide_context, "cleanup", [*final_prompt, image, sub_task_prompt],
+                lambda: model_router.generate_content([sub_task_prompt], "cleanup", _VALID_OUTPUT, prefix=[*final_prompt, image]),
+                _VALID_OUTPUT
+            )
+            logging.info(f"LLM cleanup_agent response: {response_text}")
             
-            json_match = re.search(r'(\{[\s\S]*\})', response.text)
+            json_match = re.search(r'(\{[\s\S]*\})', response_text)
             
             if json_match:
                 json_str = json_match.group(0)
@@ -186,7 +263,7 @@ def cleanup_agent(classified_instruction: Dict[str, Any], slide_context: Dict[st
                             "agent_name": "cleanup",
                             "slide_number": slide_number,
                             "original_instruction": original_instruction,
-                            "task_description": f"Parsing error: Unexpected JSON format. Raw response: {response.text[:100]}...", 
+                            "task_description": f"Parsing error: Unexpected JSON format. Raw response: {response_text[:100]}...", 
                             "action": action,
                             "target_element_hint": target_hint,
                             "params": params
@@ -206,7 +283,7 @@ def cleanup_agent(classified_instruction: Dict[str, Any], slide_context: Dict[st
                     }
                     processed_subtasks.append(flattened_task)
             else:
-                logging.warning(f"No JSON found in LLM response: {response.text[:100]}...")
+                logging.warning(f"No JSON found in LLM response: {response_text[:100]}...")
                 flattened_task = {
                     "agent_name": "cleanup",
                     "slide_number": slide_number,
@@ -218,6 +295,8 @@ def cleanup_agent(classified_instruction: Dict[str, Any], slide_context: Dict[st
                 }
                 processed_subtasks.append(flattened_task)
                 
+        except llm_transport.CallAbandoned:
+            raise
         except Exception as e:
             logging.error(f"Error in cleanup agent: {e}")
             flattened_task = {
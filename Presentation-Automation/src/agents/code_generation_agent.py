@@ -1,19 +1,17 @@
 # code_generation_agent.py
 import asyncio
 import logging, re, aiofiles, os, json
-from typing import List 
-from config.config import LLM_API_KEY
-from google import genai
+from typing import List, Optional
 import google.api_core.exceptions
+from utils.workspace import Workspace
+from utils.telemetry import traced, llm_span, record_llm_response, set_span_attributes
+from utils import llm_transport, model_router
 
-client = genai.Client(api_key=LLM_API_KEY)
 log = logging.getLogger(__name__)
 
-REFINED_TASKS_DIR = "uploaded_pptx/slide_images/presentation"
-
 # --- Helper to load refined instructions from file ---
-async def _load_refined_tasks_from_file(slide_number: int) -> List[str]:
-    file_path = os.path.join(REFINED_TASKS_DIR, f"slide{slide_number}_refined_tasks.json")
+async def _load_refined_tasks_from_file(workspace: Workspace, slide_number: int) -> List[str]:
+    file_path = workspace.slide_file(slide_number, "_refined_tasks.json")
     if not os.path.exists(file_path):
         raise FileNotFoundError(f"Refined tasks file not found for slide {slide_number}")
     try:
@@ -118,20 +116,23 @@ CODE_GEN_PROMPT_TEMPLATE = """
 
 """
 
-async def generate_code(target_slide_index: int):
+def _looks_like_code(text: str) -> bool:
+    """Lite-model output worth keeping: Office.js with a sync, not the verification-failed marker."""
+    return "context.sync()" in text and not text.strip().startswith("// Error:")
+
+@traced("pipeline.codegen")
+async def generate_code(target_slide_index: int, workspace: Optional[Workspace] = None):
     """
     Loads refined instructions from file and generates Office.js code
     for a specific slide index. Now an async function.
     """
-    if client is None:
-        return {"error": "LLM client not available."}
-
+    set_span_attributes(slide=target_slide_index)
     log.info(f"--- Generating code for slide index: {target_slide_index} ---")
 
     # Load refined instructions
     refined_instructions: List[str] = []
     try:
-        refined_instructions = await _load_refined_tasks_from_file(target_slide_index)
+        refined_instructions = await _load_refined_tasks_from_file(workspace or Workspace(), target_slide_index)
         if not refined_instructions:
             log.warning(f"No refined instructions loaded for slide {target_slide_index}. Returning empty executable code.")
             return {"code": f"// No instructions to execute for slide {target_slide_index}."}
@@ -160,13 +161,20 @@ async def generate_code(target_slide_index: int):
     try:
         def sync_llm_call(model_name, contents_list):
             try:
-                return client.models.generate_content(model=model_name, contents=contents_list) 
+                with llm_span("llm.codegen", model_name, contents_list) as span:
+                    response = llm_transport.generate_content(model_name, contents_list, call_site="codegen")
+                    record_llm_response(span, response, getattr(response, "text", None))
+                    return response
             except Exception as llm_e:
                 log.error(f"Sync LLM call failed: {llm_e}")
                 raise llm_e
 
         log.info(f"Calling LLM for code generation (slide {target_slide_index})...")
-        response = await asyncio.to_thread(sync_llm_call, "gemini-2.0-flash", [prompt]) 
+        response = await asyncio.to_thread(
+            model_router.call_tiered, "codegen", [prompt],
+            lambda tier: sync_llm_call(model_router.MODELS[tier], [prompt]),
+            lambda response: _looks_like_code(getattr(response, "text", None) or ""),
+        )
 
         generated_code_str = response.text.strip() if response.text else ""
         log.info(f"Code Gen LLM Raw Response (slide {target_slide_index}): {generated_code_str}...")
@@ -1,9 +1,12 @@
 import logging, json, re
 from typing import Dict, Any
-from config.config import LLM_API_KEY
-from google import genai
-
-client = genai.Client(api_key=LLM_API_KEY)
+from config.llmProvider import image_part
+from utils.image_prep import get_model_image
+from utils.derived_cache import cached_llm_text
+from utils.telemetry import traced
+from utils.task_specificity import is_fully_specified, synthesize_task_description
+from utils.metrics import observe_direct_task
+from utils import model_router, llm_transport
 
 FORMATTING_TASK_DESCRIPTION_PROMPT  = """
     You are an expert AI assistant acting as a bridge between a parsed user request and a PowerPoint code generator. 
@@ -11,12 +14,9 @@ FORMATTING_TASK_DESCRIPTION_PROMPT  = """
     This description will guide the subsequent code generation step.
     
     **Input:**
-    Original User instruction: {original_instruction}
     Slide Number: {slide_number}
-    action: {action}
-    target_element_hint: {target_element_hint}  
-    params: {params}
     Slide XML Structure: {slide_xml_structure}
+    The sub-task to describe (Original User instruction, action, target_element_hint, params) follows after the slide image.
     
     
     **## Your Task (Conditional):**
@@ -83,6 +83,18 @@ FORMATTING_TASK_DESCRIPTION_PROMPT  = """
 
 """
 
+FORMATTING_SUB_TASK_PROMPT = """
+    **Sub-task:**
+    Original User instruction: {original_instruction}
+    action: {action}
+    target_element_hint: {target_element_hint}
+    params: {params}
+"""
+
+# Output A or B; anything else is retried on the full model
+_VALID_OUTPUT = model_router.has_json_keys("task_description", "expanded_tasks")
+
+@traced("agent.formatting")
 def formatting_agent(classified_instruction: Dict[str, Any], slide_context: Dict[str, Any]) -> list[Dict[str, Any]]:
     processed_subtasks = []
     slide_number = classified_instruction.get("slide_number")
@@ -102,6 +114,20 @@ def formatting_agent(classified_instruction: Dict[str, Any], slide_context: Dict
             logging.warning(f"Skipping sub-task with no action: {sub_task} in instruction: '{original_instruction}'")
             continue
 
+        if is_fully_specified(action, target_hint, params):
+            # Nothing for the agent to work out; the refiner resolves the target on the slide
+            observe_direct_task("formatting")
+            processed_subtasks.append({
+                "agent_name": "formatting",
+                "slide_number": slide_number,
+                "original_instruction": original_instruction,
+                "task_description": synthesize_task_description(action, target_hint, params, slide_number, original_instruction),
+                "action": action,
+                "target_element_hint": target_hint,
+                "params": params
+            })
+            continue
+
         slide_xml = slide_context.get("slide_xml_structure", "")
         slide_image_base64 = slide_context.get("slide_image_base64", "")
         slide_image_bytes = slide_context.get("slide_image_bytes", "")
@@ -109,25 +135,32 @@ def formatting_agent(classified_instruction: Dict[str, Any], slide_context: Dict
         final_prompt = []
 
         main_prompt = FORMATTING_TASK_DESCRIPTION_PROMPT.format(
-            original_instruction=original_instruction,
             slide_number=slide_number,
+            slide_xml_structure=slide_xml,
+        )
+        sub_task_prompt = FORMATTING_SUB_TASK_PROMPT.format(
+            original_instruction=original_instruction,
             action=action,
             target_element_hint=target_hint,
             params=json.dumps(params),
-            slide_xml_structure=slide_xml,
         )
         final_prompt.append(main_prompt) 
 
         slide_image_text_prompt ="The below is the image of the slide. Please also use this as a reference to generate the description. Analyse what text, images, shapes, other elements, structure and layout are currently present on the slide"
         
         final_prompt.append(slide_image_text_prompt)
-        image = genai.types.Part.from_bytes(data=slide_image_bytes, mime_type="image/png") 
+        model_image_bytes, model_image_mime = get_model_image(slide_context)
+        image = image_part(data=model_image_bytes, mime_type=model_image_mime)
       
         try:
-            response = client.models.generate_content(model="gemini-2.0-flash", contents=[final_prompt, image])
-            logging.info(f"LLM formatting agent response: {response.text}")
+            response_text = cached_llm_text(
+                slide_context, "formatting", [*final_prompt, image, sub_task_prompt],
+                lambda: model_router.generate_content([sub_task_prompt], "formatting", _VALID_OUTPUT, prefix=[*final_prompt, image]),
+                _VALID_OUTPUT
+            )
+            logging.info(f"LLM formatting agent response: {response_text}")
        
-            json_match = re.search(r'(\{[\s\S]*\})', response.text)
+            json_match = re.search(r'(\{[\s\S]*\})', response_text)
             
             if json_match:
                 json_str = json_match.group(0)
@@ -177,7 +210,7 @@ def formatting_agent(classified_instruction: Dict[str, Any], slide_context: Dict
                             "agent_name": "formatting",
                             "slide_number": slide_number,
                             "original_instruction": original_instruction,
-                            "task_description": f"Parsing error: Unexpected JSON format. Raw response: {response.text[:100]}...", 
+                            "task_description": f"Parsing error: Unexpected JSON format. Raw response: {response_text[:100]}...", 
                             "action": action,
                             "target_element_hint": target_hint,
                             "params": params
@@ -197,7 +230,7 @@ def formatting_agent(classified_instruction: Dict[str, Any], slide_context: Dict
                     }
                     processed_subtasks.append(flattened_task)
             else:
-                logging.warning(f"No JSON found in LLM response: {response.text[:100]}...")
+                logging.warning(f"No JSON found in LLM response: {response_text[:100]}...")
                 flattened_task = {
                     "agent_name": "formatting",
                     "slide_number": slide_number,
@@ -209,6 +242,8 @@ def formatting_agent(classified_instruction: Dict[str, Any], slide_context: Dict
                 }
                 processed_subtasks.append(flattened_task)
                 
+        except llm_transport.CallAbandoned:
+            raise
         except Exception as e:
             logging.error(f"Error in formatting agent: {e}")
             flattened_task = {
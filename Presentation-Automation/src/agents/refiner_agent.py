@@ -1,19 +1,52 @@
 # refiner_agent.py
-import logging, json, re, asyncio, os, copy, aiofiles
-from config.config import LLM_API_KEY
-from google import genai
+import logging, json, re, asyncio, os, aiofiles
+from config.llmProvider import image_part
 from typing import Dict, Any, List, Optional, Tuple
 import google.api_core.exceptions
-
-client = genai.Client(api_key=LLM_API_KEY)
+from utils.workspace import Workspace
+from utils.metadata_store import get_metadata_store
+from utils.shape_table import ShapeTable
+from utils.image_prep import get_model_image
+from utils.image_crops import get_region_crop
+from utils.set_of_marks import get_marked_image
+from utils.wireframe import render_wireframe, changed_shape_ids, wireframe_png
+from utils.slide_manifest import load_slide_size
+from utils.derived_cache import cached_llm_text
+from utils.telemetry import traced, set_span_attributes
+from utils.metrics import observe_refiner_image
+from utils import model_router
+from config.config import MODEL_IMAGE_GRAYSCALE_FOR_GEOMETRY, SET_OF_MARKS_ENABLED
 
 logger = logging.getLogger(__name__)
-REFINER_OUTPUT_DIR = "uploaded_pptx/slide_images/presentation" 
-METADATA_DIR = "uploaded_pptx/slide_images/metadata"
-TASKS_DIR = "uploaded_pptx/slide_images/presentation"
 
-def _load_nl_subtasks(slide_number: int) -> List[str]:
-    file_path = os.path.join(TASKS_DIR, f"slide{slide_number}_tasks.json")
+_TARGET_IDS_PATTERN = re.compile(r'\(ids?:\s*\[?([^)\]]*)\]?\)')
+
+def _target_ids(instruction: str, param_ids: List[Any], table: ShapeTable) -> List[str]:
+    """
+    Shape ids on the slide that the sub-task targets: its structured `params` ids (e.g. layout-analysis
+    tasks) or, failing those, ids the instruction names via `(id: N)` / `(ids: [N, M])`.
+    """
+    candidates = [str(shape_id) for shape_id in param_ids]
+    if not candidates:
+        for match in _TARGET_IDS_PATTERN.finditer(instruction):
+            candidates.extend(raw.strip().strip("'\"") for raw in match.group(1).split(","))
+    ids = []
+    for shape_id in candidates:
+        if shape_id in table.index and shape_id not in ids:
+            ids.append(shape_id)
+    return ids
+
+def _param_shape_ids(params: Any) -> List[Any]:
+    if not isinstance(params, dict):
+        return []
+    shape_ids = params.get("shape_ids", params.get("shape_id"))
+    if shape_ids is None:
+        return []
+    return shape_ids if isinstance(shape_ids, list) else [shape_ids]
+
+def _load_nl_subtasks(workspace: Workspace, slide_number: int) -> List[Tuple[str, List[Any]]]:
+    """(task_description, target shape ids from the task's params) per sub-task in the slide's _tasks.json."""
+    file_path = workspace.slide_file(slide_number, "_tasks.json")
     if not os.path.exists(file_path):
         raise FileNotFoundError(f"Task file not found for slide {slide_number} at {file_path}")
     try:
@@ -22,7 +55,7 @@ def _load_nl_subtasks(slide_number: int) -> List[str]:
         if not isinstance(tasks_data, list):
             raise ValueError(f"Invalid format in task file {file_path}: Expected a list.")
         instruction_list = [
-            task.get("task_description", str(task)) for task in tasks_data
+            (task["task_description"], _param_shape_ids(task.get("params"))) for task in tasks_data
             if isinstance(task.get("task_description"), str)
         ]
         if not instruction_list:
@@ -34,28 +67,36 @@ def _load_nl_subtasks(slide_number: int) -> List[str]:
         logger.error(f"Error loading NL tasks from {file_path}: {e}", exc_info=True)
         raise
     
-def _load_and_copy_metadata(slide_number: int) -> Tuple[Optional[List[Dict[str, Any]]], Optional[List[Dict[str, Any]]]]:
-    metadata_path = os.path.join(METADATA_DIR, f"metadata_{slide_number}.json")
-    if not os.path.exists(metadata_path):
-        logger.error(f"Metadata file not found for slide {slide_number} at {metadata_path}")
-        return None, None
+def _load_metadata_snapshot(workspace: Workspace, slide_number: int) -> Optional[ShapeTable]:
+    """
+    Returns a ShapeTable snapshot of the slide's shapes from the metadata store.
+    Slides only present as metadata_N.json (e.g. uploaded before the store existed) are imported first.
+    """
+    store = get_metadata_store()
     try:
-        with open(metadata_path, "r", encoding="utf-8") as f:
-            shapes = json.load(f)
-        if not isinstance(shapes, list):
-            raise ValueError("Metadata file does not contain a valid list.")
-        simulated_metadata = copy.deepcopy(shapes)
-        logger.info(f"Loaded and copied metadata for slide {slide_number}")
-        return shapes, simulated_metadata
+        if not store.has_slide(workspace.deck_id, slide_number):
+            metadata_path = workspace.metadata_file(slide_number)
+            if not os.path.exists(metadata_path):
+                logger.error(f"Metadata file not found for slide {slide_number} at {metadata_path}")
+                return None
+            with open(metadata_path, "r", encoding="utf-8") as f:
+                shapes = json.load(f)
+            if not isinstance(shapes, list):
+                raise ValueError("Metadata file does not contain a valid list.")
+            store.replace_slide(workspace.deck_id, slide_number, shapes)
+            logger.info(f"Imported {metadata_path} into the metadata store")
+        simulated_metadata = store.snapshot(workspace.deck_id, slide_number)
+        logger.info(f"Loaded metadata snapshot for slide {slide_number} ({len(simulated_metadata)} shapes)")
+        return simulated_metadata
     except json.JSONDecodeError as e:
-        logger.error(f"Invalid JSON in metadata file {metadata_path}: {e}")
-        return None, None
+        logger.error(f"Invalid JSON in metadata file for slide {slide_number}: {e}")
+        return None
     except Exception as e:
-        logger.error(f"Error loading metadata from {metadata_path}: {e}", exc_info=True)
-        return None, None
+        logger.error(f"Error loading metadata for slide {slide_number}: {e}", exc_info=True)
+        return None
 
 
-def _update_simulated_metadata(simulated_metadata: List[Dict[str, Any]], changes: Dict[str, Any]) -> bool:
+def _update_simulated_metadata(simulated_metadata: ShapeTable, changes: Dict[str, Any]) -> bool:
     if not changes or not simulated_metadata:
         return False
 
@@ -68,33 +109,36 @@ def _update_simulated_metadata(simulated_metadata: List[Dict[str, Any]], changes
         logger.warning(f"Invalid changes data for metadata update: {changes}")
         return False
 
-    shape_lookup = {str(shape.get("id", "")): shape for shape in simulated_metadata}
+    try:
+        new_value = float(value)
+    except (ValueError, TypeError) as e:
+        logger.error(f"Failed to apply update: Invalid value type '{value}' or conversion error for property '{prop}': {e}")
+        return False
 
+    valid_ids = []
     for target_id in target_ids:
-        shape = shape_lookup.get(target_id)
-        if shape:
-            if prop in shape:
-                try:
-                    current_value = shape[prop]
-                    new_value = float(value)  
-                    shape[prop] = new_value
-                    logger.debug(f"Simulated update: ID {target_id}, Property '{prop}', Value '{current_value}' -> '{new_value}'")
-                    updated_count += 1
-                except (ValueError, TypeError) as e:
-                    logger.error(f"Failed to apply update: Invalid value type '{value}' or conversion error for property '{prop}' on ID {target_id}: {e}")
-                except Exception as e:
-                    logger.error(f"Failed to apply update for ID {target_id}, property '{prop}': {e}")
-            else:
-                logger.warning(f"Property '{prop}' not found for shape ID {target_id} in simulated metadata.")
-        else:
+        if target_id not in simulated_metadata.index:
             logger.warning(f"Target shape ID {target_id} not found in simulated metadata lookup.")
+        elif not simulated_metadata.has(target_id, prop):
+            logger.warning(f"Property '{prop}' not found for shape ID {target_id} in simulated metadata.")
+        else:
+            valid_ids.append(target_id)
+
+    try:
+        updated_count = len(simulated_metadata.update(valid_ids, prop, new_value))
+        logger.debug(f"Simulated update: IDs {valid_ids}, Property '{prop}' -> '{new_value}'")
+    except Exception as e:
+        logger.error(f"Failed to apply update for IDs {valid_ids}, property '{prop}': {e}")
 
     if updated_count < len(target_ids):
         logger.warning(f"Metadata update incomplete: Expected to update {len(target_ids)} shapes, updated {updated_count}.")
     return updated_count > 0
 
-# --- Refiner Prompt Template ---
-REFINER_PROMPT_TEMPLATE = f"""
+# --- Refiner Prompt ---
+# Static, so it leads the per-slide prompt prefix; the per-instruction context (REFINER_CONTEXT_TEMPLATE)
+# follows the images. With the slide image that prefix is ~2.5k tokens, under CONTEXT_CACHE_MIN_TOKENS,
+# so it is sent inline rather than context-cached.
+REFINER_PROMPT = """
 You are an expert AI assistant acting as a meticulous layout refiner and translator. Your task is to convert **ONE** natural language (NL) PowerPoint modification instruction into an **explicit, executable, context-aware command string with precise calculations**. You MUST rigorously verify targets, understand the slide's intended logical structure and layout dependencies (based on visuals and current simulated metadata), calculate accurately, and ensure the final layout preserves the original design structure while fitting boundaries.
 
 **Goal:** For the **SINGLE** 'Input Instruction' below:
@@ -105,14 +149,8 @@ You are an expert AI assistant acting as a meticulous layout refiner and transla
 5.  **Generate Refined Command String(s) for Structural Integrity:** Output ONE precise instruction string (or multiple sequential strings ONLY if structure preservation demands it, e.g., resize + move adjacent). 
 
 **Context:**
-Input Instruction (Process ONLY this one):
-{{instruction}}
-
-Current Simulated Shape Metadata (JSON - Reflects previous simulated changes. Use THIS for current coordinates/dimensions):
-{{current_metadata_state_json}}
-
-Original Slide Visual Image (base64-encoded - Use for initial ID mapping, structure, relationships):
-Provided as image input.
+Original Slide Visual Image (Use for initial ID mapping, structure, relationships): provided as image input.
+The Input Instruction and the Current Simulated Shape Metadata follow after the image(s).
 
 **CRITICAL Processing Principles:**
 *   **Target Verification:** Mandatory check. Mismatch -> `// Refinement Error: ID mismatch...`
@@ -138,7 +176,7 @@ Provided as image input.
 **Output Format:**
 Return ONLY a JSON object containing the single refined instruction string (or list if multiple steps needed for one NL instruction) or an error/alert comment. Format:
 ```json
-{{{{
+{
     "refined_instruction_output": [
         "Instruction: Set width for shape (id: 123) to 200.0px..."
         // Or potentially multiple if needed:
@@ -147,14 +185,30 @@ Return ONLY a JSON object containing the single refined instruction string (or l
         // Or an error/alert comment:
         // "// Refinement Error: ID mismatch..."
     ]
-}}}}
+}
 ```
 **CRITICAL Constraints & Fallback:**
 *   Mandatory Target Verification. Preserve Inferred Layout Structure. Minimal Change. Fit/Margins. Calculation Basis.
 *   If impossible to resolve reliably: Output `// Refinement Error/Alert: [Reason]`.
-*   Output ONLY the JSON. Use {{{{ and }}}} for literal braces defining the JSON structure. Use ```json for the output block fence. Use standard {{instruction}} or {{current_metadata_state_json}} for variables to be formatted by Python.
+*   Output ONLY the JSON. Use ```json for the output block fence.
+"""
+
+REFINER_CONTEXT_TEMPLATE = """
+Input Instruction (Process ONLY this one):
+{instruction}
+
+Current Simulated Shape Metadata (JSON - Reflects previous simulated changes. Use THIS for current coordinates/dimensions):
+{current_metadata_state_json}
 """
 
+SET_OF_MARKS_NOTE = (
+    "Original Slide Visual Image (annotated): every shape's bounding box is outlined and labeled with its "
+    "shape ID in the top-left corner; gray outlines are groups. The labels are the `id` values in the metadata, "
+    "so read target IDs directly off the image."
+)
+
+_VALID_OUTPUT = model_router.has_json_keys("refined_instruction_output")
+
 def _parse_refined_instruction(instruction: str) -> Optional[Dict[str, Any]]:
     logger.debug(f"Parsing refined instruction: {instruction}")
     if not instruction or instruction.strip().startswith("//"):
@@ -199,23 +253,33 @@ def _parse_refined_instruction(instruction: str) -> Optional[Dict[str, Any]]:
     logger.warning(f"Could not parse known refined instruction structure: {instruction}")
     return None
 
-async def refiner_agent(slide_number: int, slide_context: Dict[str, Any]) -> Dict[str, Any]:
-    global client    
-    client = genai.Client(api_key=LLM_API_KEY)
-    logger.info(f"--- Starting Iterative Refiner Agent for Slide {slide_number} ---")
+@traced("pipeline.refine")
+async def refiner_agent(slide_number: int, slide_context: Dict[str, Any], workspace: Optional[Workspace] = None) -> Dict[str, Any]:
+    workspace = workspace or Workspace()
+    set_span_attributes(slide=slide_number, deck_id=workspace.deck_id)
+    logger.info(f"--- Starting Iterative Refiner Agent for Slide {slide_number} ({workspace.deck_id}) ---")
     final_refined_instructions = []
     all_errors_or_alerts = []
 
     try:
-        detailed_nl_instructions = _load_nl_subtasks(slide_number)
-        original_metadata, simulated_metadata = _load_and_copy_metadata(slide_number)
-        slide_image_base64 = slide_context.get("slide_image_base64")
+        detailed_nl_instructions = _load_nl_subtasks(workspace, slide_number)
+        simulated_metadata = _load_metadata_snapshot(workspace, slide_number)
+        # Crops follow the rendered image, so they are located from the original (unsimulated) geometry
+        original_metadata = simulated_metadata.snapshot() if simulated_metadata else None
+        # Set-of-marks render (shape ids drawn on their boxes) for id grounding; marks need color,
+        # otherwise refinement is geometry-only and can use the grayscale variant
+        slide_image_bytes, slide_image_mime, slide_image_marked = None, None, False
+        if SET_OF_MARKS_ENABLED and original_metadata:
+            slide_image_bytes, slide_image_mime = get_marked_image(slide_context, original_metadata.to_list())
+            slide_image_marked = bool(slide_image_bytes)
+        if not slide_image_bytes:
+            slide_image_bytes, slide_image_mime = get_model_image(slide_context, grayscale=MODEL_IMAGE_GRAYSCALE_FOR_GEOMETRY)
 
         if not detailed_nl_instructions:
             return {"refined_instructions": [], "message": f"No NL sub-tasks found to refine for slide {slide_number}."}
-        if not original_metadata or not simulated_metadata:
-            raise FileNotFoundError("Failed to load or copy metadata.")
-        if not slide_image_base64:
+        if not simulated_metadata:
+            raise FileNotFoundError("Failed to load metadata.")
+        if not slide_image_bytes:
             logger.warning(f"No slide image context provided for slide {slide_number}. Proceeding without image.")
 
     except (FileNotFoundError, ValueError) as e:
@@ -223,25 +287,50 @@ async def refiner_agent(slide_number: int, slide_context: Dict[str, Any]) -> Dic
     except Exception as e:
         return {"error": f"Unexpected initial load error: {str(e)}"}
 
+    simulation_changed = False
+
     # --- Iterative Refinement ---
-    for idx, nl_instruction in enumerate(detailed_nl_instructions):
+    for idx, (nl_instruction, param_ids) in enumerate(detailed_nl_instructions):
         iteration_log_prefix = f"Slide {slide_number}, Iteration {idx + 1}/{len(detailed_nl_instructions)}"
         logger.debug(f"{iteration_log_prefix}: Refining NL: \"{nl_instruction}\"")
 
         try:
-            current_metadata_state_json = json.dumps(simulated_metadata, indent=2)
+            current_metadata_state_json = simulated_metadata.to_prompt_json()
         except TypeError as json_err:
             all_errors_or_alerts.append(f"Iter {idx+1}: Metadata serialization error.")
             continue
 
         try:
-            prompt = REFINER_PROMPT_TEMPLATE.format(instruction=nl_instruction, current_metadata_state_json=current_metadata_state_json)
-            contents = [prompt]
-            if slide_image_base64:
-                contents.append({"inline_data": {"mime_type": "image/png", "data": slide_image_base64}})
-
-            response = await asyncio.to_thread(client.models.generate_content, model="gemini-2.0-flash", contents=contents)
-            raw_response_text = response.text.strip() if hasattr(response, 'text') else ""
+            # prefix: identical for every instruction on this slide; contents: this instruction only
+            prefix, contents = [REFINER_PROMPT], []
+            target_ids = _target_ids(nl_instruction, param_ids, original_metadata)
+            crop = get_region_crop(slide_context, [original_metadata.get(i) for i in target_ids]) if target_ids else None
+            observe_refiner_image("crop" if crop else "full" if slide_image_bytes else "none")
+            if crop:
+                left, top, right, bottom = crop["region"]
+                contents.append(f"Original Slide Visual Image (cropped to the target region, slide px {left},{top} to {right},{bottom}):")
+                contents.append(image_part(data=crop["crop_bytes"], mime_type=crop["mime_type"]))
+                if crop["thumbnail_bytes"]:
+                    contents.append("Low-resolution full slide for context:")
+                    contents.append(image_part(data=crop["thumbnail_bytes"], mime_type=crop["mime_type"]))
+            elif slide_image_bytes:
+                if slide_image_marked:
+                    prefix.append(SET_OF_MARKS_NOTE)
+                prefix.append(image_part(data=slide_image_bytes, mime_type=slide_image_mime))
+            contents.append(REFINER_CONTEXT_TEMPLATE.format(instruction=nl_instruction, current_metadata_state_json=current_metadata_state_json))
+            if simulation_changed:
+                # The render predates earlier sub-tasks; a metadata wireframe shows the simulated layout without re-rendering
+                current_shapes = simulated_metadata.to_list()
+                wireframe = render_wireframe(current_shapes, highlight_ids=changed_shape_ids(original_metadata.to_list(), current_shapes),
+                                             slide_size=load_slide_size(workspace.manifest_path))
+                contents.append("Current simulated layout wireframe (boxes from the simulated metadata; shapes changed by earlier sub-tasks outlined in red):")
+                contents.append(image_part(data=wireframe_png(wireframe), mime_type="image/png"))
+
+            # Every input that shapes the image parts (crop region, marks, simulated metadata) is in the text parts
+            raw_response_text = (await asyncio.to_thread(
+                cached_llm_text, slide_context, "refiner_gray" if MODEL_IMAGE_GRAYSCALE_FOR_GEOMETRY else "refiner", [*prefix, *contents],
+                lambda: model_router.generate_content(contents, "refiner", _VALID_OUTPUT, prefix=prefix), _VALID_OUTPUT
+            )).strip()
 
             if not raw_response_text:
                 logger.warning(f"{iteration_log_prefix}: Empty LLM response.")
@@ -292,6 +381,8 @@ async def refiner_agent(slide_number: int, slide_context: Dict[str, Any]) -> Dic
                                         logger.error(f"{iteration_log_prefix}: Failed to simulate state update.")
                                         all_errors_or_alerts.append(f"Iter {idx+1}: State update failed.")
                                         simulation_success_for_this_step = False
+                                    elif changes_to_apply:
+                                        simulation_changed = True
                                     else:
                                         logger.warning(f"{iteration_log_prefix}: Refined instruction parsing failed.")
                                         all_errors_or_alerts.append(f"Iter {idx+1}: Refined instruction parsing failed.")
@@ -318,17 +409,20 @@ async def refiner_agent(slide_number: int, slide_context: Dict[str, Any]) -> Dic
             break
 
     # --- Save Final Instructions ---
-    output_filename = f"slide{slide_number}_refined_tasks.json"
-    output_path = os.path.join(REFINER_OUTPUT_DIR, output_filename)
+    output_path = workspace.slide_file(slide_number, "_refined_tasks.json")
     try:
-        os.makedirs(REFINER_OUTPUT_DIR, exist_ok=True)
+        os.makedirs(workspace.slides_dir, exist_ok=True)
         output_data = {"refined_instructions": final_refined_instructions}
         async with aiofiles.open(output_path, "w", encoding="utf-8") as f:
             await f.write(json.dumps(output_data, indent=2))
+        # Final simulated state, for before/after wireframe previews
+        async with aiofiles.open(workspace.slide_file(slide_number, "_simulated_metadata.json"), "w", encoding="utf-8") as f:
+            await f.write(json.dumps(simulated_metadata.to_list(), separators=(",", ":")))
         logger.info(f"Saved final refined instructions for slide {slide_number} to: {output_path}")
     except Exception as save_err:
         all_errors_or_alerts.append(f"Failed to save output file: {save_err}")
 
+    set_span_attributes(iterations=len(detailed_nl_instructions), errors_or_alerts=len(all_errors_or_alerts))
     logger.info(f"--- Finished Refiner Agent for Slide {slide_number}. Errors/Alerts encountered: {len(all_errors_or_alerts)} ---")
     if all_errors_or_alerts:
         return {
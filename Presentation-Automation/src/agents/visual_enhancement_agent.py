@@ -1,8 +1,10 @@
 import logging, json, re
 from typing import Dict, Any
-from config.config import LLM_API_KEY
-from google import genai
-client = genai.Client(api_key=LLM_API_KEY)
+from config.llmProvider import image_part
+from utils.image_prep import get_model_image
+from utils.derived_cache import cached_llm_text
+from utils.telemetry import traced
+from utils import model_router, llm_transport
 
 VISUAL_ENHANCEMENT_TASK_DESCRIPTION_PROMPT  = """
     You are an expert AI assistant acting as a bridge between a parsed user request and a PowerPoint code generator. 
@@ -10,12 +12,9 @@ VISUAL_ENHANCEMENT_TASK_DESCRIPTION_PROMPT  = """
     This description will guide the subsequent code generation step.
     
     **Input:**
-    Original User instruction: {original_instruction}
     Slide Number: {slide_number}
-    action: {action}
-    target_element_hint: {target_element_hint}  
-    params: {params}
     Slide XML Structure: {slide_xml_structure}
+    The sub-task to describe (Original User instruction, action, target_element_hint, params) follows after the slide image.
     
     
     **## Your Task (Conditional):**
@@ -82,7 +81,19 @@ VISUAL_ENHANCEMENT_TASK_DESCRIPTION_PROMPT  = """
     }}
 
     """
+
+VISUAL_ENHANCEMENT_SUB_TASK_PROMPT = """
+    **Sub-task:**
+    Original User instruction: {original_instruction}
+    action: {action}
+    target_element_hint: {target_element_hint}
+    params: {params}
+"""
     
+# Output A or B; anything else is retried on the full model
+_VALID_OUTPUT = model_router.has_json_keys("task_description", "expanded_tasks")
+
+@traced("agent.visual_enhancement")
 def visual_enhancement_agent(classified_instruction: Dict[str, Any], slide_context: Dict[str, Any]) -> list[Dict[str, Any]]:
     processed_subtasks = []
     slide_number = classified_instruction.get("slide_number")
@@ -109,25 +120,32 @@ def visual_enhancement_agent(classified_instruction: Dict[str, Any], slide_conte
         final_prompt = []
 
         main_prompt = VISUAL_ENHANCEMENT_TASK_DESCRIPTION_PROMPT.format(
-            original_instruction=original_instruction,
             slide_number=slide_number,
+            slide_xml_structure=slide_xml,
+        )
+        sub_task_prompt = VISUAL_ENHANCEMENT_SUB_TASK_PROMPT.format(
+            original_instruction=original_instruction,
             action=action,
             target_element_hint=target_hint,
             params=json.dumps(params),
-            slide_xml_structure=slide_xml,
         )
         final_prompt.append(main_prompt) 
 
         slide_image_text_prompt ="The below is the image of the slide. Please also use this as a reference to generate the description. Analyse what text, images, shapes, other elements, structure and layout are currently present on the slide"
         
         final_prompt.append(slide_image_text_prompt)
-        image = genai.types.Part.from_bytes(data=slide_image_bytes, mime_type="image/png") 
+        model_image_bytes, model_image_mime = get_model_image(slide_context)
+        image = image_part(data=model_image_bytes, mime_type=model_image_mime)
 
         try:
-            response = client.models.generate_content(model="gemini-2.0-flash", contents=[final_prompt, image])
-            logging.info(f"LLM visual_enhancement_agent response: {response.text}")
+            response_text = cached_llm_text(
+                slide_context, "visual_enhancement", [*final_prompt, image, sub_task_prompt],
+                lambda: model_router.generate_content([sub_task_prompt], "visual_enhancement", _VALID_OUTPUT, prefix=[*final_prompt, image]),
+                _VALID_OUTPUT
+            )
+            logging.info(f"LLM visual_enhancement_agent response: {response_text}")
            
-            json_match = re.search(r'(\{[\s\S]*\})', response.text)
+            json_match = re.search(r'(\{[\s\S]*\})', response_text)
             
             if json_match:
                 json_str = json_match.group(0)
@@ -176,7 +194,7 @@ def visual_enhancement_agent(classified_instruction: Dict[str, Any], slide_conte
                             "agent_name": "visual_enhancement",
                             "slide_number": slide_number,
                             "original_instruction": original_instruction,
-                            "task_description": f"Parsing error: Unexpected JSON format. Raw response: {response.text[:100]}...", 
+                            "task_description": f"Parsing error: Unexpected JSON format. Raw response: {response_text[:100]}...", 
                             "action": action,
                             "target_element_hint": target_hint,
                             "params": params
@@ -196,7 +214,7 @@ def visual_enhancement_agent(classified_instruction: Dict[str, Any], slide_conte
                     }
                     processed_subtasks.append(flattened_task)
             else:
-                logging.warning(f"No JSON found in LLM response: {response.text[:100]}...")
+                logging.warning(f"No JSON found in LLM response: {response_text[:100]}...")
                 flattened_task = {
                     "agent_name": "visual_enhancement",
                     "slide_number": slide_number,
@@ -208,6 +226,8 @@ def visual_enhancement_agent(classified_instruction: Dict[str, Any], slide_conte
                 }
                 processed_subtasks.append(flattened_task)
                 
+        except llm_transport.CallAbandoned:
+            raise
         except Exception as e:
             logging.error(f"Error in visual_enhancement agent: {e}")
             flattened_task = {
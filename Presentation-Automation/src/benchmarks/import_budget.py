@@ -0,0 +1,73 @@
+# benchmarks/import_budget.py
+"""
+Import-time budget for worker startup: imports a module (default `main`) in a fresh interpreter
+with -X importtime, reports the slowest imports as JSON and exits non-zero when the import takes
+longer than the budget or pulls in a module that should only load on first LLM use.
+
+    cd src && python -m benchmarks.import_budget --budget-ms 1500
+"""
+import os, re, sys, json, argparse, subprocess
+from typing import Any, Dict, List
+
+# Loaded lazily by config/llmProvider.py; seeing them at startup means an eager import crept back in
+DEFERRED_MODULES = ("langchain", "langchain_core", "langchain_google_genai", "google.genai", "google.generativeai")
+
+_IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)$")
+
+def measure_import(module: str, runs: int = 3) -> Dict[str, Any]:
+    """Best-of-`runs` wall time for `import module`, plus the -X importtime tree of the fastest run."""
+    src_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    code = f"import time; start = time.perf_counter(); import {module}; print(time.perf_counter() - start)"
+    best = None
+    for _ in range(runs):
+        result = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=src_dir,
+                                capture_output=True, text=True, env={**os.environ, "PYTHONDONTWRITEBYTECODE": "1"})
+        if result.returncode != 0:
+            raise RuntimeError(f"import {module} failed:\n{result.stderr[-2000:]}")
+        seconds = float(result.stdout.strip().splitlines()[-1])
+        if best is None or seconds < best[0]:
+            best = (seconds, result.stderr)
+
+    seconds, stderr = best
+    imports: List[Dict[str, Any]] = []
+    for line in stderr.splitlines():
+        match = _IMPORTTIME_LINE.match(line)
+        if not match:
+            continue
+        entry = {"module": match.group(4), "self_us": int(match.group(1)),
+                 "cumulative_us": int(match.group(2)), "depth": len(match.group(3)) // 2}
+        if entry["depth"] == 0 and entry["module"] != module:
+            imports = []  # interpreter startup (site, ...) or `import time`; children are listed before their parent
+            continue
+        imports.append(entry)
+        if entry["depth"] == 0:
+            break
+    return {"module": module, "seconds": seconds, "imports": imports}
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Check the import time of the API against a budget.")
+    parser.add_argument("--module", default="main")
+    parser.add_argument("--budget-ms", type=float, default=1500)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--top", type=int, default=15, help="Slowest top-level imports to report")
+    args = parser.parse_args(argv)
+
+    measured = measure_import(args.module, args.runs)
+    loaded = {entry["module"] for entry in measured["imports"]}
+    deferred_loaded = sorted(name for name in loaded if name in DEFERRED_MODULES)
+    top_level = [entry for entry in measured["imports"] if entry["depth"] <= 1]
+    report = {
+        "module": args.module,
+        "import_ms": round(measured["seconds"] * 1000, 1),
+        "budget_ms": args.budget_ms,
+        "within_budget": measured["seconds"] * 1000 <= args.budget_ms,
+        "modules_imported": len(loaded),
+        "deferred_modules_loaded": deferred_loaded,
+        "slowest": [{"module": entry["module"], "cumulative_ms": round(entry["cumulative_us"] / 1000, 1)}
+                    for entry in sorted(top_level, key=lambda entry: -entry["cumulative_us"])[:args.top]],
+    }
+    print(json.dumps(report, indent=2))
+    return 0 if report["within_budget"] and not deferred_loaded else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
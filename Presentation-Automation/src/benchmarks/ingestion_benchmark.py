@@ -0,0 +1,161 @@
+# benchmarks/ingestion_benchmark.py
+"""
+End-to-end ingestion benchmark: generates synthetic decks, runs the same stages as
+POST /upload-pptx (staging, LibreOffice conversion, per-slide context generation, metadata
+store, manifest) in a throwaway workspace and prints machine-readable JSON.
+
+    cd src && python -m benchmarks.ingestion_benchmark --slides 10 100 500 --output bench.json
+
+Needs LibreOffice (soffice) and poppler on PATH, like the server itself.
+"""
+import os, sys, json, time, shutil, resource, platform, argparse, tempfile, logging
+from contextlib import contextmanager
+from typing import Any, Dict, List
+
+# Measure the cold path: no reuse of derived artifacts from earlier runs
+os.environ.setdefault("DERIVED_CACHE_ENABLED", "false")
+
+from prometheus_client import REGISTRY
+from config.config import RENDER_DPI
+from benchmarks.synthetic_deck import generate_deck
+from utils.workspace import Workspace
+from utils.utils import convert_pptx_to_pdf, generate_slide_context
+from utils.pptx_reader import SlideReader
+from utils.metadata_store import MetadataStore
+from utils.slide_manifest import save_manifest
+from routes.pptx_handler import STREAM_CHUNK_SIZE
+
+logger = logging.getLogger(__name__)
+
+# Spans recorded inside generate_slide_context, reported as wall-time sub-stages
+SUBSTAGES = ("ingest.rasterize", "ingest.metadata")
+
+def _disk_bytes(root: str) -> int:
+    total = 0
+    for directory, _, files in os.walk(root):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(directory, name))
+            except OSError:
+                pass
+    return total
+
+def _cpu_seconds() -> float:
+    # Children covers LibreOffice and poppler subprocesses
+    own, children = resource.getrusage(resource.RUSAGE_SELF), resource.getrusage(resource.RUSAGE_CHILDREN)
+    return own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime
+
+def _peak_rss_mb() -> float:
+    own, children = resource.getrusage(resource.RUSAGE_SELF), resource.getrusage(resource.RUSAGE_CHILDREN)
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024  # ru_maxrss is bytes on macOS, KiB on Linux
+    return round(max(own.ru_maxrss, children.ru_maxrss) / scale, 1)
+
+def _stage_sum(stage: str) -> float:
+    return REGISTRY.get_sample_value("pipeline_stage_seconds_sum", {"stage": stage}) or 0.0
+
+@contextmanager
+def _measure(name: str, stages: Dict[str, Dict[str, Any]], disk_root: str):
+    """Wall and CPU seconds, peak RSS high-water mark (self or any child) and disk bytes added under disk_root."""
+    disk_before, cpu_before = _disk_bytes(disk_root), _cpu_seconds()
+    start = time.perf_counter()
+    yield
+    stages[name] = {
+        "wall_seconds": round(time.perf_counter() - start, 4),
+        "cpu_seconds": round(_cpu_seconds() - cpu_before, 4),
+        "peak_rss_mb": _peak_rss_mb(),
+        "disk_bytes": _disk_bytes(disk_root) - disk_before,
+    }
+
+def run_ingestion(pptx_path: str, work_root: str) -> Dict[str, Any]:
+    workspace = Workspace("bench", root=work_root)
+    workspace.ensure_dirs()
+    store = MetadataStore(os.path.join(work_root, "metadata.sqlite3"))
+    stages: Dict[str, Dict[str, Any]] = {}
+    substages_before = {stage: _stage_sum(stage) for stage in SUBSTAGES}
+    start = time.perf_counter()
+
+    with _measure("stage_upload", stages, work_root):
+        staged_path = workspace.pptx_path("presentation.pptx")
+        with open(pptx_path, "rb") as src, open(staged_path, "wb") as dst:
+            while chunk := src.read(STREAM_CHUNK_SIZE):
+                dst.write(chunk)
+
+    with _measure("convert_pdf", stages, work_root):
+        pdf_path = convert_pptx_to_pdf(staged_path, workspace.pdf_dir, os.path.join(workspace.root, "lo_profile"))
+
+    shapes_by_slide, manifest = {}, {}
+    with _measure("slide_contexts", stages, work_root):
+        with SlideReader(staged_path) as reader:
+            slide_count = len(reader)
+            for slide_number in range(slide_count):
+                context = generate_slide_context(reader, slide_number, pdf_path, workspace.slides_dir, metadata_dir=workspace.metadata_dir)
+                shapes_by_slide[slide_number] = context["shape_metadata"]
+                manifest[slide_number] = context["manifest_entry"]
+
+    with _measure("metadata_store", stages, work_root):
+        store.replace_slides(workspace.deck_id, shapes_by_slide)
+
+    with _measure("manifest", stages, work_root):
+        save_manifest(workspace.manifest_path, manifest)
+
+    return {
+        "slides": slide_count,
+        "shapes": sum(len(shapes) for shapes in shapes_by_slide.values()),
+        "total_wall_seconds": round(time.perf_counter() - start, 4),
+        "stages": stages,
+        "substages_wall_seconds": {stage: round(_stage_sum(stage) - substages_before[stage], 4) for stage in SUBSTAGES},
+        "workspace_bytes": _disk_bytes(work_root),
+    }
+
+def main(argv: List[str] = None) -> Dict[str, Any]:
+    parser = argparse.ArgumentParser(description="Benchmark PPTX ingestion on synthetic decks.")
+    parser.add_argument("--slides", type=int, nargs="+", default=[10, 100, 500])
+    parser.add_argument("--shapes-per-slide", type=int, default=12)
+    parser.add_argument("--image-every", type=int, default=3)
+    parser.add_argument("--table-every", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write JSON here instead of stdout")
+    parser.add_argument("--keep", action="store_true", help="Keep generated decks and workspaces")
+    args = parser.parse_args(argv)
+
+    report = {
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "render_dpi": RENDER_DPI,
+        },
+        "runs": [],
+    }
+    scratch = tempfile.mkdtemp(prefix="ingestion-bench-")
+    try:
+        for slides in args.slides:
+            deck_path = os.path.join(scratch, f"synthetic_{slides}.pptx")
+            generate_start = time.perf_counter()
+            generate_deck(deck_path, slides, args.shapes_per_slide, args.image_every, args.table_every, seed=args.seed)
+            generate_seconds = round(time.perf_counter() - generate_start, 4)
+            for attempt in range(args.repeat):
+                work_root = os.path.join(scratch, f"work_{slides}_{attempt}")
+                logger.info(f"Ingesting {slides}-slide deck (run {attempt + 1}/{args.repeat})...")
+                run = run_ingestion(deck_path, work_root)
+                run.update({"requested_slides": slides, "run": attempt, "deck_bytes": os.path.getsize(deck_path),
+                            "generate_seconds": generate_seconds})
+                report["runs"].append(run)
+                if not args.keep:
+                    shutil.rmtree(work_root, ignore_errors=True)
+    finally:
+        if not args.keep:
+            shutil.rmtree(scratch, ignore_errors=True)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+    else:
+        print(output)
+    return report
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    main()
@@ -0,0 +1,197 @@
+# benchmarks/load_test.py
+"""
+Concurrent-user load generator for a running API instance. Each virtual user runs a scripted
+scenario against its own deck id (so ingestion for different users does not share a deck lock)
+and every request's latency is recorded; the report gives p50/p95/p99, throughput and error
+rate per operation as JSON.
+
+    cd src && python -m benchmarks.load_test --base-url http://localhost:8000 --users 20 \
+        --scenario upload_then_instructions --iterations 3 --output load.json
+
+Run the API against benchmarks/stub_llm_server.py (LLM_BASE_URL) to measure the app rather
+than Gemini. A custom scenario is a JSON file:
+    {"name": "mine", "steps": [{"op": "upload"}, {"op": "instruction", "text": "...", "slide_index": 0, "repeat": 5}]}
+"""
+import os, json, math, time, random, asyncio, argparse, tempfile, logging
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+import httpx
+from benchmarks.synthetic_deck import generate_deck
+
+logger = logging.getLogger(__name__)
+
+INSTRUCTIONS = [
+    "Align the left edges of the text boxes on this slide",
+    "Change the title font to Arial 32pt",
+    "Make the spacing between the boxes even",
+    "Remove the empty placeholder on this slide",
+]
+
+SCENARIOS: Dict[str, List[Dict[str, Any]]] = {
+    "upload_then_instructions": [{"op": "upload"}, {"op": "instruction", "repeat": 5}],
+    "whole_deck_format": [{"op": "upload"}, {"op": "instruction", "text": "Format the whole presentation consistently"}],
+    "instructions_only": [{"op": "instruction", "repeat": 5}],
+    "upload_only": [{"op": "upload"}],
+}
+
+def percentile(sorted_values: List[float], pct: float) -> Optional[float]:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+class Recorder:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.error_samples: List[str] = []
+
+    def add(self, op: str, seconds: float, error: Optional[str] = None):
+        self.latencies[op].append(seconds)
+        if error:
+            self.errors[op] += 1
+            if len(self.error_samples) < 20:
+                self.error_samples.append(f"{op}: {error}")
+
+    def summary(self, wall_seconds: float) -> Dict[str, Any]:
+        operations = {}
+        for op, values in self.latencies.items():
+            ordered = sorted(values)
+            operations[op] = {
+                "requests": len(ordered),
+                "errors": self.errors[op],
+                "error_rate": round(self.errors[op] / len(ordered), 4),
+                "throughput_rps": round(len(ordered) / wall_seconds, 3) if wall_seconds else None,
+                "mean_seconds": round(sum(ordered) / len(ordered), 4),
+                "p50_seconds": round(percentile(ordered, 50), 4),
+                "p95_seconds": round(percentile(ordered, 95), 4),
+                "p99_seconds": round(percentile(ordered, 99), 4),
+                "max_seconds": round(ordered[-1], 4),
+            }
+        total = sum(len(values) for values in self.latencies.values())
+        total_errors = sum(self.errors.values())
+        return {
+            "wall_seconds": round(wall_seconds, 3),
+            "requests": total,
+            "errors": total_errors,
+            "error_rate": round(total_errors / total, 4) if total else None,
+            "throughput_rps": round(total / wall_seconds, 3) if wall_seconds else None,
+            "operations": operations,
+            "error_samples": self.error_samples,
+        }
+
+async def _timed(recorder: Recorder, op: str, request) -> Optional[Dict[str, Any]]:
+    start = time.perf_counter()
+    try:
+        response = await request
+    except httpx.HTTPError as e:
+        recorder.add(op, time.perf_counter() - start, f"{type(e).__name__}: {e}")
+        return None
+    elapsed = time.perf_counter() - start
+    body = None
+    try:
+        body = response.json()
+    except ValueError:
+        pass
+    if response.status_code >= 400:
+        recorder.add(op, elapsed, f"HTTP {response.status_code}: {response.text[:200]}")
+    elif isinstance(body, dict) and body.get("status") == "error":
+        # /process_instruction reports failures with a 200 and status "error"
+        recorder.add(op, elapsed, body.get("message", "status error"))
+    else:
+        recorder.add(op, elapsed)
+    return body
+
+async def run_user(user: int, client: httpx.AsyncClient, steps: List[Dict[str, Any]], deck_bytes: bytes,
+                   slides: int, iterations: int, recorder: Recorder, shared_deck: bool, rng: random.Random):
+    deck_id = "loadtest" if shared_deck else f"loadtest-{user}"
+    for _ in range(iterations):
+        for step in steps:
+            for _ in range(step.get("repeat", 1)):
+                if step["op"] == "upload":
+                    await _timed(recorder, "upload", client.post(
+                        "/upload-pptx/stream", params={"deck_id": deck_id, "filename": "presentation.pptx"},
+                        content=deck_bytes, headers={"content-type": "application/octet-stream"}))
+                elif step["op"] == "instruction":
+                    payload = {
+                        "instruction": step.get("text") or rng.choice(INSTRUCTIONS),
+                        "slide_index": step.get("slide_index", rng.randrange(slides)),
+                        "total_slides": slides,
+                        "deck_id": deck_id,
+                    }
+                    await _timed(recorder, "instruction", client.post("/process_instruction", json=payload))
+                else:
+                    raise ValueError(f"Unknown scenario op '{step['op']}'")
+
+async def run_load(base_url: str, steps: List[Dict[str, Any]], users: int, iterations: int, deck_path: str,
+                   slides: int, ramp_up: float, timeout: float, shared_deck: bool, seed: int) -> Dict[str, Any]:
+    with open(deck_path, "rb") as f:
+        deck_bytes = f.read()
+    recorder = Recorder()
+    limits = httpx.Limits(max_connections=users, max_keepalive_connections=users)
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits) as client:
+        if not any(step["op"] == "upload" for step in steps):
+            # Instruction-only scenarios still need each user's deck ingested once, outside the measurement
+            await asyncio.gather(*(run_user(user, client, [{"op": "upload"}], deck_bytes, slides, 1, Recorder(), shared_deck, random.Random(seed))
+                                   for user in range(1 if shared_deck else users)))
+
+        async def _start(user: int):
+            await asyncio.sleep(ramp_up * user / max(users, 1))
+            await run_user(user, client, steps, deck_bytes, slides, iterations, recorder, shared_deck, random.Random(seed + user))
+
+        start = time.perf_counter()
+        await asyncio.gather(*(_start(user) for user in range(users)))
+        wall = time.perf_counter() - start
+    return recorder.summary(wall)
+
+def _load_scenario(name_or_path: str) -> Dict[str, Any]:
+    if name_or_path in SCENARIOS:
+        return {"name": name_or_path, "steps": SCENARIOS[name_or_path]}
+    with open(name_or_path, "r", encoding="utf-8") as f:
+        scenario = json.load(f)
+    if not isinstance(scenario.get("steps"), list):
+        raise ValueError(f"Scenario file {name_or_path} needs a 'steps' list")
+    scenario.setdefault("name", os.path.basename(name_or_path))
+    return scenario
+
+def main(argv: List[str] = None) -> Dict[str, Any]:
+    parser = argparse.ArgumentParser(description="Concurrent-user load test for the Slide Enhancement API.")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--scenario", default="upload_then_instructions", help=f"One of {sorted(SCENARIOS)} or a JSON file")
+    parser.add_argument("--users", type=int, nargs="+", default=[1, 5, 20], help="Concurrency levels, run one after another")
+    parser.add_argument("--iterations", type=int, default=1, help="Scenario repetitions per user")
+    parser.add_argument("--ramp-up", type=float, default=0.0, help="Seconds over which users are started")
+    parser.add_argument("--deck", help="PPTX to upload; a synthetic deck is generated if omitted")
+    parser.add_argument("--slides", type=int, default=10, help="Synthetic deck size")
+    parser.add_argument("--timeout", type=float, default=600.0)
+    parser.add_argument("--shared-deck", action="store_true", help="All users work on one deck id")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write JSON here instead of stdout")
+    args = parser.parse_args(argv)
+
+    scenario = _load_scenario(args.scenario)
+    with tempfile.TemporaryDirectory(prefix="load-test-") as scratch:
+        deck_path = args.deck or generate_deck(os.path.join(scratch, "synthetic.pptx"), args.slides, seed=args.seed)
+        if args.deck:
+            from utils.pptx_reader import SlideReader
+            with SlideReader(deck_path) as reader:
+                args.slides = len(reader)
+        report = {"base_url": args.base_url, "scenario": scenario, "slides": args.slides, "iterations": args.iterations, "runs": []}
+        for users in args.users:
+            logger.info(f"Running '{scenario['name']}' with {users} concurrent users...")
+            result = asyncio.run(run_load(args.base_url, scenario["steps"], users, args.iterations, deck_path, args.slides,
+                                          args.ramp_up, args.timeout, args.shared_deck, args.seed))
+            report["runs"].append({"users": users, **result})
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+    else:
+        print(output)
+    return report
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    main()
@@ -0,0 +1,206 @@
+# benchmarks/stub_llm_server.py
+"""
+Local stand-in for the Gemini API (and OpenAI chat completions) for load tests. Answers every
+call with canned text after a configurable delay, so the app's own throughput can be measured
+without quota or cost:
+
+    cd src && python -m benchmarks.stub_llm_server --port 8090 --delay-ms 800 --jitter-ms 300
+    LLM_BASE_URL=http://localhost:8090 LLM_API_KEY=stub DERIVED_CACHE_ENABLED=false uvicorn main:app
+
+Responses are picked by the first rule whose "match" substring occurs in the prompt; the built-in
+rules return well-formed output for every pipeline call site. --responses takes a JSON list of
+{"match": ..., "text": ...} rules that are tried before the built-in ones. Context caches
+(POST /v1beta/cachedContents) are kept in memory until deleted and their text is matched as part of the prompt.
+"""
+import re, json, time, random, asyncio, argparse, logging
+from collections import Counter
+from typing import Any, Callable, Dict, List, Union
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+logger = logging.getLogger(__name__)
+
+def _classification(prompt: str) -> str:
+    slide = re.search(r"Current Slide Number \(0-based\):\s*(\d+)", prompt)
+    total = re.search(r"Total Slides in Presentation:\s*(\d+)", prompt)
+    instruction = re.search(r"Instruction:\s*(.*?)\s*\(The user's raw request\)", prompt)
+    slide_number = int(slide.group(1)) if slide else 0
+    text = instruction.group(1) if instruction else ""
+    whole_deck = any(word in text.lower() for word in ("whole", "entire", "all slides", "presentation"))
+    return json.dumps({
+        "category": "formatting",
+        "slide_number": slide_number,
+        "original_instruction": text,
+        "instruction_scope": "entire_presentation" if whole_deck else "current_slide",
+        "target_slide_indices": list(range(int(total.group(1)))) if whole_deck and total else [slide_number],
+        "tasks": [{"action": "align_elements", "target_element_hint": "content boxes", "params": {"alignment": "left"}}],
+    })
+
+_TASK_DESCRIPTION = json.dumps({"task_description": "Align the left edges of the content boxes with the title."})
+_REFINED = "```json\n" + json.dumps({"refined_instruction_output": ["Set left coordinate for shapes (ids: 2, 3) to 48 px"]}) + "\n```"
+_CODE = """```javascript
+await PowerPoint.run(async (context) => {
+  const shapes = context.presentation.slides.getItemAt(0).shapes;
+  shapes.load("items/id,items/left");
+  await context.sync();
+  shapes.items.forEach((shape) => { shape.left = 48; });
+  await context.sync();
+});
+```"""
+
+# (substring of the prompt, response text or prompt -> text); first match wins
+BUILTIN_RULES: List[Dict[str, Union[str, Callable[[str], str]]]] = [
+    {"match": "analyzing feedback for PowerPoint", "text": _classification},
+    {"match": "meticulous layout refiner", "text": _REFINED},
+    {"match": "generating precise Office.js code", "text": _CODE},
+    {"match": "bridge between a parsed user request", "text": _TASK_DESCRIPTION},
+    {"match": "Look only for (1) text that overflows", "text": '{"expanded_tasks": []}'},
+    {"match": "", "text": "{}"},
+]
+
+class StubState:
+    def __init__(self, rules: List[Dict[str, Any]], delay_ms: float, jitter_ms: float,
+                 error_rate: float, rate_limit_rate: float, seed: int = 0):
+        self.rules = rules + BUILTIN_RULES
+        self.delay_ms, self.jitter_ms = delay_ms, jitter_ms
+        self.error_rate, self.rate_limit_rate = error_rate, rate_limit_rate
+        self.rng = random.Random(seed)
+        self.calls = Counter()
+        self.cached_contents: Dict[str, str] = {}
+
+    def pick(self, prompt: str) -> str:
+        for rule in self.rules:
+            if rule["match"] in prompt:
+                self.calls[rule["match"][:40] or "default"] += 1
+                text = rule["text"]
+                return text(prompt) if callable(text) else text
+        return ""
+
+    async def wait(self):
+        delay = max(0.0, self.rng.gauss(self.delay_ms, self.jitter_ms)) if self.jitter_ms else self.delay_ms
+        await asyncio.sleep(delay / 1000)
+
+    def failure(self):
+        """(status, error body) for an injected failure, or None."""
+        roll = self.rng.random()
+        if roll < self.rate_limit_rate:
+            self.calls["injected_429"] += 1
+            return 429, {"error": {"code": 429, "message": "Resource has been exhausted (stub).", "status": "RESOURCE_EXHAUSTED"}}
+        if roll < self.rate_limit_rate + self.error_rate:
+            self.calls["injected_500"] += 1
+            return 500, {"error": {"code": 500, "message": "Internal error (stub).", "status": "INTERNAL"}}
+        return None
+
+def _gemini_prompt(body: Dict[str, Any]) -> str:
+    return "\n".join(part.get("text", "") for content in body.get("contents", []) for part in content.get("parts", []))
+
+def _openai_prompt(body: Dict[str, Any]) -> str:
+    texts = []
+    for message in body.get("messages", []):
+        content = message.get("content", "")
+        if isinstance(content, list):
+            texts.extend(part.get("text", "") for part in content if isinstance(part, dict))
+        else:
+            texts.append(str(content))
+    return "\n".join(texts)
+
+def _token_estimate(text: str) -> int:
+    return max(1, len(text) // 4)
+
+def create_app(state: StubState) -> FastAPI:
+    app = FastAPI(title="Stub LLM server")
+
+    @app.post("/{version}/cachedContents")
+    async def create_cached_content(version: str, request: Request):
+        body = await request.json()
+        name = f"cachedContents/stub-{state.calls['cached_contents_created'] + 1}"
+        state.cached_contents[name] = _gemini_prompt(body)
+        state.calls["cached_contents_created"] += 1
+        ttl = float(str(body.get("ttl", "3600s")).rstrip("s"))
+        return {
+            "name": name,
+            "model": body.get("model", ""),
+            "displayName": body.get("displayName", ""),
+            "expireTime": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(time.time() + ttl)),
+            "usageMetadata": {"totalTokenCount": _token_estimate(state.cached_contents[name])},
+        }
+
+    @app.delete("/{version}/cachedContents/{cache_id}")
+    async def delete_cached_content(version: str, cache_id: str):
+        if state.cached_contents.pop(f"cachedContents/{cache_id}", None) is None:
+            return JSONResponse(status_code=404, content={"error": {"code": 404, "message": "Cached content not found.", "status": "NOT_FOUND"}})
+        state.calls["cached_contents_deleted"] += 1
+        return {}
+
+    @app.post("/{version}/models/{model_action}")
+    async def generate_content(version: str, model_action: str, request: Request):
+        # google-genai and langchain (REST transport) both call /v1beta/models/<model>:generateContent
+        body = await request.json()
+        await state.wait()
+        failure = state.failure()
+        if failure:
+            return JSONResponse(status_code=failure[0], content=failure[1])
+        prompt = _gemini_prompt(body)
+        cached = body.get("cachedContent")
+        if cached:
+            if cached not in state.cached_contents:
+                return JSONResponse(status_code=404, content={"error": {"code": 404, "message": f"Cached content {cached} not found.", "status": "NOT_FOUND"}})
+            prompt = state.cached_contents[cached] + "\n" + prompt
+        text = state.pick(prompt)
+        prompt_tokens, output_tokens = _token_estimate(prompt), _token_estimate(text)
+        return {
+            "candidates": [{"content": {"parts": [{"text": text}], "role": "model"}, "finishReason": "STOP", "index": 0}],
+            "usageMetadata": {"promptTokenCount": prompt_tokens, "candidatesTokenCount": output_tokens,
+                              "totalTokenCount": prompt_tokens + output_tokens},
+            "modelVersion": model_action.split(":", 1)[0],
+        }
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        await state.wait()
+        failure = state.failure()
+        if failure:
+            return JSONResponse(status_code=failure[0], content=failure[1])
+        prompt = _openai_prompt(body)
+        text = state.pick(prompt)
+        prompt_tokens, output_tokens = _token_estimate(prompt), _token_estimate(text)
+        return {
+            "id": f"stub-{int(time.time() * 1000)}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "stub"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": output_tokens, "total_tokens": prompt_tokens + output_tokens},
+        }
+
+    @app.get("/stats")
+    async def stats():
+        """Calls answered per rule (and injected failures) since start."""
+        return dict(state.calls)
+
+    return app
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description="Stub Gemini/OpenAI-compatible server for load tests.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--delay-ms", type=float, default=800, help="Mean response delay")
+    parser.add_argument("--jitter-ms", type=float, default=0, help="Std deviation of the delay")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of calls answered with 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Fraction of calls answered with 429")
+    parser.add_argument("--responses", help="JSON file with extra [{\"match\", \"text\"}] rules")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    rules = []
+    if args.responses:
+        with open(args.responses, "r", encoding="utf-8") as f:
+            rules = json.load(f)
+    state = StubState(rules, args.delay_ms, args.jitter_ms, args.error_rate, args.rate_limit_rate, args.seed)
+    uvicorn.run(create_app(state), host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    main()
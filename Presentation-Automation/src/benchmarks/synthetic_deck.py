@@ -0,0 +1,94 @@
+# benchmarks/synthetic_deck.py
+import random, argparse, logging
+from io import BytesIO
+from pptx import Presentation
+from pptx.util import Emu, Pt
+from pptx.enum.shapes import MSO_SHAPE
+from pptx.dml.color import RGBColor
+from PIL import Image, ImageDraw
+
+logger = logging.getLogger(__name__)
+
+SLIDE_WIDTH = Emu(12192000)   # 16:9, 960x540 pt
+SLIDE_HEIGHT = Emu(6858000)
+_AUTO_SHAPES = [MSO_SHAPE.RECTANGLE, MSO_SHAPE.ROUNDED_RECTANGLE, MSO_SHAPE.OVAL, MSO_SHAPE.CHEVRON, MSO_SHAPE.RIGHT_ARROW]
+_WORDS = "revenue growth market share quarter pipeline forecast margin customer retention strategy roadmap launch".split()
+
+def _image_bytes(rng: random.Random, size=(640, 360)) -> bytes:
+    """A noisy gradient PNG, so image parts don't compress to nothing."""
+    image = Image.new("RGB", size, tuple(rng.randrange(256) for _ in range(3)))
+    draw = ImageDraw.Draw(image)
+    for _ in range(40):
+        x, y = rng.randrange(size[0]), rng.randrange(size[1])
+        draw.ellipse((x, y, x + rng.randrange(10, 120), y + rng.randrange(10, 120)), fill=tuple(rng.randrange(256) for _ in range(3)))
+    buffered = BytesIO()
+    image.save(buffered, format="PNG")
+    return buffered.getvalue()
+
+def _sentence(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(_WORDS) for _ in range(words)).capitalize()
+
+def _random_box(rng: random.Random):
+    width = rng.randint(SLIDE_WIDTH // 12, SLIDE_WIDTH // 3)
+    height = rng.randint(SLIDE_HEIGHT // 14, SLIDE_HEIGHT // 4)
+    return rng.randint(0, SLIDE_WIDTH - width), rng.randint(SLIDE_HEIGHT // 6, SLIDE_HEIGHT - height), width, height
+
+def generate_deck(path: str, slides: int, shapes_per_slide: int = 12, image_every: int = 3,
+                  table_every: int = 5, group_every: int = 4, seed: int = 0) -> str:
+    """
+    Writes a synthetic deck to `path`: every slide gets a title plus `shapes_per_slide` text boxes
+    and auto shapes; every n-th slide also gets an image, a table or a group (0 disables).
+    Deterministic for a given seed.
+    """
+    rng = random.Random(seed)
+    prs = Presentation()
+    prs.slide_width, prs.slide_height = SLIDE_WIDTH, SLIDE_HEIGHT
+    layout = prs.slide_layouts[5]  # "Title Only", so placeholder inheritance is exercised
+    images = [_image_bytes(rng) for _ in range(4)]
+
+    for n in range(slides):
+        slide = prs.slides.add_slide(layout)
+        slide.shapes.title.text = f"Slide {n + 1}: {_sentence(rng, 4)}"
+        for i in range(shapes_per_slide):
+            left, top, width, height = _random_box(rng)
+            if i % 2:
+                shape = slide.shapes.add_textbox(left, top, width, height)
+            else:
+                shape = slide.shapes.add_shape(rng.choice(_AUTO_SHAPES), left, top, width, height)
+                shape.fill.solid()
+                shape.fill.fore_color.rgb = RGBColor(*(rng.randrange(256) for _ in range(3)))
+            paragraph = shape.text_frame.paragraphs[0]
+            paragraph.text = _sentence(rng, rng.randint(2, 12))
+            paragraph.runs[0].font.size = Pt(rng.choice([10, 12, 14, 18, 24]))
+
+        if image_every and n % image_every == 0:
+            left, top, width, height = _random_box(rng)
+            slide.shapes.add_picture(BytesIO(rng.choice(images)), left, top, width, height)
+        if table_every and n % table_every == 0:
+            rows, cols = rng.randint(3, 8), rng.randint(2, 6)
+            left, top, width, height = _random_box(rng)
+            table = slide.shapes.add_table(rows, cols, left, top, width, height).table
+            for r in range(rows):
+                for c in range(cols):
+                    table.cell(r, c).text = _sentence(rng, 2) if r == 0 else str(rng.randint(0, 9999))
+        if group_every and n % group_every == 0:
+            group = slide.shapes.add_group_shape()
+            for _ in range(3):
+                left, top, width, height = _random_box(rng)
+                group.shapes.add_shape(MSO_SHAPE.RECTANGLE, left, top, width // 2, height // 2)
+
+    prs.save(path)
+    logger.info(f"Generated synthetic deck with {slides} slides at {path}")
+    return path
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic PPTX deck for benchmarks.")
+    parser.add_argument("path")
+    parser.add_argument("--slides", type=int, default=10)
+    parser.add_argument("--shapes-per-slide", type=int, default=12)
+    parser.add_argument("--image-every", type=int, default=3)
+    parser.add_argument("--table-every", type=int, default=5)
+    parser.add_argument("--group-every", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    generate_deck(args.path, args.slides, args.shapes_per_slide, args.image_every, args.table_every, args.group_every, args.seed)
@@ -7,6 +7,8 @@ load_dotenv()
 
 # === API Keys ===
 LLM_API_KEY = os.getenv("LLM_API_KEY")
+# Overrides the Gemini API endpoint for every client, e.g. http://localhost:8090 for benchmarks/stub_llm_server.py
+LLM_BASE_URL = os.getenv("LLM_BASE_URL") or None
 
 # === Gemini Model Configs ===
 GEMINI_FLASH_2_0_MODEL = "gemini-2.0-flash-001"
@@ -17,4 +19,84 @@ GEMINI_EMBEDDINGS_MODEL = "models/text-embedding-004"
 LIBREOFFICE_PATH = r"C:\Program Files\LibreOffice\program\soffice.exe"
 POPPLER_PATH = r"C:\poppler-24.08.0\Library\bin"
 
-DOCKER_IMAGE_NAME = "pptx-automation-api:latest"
\ No newline at end of file
+DOCKER_IMAGE_NAME = "pptx-automation-api:latest"
+
+# === Slide Rendering ===
+# Slides are rasterized at this DPI; metadata "px" are points, so 1 px of metadata = RENDER_DPI / 72 image pixels.
+RENDER_DPI = 200
+
+# === Model Image Preparation ===
+MODEL_IMAGE_LONG_EDGE = int(os.getenv("MODEL_IMAGE_LONG_EDGE", "1024"))
+MODEL_IMAGE_FORMAT = os.getenv("MODEL_IMAGE_FORMAT", "JPEG").upper()  # JPEG or WEBP
+MODEL_IMAGE_QUALITY = int(os.getenv("MODEL_IMAGE_QUALITY", "80"))
+MODEL_IMAGE_GRAYSCALE_FOR_GEOMETRY = os.getenv("MODEL_IMAGE_GRAYSCALE_FOR_GEOMETRY", "false").lower() == "true"
+
+# === Region-of-Interest Crops ===
+ROI_CROP_PADDING_PX = 24
+ROI_CROP_MAX_AREA_FRACTION = 0.6  # above this the crop saves little; send the whole slide instead
+ROI_THUMBNAIL_LONG_EDGE = 384
+
+# === Set-of-Marks Annotation ===
+# Overlay shape ids and bounding boxes on the image the refiner sees, so targets can be read off the slide
+SET_OF_MARKS_ENABLED = os.getenv("SET_OF_MARKS_ENABLED", "true").lower() == "true"
+SET_OF_MARKS_LABEL_SIZE_PX = 12
+
+# === Wireframe Previews ===
+# Slide size in metadata px (points) for metadata-only wireframes; 16:9 decks are 960x540
+SLIDE_WIDTH_PX = 960
+SLIDE_HEIGHT_PX = 540
+WIREFRAME_SCALE = 1.0
+
+# === Derived Artifact Cache ===
+# Model images, annotated renders and LLM responses keyed on the sha256 of a slide render; byte-identical renders
+# share them across decks and re-uploads, anything else (even a near-identical edit) gets its own
+DERIVED_CACHE_DIR = "./uploaded_pptx/derived"
+DERIVED_CACHE_ENABLED = os.getenv("DERIVED_CACHE_ENABLED", "true").lower() == "true"
+
+# === Telemetry ===
+# "none", "console" or "otlp" (OTLP/gRPC to OTEL_EXPORTER_OTLP_ENDPOINT, default localhost:4317)
+OTEL_TRACES_EXPORTER = os.getenv("OTEL_TRACES_EXPORTER", "none").lower()
+
+# === LLM Transport (record/replay) ===
+# live | record | replay; see utils/llm_transport.py
+LLM_TRANSPORT = os.getenv("LLM_TRANSPORT", "live").lower()
+LLM_FIXTURE_DIR = os.getenv("LLM_FIXTURE_DIR", "./llm_fixtures")
+LLM_REPLAY_LATENCY = os.getenv("LLM_REPLAY_LATENCY", "recorded")  # "recorded" or seconds per call
+
+# === Request Profiling ===
+# Requests sending `X-Profile: <token>` (or ?profile=<token>) are sampled and saved to PROFILE_DIR; unset disables it
+PROFILING_TOKEN = os.getenv("PROFILING_TOKEN") or None
+PROFILE_DIR = os.getenv("PROFILE_DIR", "./profiles")
+PROFILE_MAX_KEPT = int(os.getenv("PROFILE_MAX_KEPT", "20"))
+PROFILE_SAMPLE_INTERVAL = 0.005  # seconds
+
+# === LLM Context Caching ===
+# "auto": static prompt prefixes (instructions, slide XML, slide image) are registered as provider cached content
+# once they reach the provider's minimum size; "off" always sends them inline. See utils/context_cache.py
+LLM_CONTEXT_CACHE = os.getenv("LLM_CONTEXT_CACHE", "auto").lower()
+CONTEXT_CACHE_TTL_SECONDS = int(os.getenv("CONTEXT_CACHE_TTL_SECONDS", "600"))
+CONTEXT_CACHE_MIN_TOKENS = 4096  # Gemini 2.0 Flash explicit caching minimum
+# Cached contents kept per process; the least recently used is deleted from the provider past this
+CONTEXT_CACHE_MAX_ENTRIES = int(os.getenv("CONTEXT_CACHE_MAX_ENTRIES", "256"))
+CONTEXT_CACHE_RETRY_SECONDS = 60  # after a failed creation, the prefix is sent inline for this long
+
+# === Direct Tasks ===
+# Fully specified classifier sub-tasks skip the category agent's LLM call; see utils/task_specificity.py
+DIRECT_TASKS_ENABLED = os.getenv("DIRECT_TASKS_ENABLED", "true").lower() == "true"
+
+# === Speculative Agent ===
+# Vague single-slide instructions start their guessed category agent while the classifier runs; see main.py
+SPECULATIVE_AGENT_ENABLED = os.getenv("SPECULATIVE_AGENT_ENABLED", "true").lower() == "true"
+
+# === Layout Analysis ===
+# Precomputed after uploads for general cleanup requests; see utils/layout_analysis.py
+LAYOUT_ANALYSIS_ENABLED = os.getenv("LAYOUT_ANALYSIS_ENABLED", "true").lower() == "true"
+LAYOUT_ALIGN_TOLERANCE_PX = 6  # edges closer than this (but not equal) count as misaligned
+LAYOUT_SIZE_TOLERANCE = 0.1  # same-type shapes within 10% of each other's size should match
+LAYOUT_GAP_TOLERANCE_PX = 4  # spread of gaps in a row or column before it counts as uneven
+
+# === Model Tiering ===
+# "auto": calls scoring below MODEL_TIER_THRESHOLD try the lite model first and escalate to the full model
+# when its output fails validation; "off" always uses the full model. See utils/model_router.py
+MODEL_TIERING = os.getenv("MODEL_TIERING", "auto").lower()
+MODEL_TIER_THRESHOLD = float(os.getenv("MODEL_TIER_THRESHOLD", "0.5"))
@@ -1,23 +1,33 @@
 # llmProvider.py
 import logging
-from langchain_google_genai import GoogleGenerativeAI, GoogleGenerativeAIEmbeddings, HarmBlockThreshold, HarmCategory
-from config.config import LLM_API_KEY, GEMINI_FLASH_2_0_MODEL, GEMINI_EMBEDDINGS_MODEL, GEMINI_FLASH_2_0_MODEL_LITE
-import google.api_core.exceptions
+from functools import lru_cache
+from config.config import LLM_API_KEY, LLM_BASE_URL, GEMINI_FLASH_2_0_MODEL, GEMINI_EMBEDDINGS_MODEL, GEMINI_FLASH_2_0_MODEL_LITE
 
 # Logging
 logging.basicConfig(level=logging.INFO)
 
+# Providers are built on first use and then shared. langchain_google_genai and google-genai are
+# imported inside the functions below, so importing this module (and main) stays cheap and replay
+# runs never need an API key.
+
+# === Endpoint Override ===
+# With LLM_BASE_URL set, langchain talks REST to that host instead of gRPC to Google
+endpoint_options = {"client_options": {"api_endpoint": LLM_BASE_URL}, "transport": "rest"} if LLM_BASE_URL else {}
+
 # === Gemini Safety Settings ===
-safety_settings = {
-    HarmCategory.HARM_CATEGORY_UNSPECIFIED: HarmBlockThreshold.BLOCK_ONLY_HIGH,
-    HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_ONLY_HIGH,
-    HarmCategory.HARM_CATEGORY_HATE_SPEECH: HarmBlockThreshold.BLOCK_ONLY_HIGH,
-    HarmCategory.HARM_CATEGORY_HARASSMENT: HarmBlockThreshold.BLOCK_ONLY_HIGH,
-    HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT: HarmBlockThreshold.BLOCK_ONLY_HIGH,
-}
+def _safety_settings():
+    from langchain_google_genai import HarmBlockThreshold, HarmCategory
+    return {
+        HarmCategory.HARM_CATEGORY_UNSPECIFIED: HarmBlockThreshold.BLOCK_ONLY_HIGH,
+        HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_ONLY_HIGH,
+        HarmCategory.HARM_CATEGORY_HATE_SPEECH: HarmBlockThreshold.BLOCK_ONLY_HIGH,
+        HarmCategory.HARM_CATEGORY_HARASSMENT: HarmBlockThreshold.BLOCK_ONLY_HIGH,
+        HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT: HarmBlockThreshold.BLOCK_ONLY_HIGH,
+    }
 
 # === Model Initialization Functions ===
 def initialize_gemini_llm(model_name):
+    from langchain_google_genai import GoogleGenerativeAI
     try:
         return GoogleGenerativeAI(
             model=model_name,
@@ -27,26 +37,52 @@ def initialize_gemini_llm(model_name):
             verbose=True,
             timeout=None,
             max_retries=2,
-            safety_settings=safety_settings
+            safety_settings=_safety_settings(),
+            **endpoint_options
         )
     except Exception as e:
         if "429 Resource has been exhausted" in str(e):
             logging.warning("API quota exhausted.")
         logging.error(f"Failed to initialize LLM {model_name}: {str(e)}")
         raise
-    
+
 def initialize_gemini_embeddings():
+    from langchain_google_genai import GoogleGenerativeAIEmbeddings
+    import google.api_core.exceptions
     try:
         return GoogleGenerativeAIEmbeddings(model=GEMINI_EMBEDDINGS_MODEL, google_api_key=LLM_API_KEY)
     except google.api_core.exceptions.ResourceExhausted:
         logging.warning("API key limit exhausted for Gemini Embeddings. Please check your quota or use a different API key.")
-        raise 
+        raise
 
     except Exception as e:
         logging.error(f"Failed to initialize embeddings: {str(e)}")
-        raise 
+        raise
+
+def create_genai_client():
+    """google-genai client used by the agents, pointed at LLM_BASE_URL when set."""
+    from google import genai
+    http_options = genai.types.HttpOptions(base_url=LLM_BASE_URL) if LLM_BASE_URL else None
+    return genai.Client(api_key=LLM_API_KEY, http_options=http_options)
+
+# === Shared Instances (memoized) ===
+@lru_cache(maxsize=None)
+def get_gemini_flash_llm():
+    return initialize_gemini_llm(GEMINI_FLASH_2_0_MODEL)
+
+@lru_cache(maxsize=None)
+def get_gemini_flash_llm_lite():
+    return initialize_gemini_llm(GEMINI_FLASH_2_0_MODEL_LITE)
+
+@lru_cache(maxsize=None)
+def get_gemini_embeddings():
+    return initialize_gemini_embeddings()
+
+@lru_cache(maxsize=None)
+def get_genai_client():
+    return create_genai_client()
 
-# === Client Instances ===
-gemini_flash_llm = initialize_gemini_llm(GEMINI_FLASH_2_0_MODEL)
-gemini_flash_llm_lite = initialize_gemini_llm(GEMINI_FLASH_2_0_MODEL_LITE)
-gemini_embeddings = initialize_gemini_embeddings()
\ No newline at end of file
+def image_part(data: bytes, mime_type: str):
+    """Inline image part for a google-genai prompt."""
+    from google.genai import types
+    return types.Part.from_bytes(data=data, mime_type=mime_type)
@@ -0,0 +1,48 @@
+# feedback_parsing/category_guess.py
+import re
+from typing import Any, Dict, List, Optional
+
+# Local, LLM-free guess of what the classifier will return for a vague single-slide instruction
+# ("clean up this slide", "make it look better"). main.py starts the category agent on the guess while
+# the real classification runs, and keeps the result only if the classifier produced the same task.
+
+# The general task the classifier emits per category for a vague current-slide instruction
+GENERAL_ACTIONS = {
+    "cleanup": "general_slide_cleanup",
+    "formatting": "general_slide_formatting",
+    "visual_enhancement": "general_visual_enhancement",
+}
+
+_CATEGORY_PATTERNS = [
+    ("cleanup", re.compile(r"\b(clean\s*-?\s*up|cleanup|tidy|declutter|messy)\b")),
+    ("visual_enhancement", re.compile(r"\b(look (better|nicer|more \w+)|visually|visuals?|more (engaging|appealing|impactful)|enhance|spruce|beautify)\b")),
+    ("formatting", re.compile(r"\b(format|reformat|formatting|make it consistent)\b")),
+]
+# Anything naming a target, value or other slide makes the classifier emit a specific task instead
+_SPECIFIC = re.compile(r"\b(slides? \d+|all slides|presentation|deck|title|font|colou?r|bullet|table|chart|image|icon|box|\d+ ?pt|\d+)\b")
+_MAX_WORDS = 10
+
+def guess_general_task(instruction: str) -> Optional[Dict[str, Any]]:
+    """The category and general task the classifier is expected to produce, or None when it is not predictable."""
+    text = instruction.strip().lower()
+    if not text or len(text.split()) > _MAX_WORDS or _SPECIFIC.search(text):
+        return None
+    for category, pattern in _CATEGORY_PATTERNS:
+        if pattern.search(text):
+            return {"category": category,
+                    "tasks": [{"action": GENERAL_ACTIONS[category], "target_element_hint": None, "params": {}}]}
+    return None
+
+def matches_guess(guess: Dict[str, Any], categorized_tasks: List[Dict[str, Any]], slide_number: int) -> bool:
+    """Whether the classifier's output would have called the guessed agent with the same input on the same slide."""
+    if len(categorized_tasks) != 1:
+        return False
+    task = categorized_tasks[0]
+    return (task.get("category") == guess["category"]
+            and task.get("instruction_scope", "current_slide") == "current_slide"
+            and task.get("target_slide_indices", [slide_number]) == [slide_number]
+            and [_normalized(sub_task) for sub_task in task.get("tasks", [])] == guess["tasks"])
+
+def _normalized(sub_task: Dict[str, Any]) -> Dict[str, Any]:
+    return {"action": sub_task.get("action"), "target_element_hint": sub_task.get("target_element_hint") or None,
+            "params": sub_task.get("params") or {}}
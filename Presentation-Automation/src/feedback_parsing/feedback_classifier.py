@@ -1,8 +1,11 @@
 # feedback_classifier.py
 import json, logging, re
 from typing import List, Dict, Any, Optional
-from langchain.prompts import PromptTemplate
-from config.llmProvider import gemini_flash_llm
+from functools import lru_cache
+from config.llmProvider import get_gemini_flash_llm, get_gemini_flash_llm_lite
+from config.config import GEMINI_FLASH_2_0_MODEL
+from utils.telemetry import traced, llm_span
+from utils import llm_transport, model_router
 
 FEEDBACK_CLASSIFICATION_PROMPT = """
     You are an advanced AI assistant and an expert specializing in analyzing feedback for PowerPoint presentations.
@@ -87,12 +90,18 @@ FEEDBACK_CLASSIFICATION_PROMPT = """
         - "params": (Object) Dictionary of parameters. (e.g., {{"font_name": "Arial", "size": 12}}, {{"alignment": "top"}}). Note: JSON requires double quotes.
 """
 
-classification_prompt = PromptTemplate(
-    template=FEEDBACK_CLASSIFICATION_PROMPT,
-    input_variables=["slide_number", "source", "instruction_text", "total_slides"] 
-)
+_VALID_CLASSIFICATION = model_router.has_all_json_keys(
+    "category", "slide_number", "original_instruction", "instruction_scope", "target_slide_indices", "tasks")
 
-classification_chain = classification_prompt | gemini_flash_llm
+@lru_cache(maxsize=None)
+def get_classification_chain(tier: str = "full"):
+    """Built on the first live classification per model tier; langchain is not imported before that."""
+    from langchain.prompts import PromptTemplate
+    classification_prompt = PromptTemplate(
+        template=FEEDBACK_CLASSIFICATION_PROMPT,
+        input_variables=["slide_number", "source", "instruction_text", "total_slides"] 
+    )
+    return classification_prompt | (get_gemini_flash_llm_lite() if tier == "lite" else get_gemini_flash_llm())
 
 # === Feedback Parser ===
 def parse_feedback_instruction(instruction_item: Dict[str, Any]) -> Optional[Dict[str, Any]]:
@@ -113,12 +122,21 @@ def parse_feedback_instruction(instruction_item: Dict[str, Any]) -> Optional[Dic
         return None
     
     try:
-        response = classification_chain.invoke({
-            "slide_number": slide_num,
-            "source": source,
-            "instruction_text": instruction_text,
-            "total_slides": total_slides # Pass the count
-        })
+        with llm_span("llm.classify", GEMINI_FLASH_2_0_MODEL, [FEEDBACK_CLASSIFICATION_PROMPT, instruction_text]) as span:
+            inputs = {
+                "slide_number": slide_num,
+                "source": source,
+                "instruction_text": instruction_text,
+                "total_slides": total_slides # Pass the count
+            }
+            response = model_router.call_tiered(
+                "classify", [FEEDBACK_CLASSIFICATION_PROMPT, instruction_text],
+                lambda tier: llm_transport.invoke_chain(
+                    lambda: get_classification_chain(tier), inputs, call_site="classify",
+                    model=model_router.MODELS[tier], template=FEEDBACK_CLASSIFICATION_PROMPT),
+                _VALID_CLASSIFICATION,
+            )
+            span.set_attribute("llm.response_chars", len(response))
         raw_response_text = response.strip()
         logging.info(f"LLM Raw Response for Classification: {raw_response_text}")
 
@@ -163,6 +181,7 @@ def parse_feedback_instruction(instruction_item: Dict[str, Any]) -> Optional[Dic
         return None
     
 # === Batch Classifier ===
+@traced("pipeline.classify")
 def classify_feedback_instructions(feedback_list: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
     categorized_tasks = []
     for feedback in feedback_list:
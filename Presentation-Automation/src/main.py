@@ -1,7 +1,7 @@
 # main.py
-import asyncio, json, logging, os, uvicorn
+import asyncio, json, logging, os, threading, uvicorn
 from typing import Dict, List
-from fastapi import FastAPI, Query
+from fastapi import FastAPI, HTTPException, Query, Response
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 
@@ -9,6 +9,7 @@ from pydantic import BaseModel
 from routes.metadata_handler import router as metadata_router
 from routes.pptx_handler import router as pptx_router
 from feedback_parsing.feedback_classifier import classify_feedback_instructions
+from feedback_parsing.category_guess import guess_general_task, matches_guess
 
 # === Agent & Context Imports ===
 from agents.cleanup_agent import cleanup_agent
@@ -17,16 +18,52 @@ from agents.refiner_agent import refiner_agent
 from agents.code_generation_agent import generate_code
 from agents.visual_enhancement_agent import visual_enhancement_agent
 
-from utils.load_files import load_slide_contexts
+from utils.load_files import get_slide_contexts
+from utils import llm_transport
+from utils.layout_analysis import get_layout_analysis
+from utils.workspace import DEFAULT_DECK_ID, get_workspace
+from utils.metadata_store import get_metadata_store
+from utils.wireframe import render_wireframe, render_before_after, wireframe_png
+from utils.slide_manifest import load_slide_size
+from utils.telemetry import setup_telemetry
+from utils.metrics import REQUESTS_IN_FLIGHT, render_metrics, observe_speculation
+from config.config import SPECULATIVE_AGENT_ENABLED
+from utils.profiling import RequestProfile, profile_requested
 
 # --- Logging Configuration ---
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+CATEGORY_AGENTS = {
+    "formatting": formatting_agent,
+    "cleanup": cleanup_agent,
+    "visual_enhancement": visual_enhancement_agent,
+}
+
+async def _speculative_agent(guess: Dict, instruction: str, workspace, slide_number: int, abandoned: threading.Event):
+    """
+    Loads the current slide's context and runs the guessed category agent on it; (slide contexts, agent result).
+    Once `abandoned` is set the agent makes no further model calls; one already in flight still completes.
+    """
+    llm_transport.abandon_when(abandoned)
+    context_loaded = await get_slide_contexts(workspace, [slide_number])
+    slide_context = context_loaded.get(slide_number)
+    if not guess or not slide_context:
+        return context_loaded, None
+    task = {"category": guess["category"], "slide_number": slide_number,
+            "original_instruction": instruction, "tasks": guess["tasks"]}
+    extra = await _agent_inputs(guess["category"], workspace, slide_number)
+    return context_loaded, await asyncio.to_thread(CATEGORY_AGENTS[guess["category"]], task, slide_context, **extra)
+
+async def _agent_inputs(category: str, workspace, slide_number: int) -> Dict:
+    """Per-category extra agent arguments: cleanup gets the slide's precomputed layout analysis, if current."""
+    if category == "cleanup":
+        return {"layout_analysis": await asyncio.to_thread(get_layout_analysis, workspace.deck_id, slide_number)}
+    return {}
+
 # --- FastAPI App Initialization ---
 app = FastAPI(title="Slide Enhancement API", version="1.0.0")
-
-slide_context_cache: dict[int, dict] = {}
+setup_telemetry(app)
 
 # --- CORS Middleware ---
 origins = ["*"]
@@ -38,11 +75,37 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# --- In-flight Request Gauge ---
+@app.middleware("http")
+async def track_in_flight(request, call_next):
+    if request.url.path == "/metrics":
+        return await call_next(request)
+    with REQUESTS_IN_FLIGHT.track_inprogress():
+        return await call_next(request)
+
+# --- Opt-in Request Profiling ---
+@app.middleware("http")
+async def profile_on_request(request, call_next):
+    if not profile_requested(request.headers, request.query_params):
+        return await call_next(request)
+    profile = RequestProfile(request.method, request.url.path)
+    profile.start()
+    status_code = None
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+    finally:
+        profile.stop()
+        await asyncio.to_thread(profile.save, status_code)
+    response.headers["X-Profile-Id"] = profile.profile_id
+    return response
+
 # --- Pydantic Models for Request Bodies ---
 class InstructionRequest(BaseModel):
     instruction: str
     slide_index: int
     total_slides: int
+    deck_id: str = DEFAULT_DECK_ID
 
 # === Route Registration ===
 try:
@@ -58,12 +121,11 @@ async def process_instruction(request: InstructionRequest):
     logger.info(f"Target slide index: {request.slide_index}")
     logger.info(f"Total slide: {request.total_slides}")
 
-    slide_images_dir = "uploaded_pptx/slide_images/presentation"
+    workspace = get_workspace(request.deck_id)
     slide_number = request.slide_index
 
-    slide_image_path = os.path.join(slide_images_dir, f"slide{slide_number}_image.txt")
-    slide_xml_path = os.path.join(slide_images_dir, f"slide{slide_number}.xml")
-    slide_png_path = os.path.join(slide_images_dir, f"slide{slide_number}.png")
+    slide_image_path = workspace.slide_file(slide_number, "_image.txt")
+    slide_xml_path = workspace.slide_file(slide_number, ".xml")
 
     if not (os.path.exists(slide_image_path) and os.path.exists(slide_xml_path)):
         logger.error(f"Slide context files for slide {slide_number} do not exist!")
@@ -76,9 +138,38 @@ async def process_instruction(request: InstructionRequest):
         "total_slides": request.total_slides,
         "source": "user_input"
     }
-    categorized_tasks = classify_feedback_instructions([feedback_item])
+    # The current slide's context, and for predictable vague instructions its category agent,
+    # run while the classifier does; the agent result is kept only if the classifier agrees.
+    guess = guess_general_task(request.instruction) if SPECULATIVE_AGENT_ENABLED else None
+    abandoned = threading.Event()
+    speculation = asyncio.create_task(_speculative_agent(guess, request.instruction, workspace, slide_number, abandoned))
+    try:
+        categorized_tasks = await asyncio.to_thread(classify_feedback_instructions, [feedback_item])
+    except BaseException:
+        abandoned.set()
+        speculation.cancel()
+        raise
     logger.info(f"Categorized Tasks: {len(categorized_tasks)}")
 
+    speculative_result = None
+    if guess and matches_guess(guess, categorized_tasks, slide_number):
+        try:
+            _, speculative_result = await speculation
+            observe_speculation("committed")
+            logger.info(f"Speculative {guess['category']} agent result committed for slide {slide_number}")
+        except Exception as e:
+            logger.warning(f"Speculative {guess['category']} agent failed, running it again: {e}")
+            observe_speculation("failed")
+    else:
+        if guess:
+            # Cancelling the task cannot stop the agent's worker thread; the event stops it before its next model call
+            abandoned.set()
+            speculation.cancel()
+            observe_speculation("discarded")
+            logger.info(f"Classifier disagreed with the {guess['category']} guess; speculative result discarded")
+        else:
+            await asyncio.gather(speculation, return_exceptions=True)
+
     if not categorized_tasks:
         return {"status": "no_tasks", "message": "No actionable feedback classified."}
 
@@ -90,13 +181,7 @@ async def process_instruction(request: InstructionRequest):
     logger.info(f"Scope: {target_scope}, Target Slides: {target_slides}")
 
     # --- Load Context for Target Slides ---
-    uncached = [i for i in target_slides if i not in slide_context_cache]
-    if uncached:
-        logger.info(f"Loading context for uncached slides: {uncached}")
-        loaded = await load_slide_contexts(uncached)
-        slide_context_cache.update(loaded)
-
-    context_loaded = {i: slide_context_cache[i] for i in target_slides if i in slide_context_cache}
+    context_loaded = await get_slide_contexts(workspace, target_slides)
     logger.info(f"Context loaded for {len(context_loaded)} slides.")
 
     # --- Run Agents ---
@@ -104,7 +189,7 @@ async def process_instruction(request: InstructionRequest):
     all_task_specifications = []
 
     for slide_id in target_slides:
-        slide_context = slide_context_cache.get(slide_id)
+        slide_context = context_loaded.get(slide_id)
         if not slide_context:
             logger.warning(f"Missing context for slide {slide_id}")
             continue
@@ -114,10 +199,12 @@ async def process_instruction(request: InstructionRequest):
             task["slide_number"] = slide_id
 
             try:
-                if category == "formatting":
+                if speculative_result is not None and slide_id == slide_number:
+                    result = speculative_result
+                elif category == "formatting":
                     result = formatting_agent(task, slide_context)
                 elif category == "cleanup":
-                    result = cleanup_agent(task, slide_context)
+                    result = cleanup_agent(task, slide_context, **await _agent_inputs(category, workspace, slide_id))
                 elif category == "visual_enhancement":
                     result = visual_enhancement_agent(task, slide_context)
                 else:
@@ -131,7 +218,7 @@ async def process_instruction(request: InstructionRequest):
                         r["original_instruction"] = task["original_instruction"]
 
                     # Save individual result for this slide
-                    slide_path = os.path.join(slide_images_dir, f"slide{slide_id}_tasks.json")
+                    slide_path = workspace.slide_file(slide_id, "_tasks.json")
                     with open(slide_path, "w", encoding="utf-8") as f:
                         json.dump(result, f, indent=4)
                     # logger.info(f"Saved processed subtasks to: {slide_path}")
@@ -142,7 +229,7 @@ async def process_instruction(request: InstructionRequest):
 
     #  --- Save task_specifications as JSON ---
     try:
-        json_output_path = os.path.join(slide_images_dir, f"slide{slide_number}_tasks.json")
+        json_output_path = workspace.slide_file(slide_number, "_tasks.json")
         with open(json_output_path, "w", encoding="utf-8") as f:
             json.dump(all_task_specifications, f, indent=4)
         logger.info(f"Saved processed subtasks to: {json_output_path}")
@@ -157,7 +244,7 @@ async def process_instruction(request: InstructionRequest):
 
         if slide_context: 
             refiner_tasks.append(
-                refiner_agent(slide_number=slide_id, slide_context=slide_context)
+                refiner_agent(slide_number=slide_id, slide_context=slide_context, workspace=workspace)
             )
         else:
             logger.warning(f"Skipping refinement task creation for slide {slide_id} due to missing context.")
@@ -200,7 +287,7 @@ async def process_instruction(request: InstructionRequest):
     for slide_id in target_slides:
         if slide_id in all_refined_instructions_dict and all_refined_instructions_dict[slide_id]:
              code_gen_tasks.append(
-                 generate_code(target_slide_index=slide_id) # Call async function
+                 generate_code(target_slide_index=slide_id, workspace=workspace) # Call async function
              )
         else:
             logger.warning(f"Skipping code generation for slide {slide_id} due to missing/empty refined instructions.")
@@ -241,6 +328,7 @@ async def process_instruction(request: InstructionRequest):
     return {
         "status": "success",
         "message": "Process completed (Placeholders used).",
+        "deck_id": workspace.deck_id,
         "category": category,
         "instruction_scope": target_scope,
         "target_slide_indices": target_slides,
@@ -250,19 +338,49 @@ async def process_instruction(request: InstructionRequest):
     }    
 
 @app.get("/get-slide-context")
-async def get_slide_context(target_slides: List[int] = Query(..., description="Target slide indices")):
-    uncached = [i for i in target_slides if i not in slide_context_cache]
-    if uncached:
-        loaded = await load_slide_contexts(uncached)
-        slide_context_cache.update(loaded)
-
-    result = {i: slide_context_cache[i] for i in target_slides if i in slide_context_cache}
+async def get_slide_context(
+    target_slides: List[int] = Query(..., description="Target slide indices"),
+    deck_id: str = Query(DEFAULT_DECK_ID, description="Deck/session id")
+):
+    result = await get_slide_contexts(get_workspace(deck_id), target_slides)
     return {
         "message": "Context loaded",
         "count": len(result),
         "data": result
     }
 
+@app.get("/slide-wireframe")
+async def slide_wireframe(
+    slide_number: int = Query(..., description="Slide index"),
+    deck_id: str = Query(DEFAULT_DECK_ID, description="Deck/session id"),
+    before_after: bool = Query(False, description="Side-by-side original vs. the refiner's simulated result")
+):
+    """Metadata-only wireframe PNG of a slide; no LibreOffice/poppler render involved."""
+    workspace = get_workspace(deck_id)
+    shapes = get_metadata_store().get_slide(workspace.deck_id, slide_number)
+    if not shapes and os.path.exists(workspace.metadata_file(slide_number)):
+        with open(workspace.metadata_file(slide_number), "r", encoding="utf-8") as f:
+            shapes = json.load(f)
+    if not shapes:
+        raise HTTPException(status_code=404, detail=f"No shape metadata for slide {slide_number}.")
+    slide_size = load_slide_size(workspace.manifest_path)
+
+    if before_after:
+        simulated_path = workspace.slide_file(slide_number, "_simulated_metadata.json")
+        if not os.path.exists(simulated_path):
+            raise HTTPException(status_code=404, detail=f"No simulated result for slide {slide_number}; run an instruction first.")
+        with open(simulated_path, "r", encoding="utf-8") as f:
+            simulated = json.load(f)
+        png = await asyncio.to_thread(lambda: wireframe_png(render_before_after(shapes, simulated, slide_size=slide_size)))
+    else:
+        png = await asyncio.to_thread(lambda: wireframe_png(render_wireframe(shapes, slide_size=slide_size)))
+    return Response(content=png, media_type="image/png")
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
 if __name__ == "__main__":
     logger.info("Starting Uvicorn server for development...")
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
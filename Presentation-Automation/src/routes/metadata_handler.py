@@ -1,15 +1,23 @@
 # metadata_handler.py
-from fastapi import APIRouter, HTTPException, Body, status
+from fastapi import APIRouter, HTTPException, Body, Query, Request, status
 from pydantic import BaseModel
-import os, shutil, json, logging, aiofiles
+from typing import Any, Dict, List
+import os, re, shutil, json, logging, aiofiles, asyncio, hashlib, uuid, zlib
+from utils.workspace import DEFAULT_DECK_ID, Workspace, get_workspace
+from utils.metadata_store import get_metadata_store
+from utils.layout_analysis import schedule_layout_analysis
+from utils.shared_state import get_shared_state
 
 router = APIRouter()
 
 class MetadataPayload(BaseModel):
     data: dict | list
     filename: str = "metadata.json"
+    deck_id: str = DEFAULT_DECK_ID
 
-BASE_SAVE_PATH = "./uploaded_pptx/slide_images/metadata"
+# Upper bound on the bulk body as received and after decompression, so a small gzip payload cannot expand without limit.
+MAX_BULK_METADATA_BYTES = 64 * 1024 * 1024
+METADATA_FILENAME_PATTERN = re.compile(r"^metadata_(\d+)\.json$")
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -34,8 +42,6 @@ def clear_directory_contents(directory_path: str):
         except Exception as e:
             logger.error(f"Failed to delete {file_path}. Reason: {e}")
 
-cleared_once = False
-
 # --- Metadata Upload Handler ---
 @router.post(
     "",
@@ -45,23 +51,28 @@ cleared_once = False
 async def upload_metadata(payload: MetadataPayload = Body(...)):
     """
     Receives slide metadata and saves it to a JSON file.
-    On first call, clears the metadata directory to remove old files.
+    On first call for a deck, clears that deck's metadata directory to remove old files.
     """
-    global cleared_once
+    workspace = get_workspace(payload.deck_id)
     try:
-        os.makedirs(BASE_SAVE_PATH, exist_ok=True)
-        # Clear directory contents only once per session
-        if not cleared_once:
-            clear_directory_contents(BASE_SAVE_PATH)
-            cleared_once = True
+        os.makedirs(workspace.metadata_dir, exist_ok=True)
+        # Clear directory contents only once per deck session (claimed in shared state, so only one worker clears)
+        if get_shared_state().claim_metadata_clear(workspace.deck_id):
+            clear_directory_contents(workspace.metadata_dir)
+            get_metadata_store().delete_deck(workspace.deck_id)
 
         safe_filename = os.path.basename(payload.filename)
-        save_path = os.path.join(BASE_SAVE_PATH, safe_filename)
+        save_path = os.path.join(workspace.metadata_dir, safe_filename)
 
         async with aiofiles.open(save_path, "w", encoding="utf-8") as f:
             json_string = json.dumps(payload.data, indent=2)
             await f.write(json_string)
 
+        filename_match = METADATA_FILENAME_PATTERN.match(safe_filename)
+        if filename_match and isinstance(payload.data, list):
+            get_metadata_store().replace_slide(workspace.deck_id, int(filename_match.group(1)), payload.data)
+            schedule_layout_analysis(workspace.deck_id, [int(filename_match.group(1))])
+
         logger.info(f"[UPLOAD] Metadata saved: {save_path}")
         return {"message": "Metadata saved successfully.", "saved_file": safe_filename, "path": save_path}
 
@@ -70,4 +81,157 @@ async def upload_metadata(payload: MetadataPayload = Body(...)):
     except IOError as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Failed to save metadata file due to IO error: {e}")
     except Exception as e:
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"An unexpected error occurred: {e}")
\ No newline at end of file
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"An unexpected error occurred: {e}")
+
+# --- Bulk Metadata Helpers ---
+def _decompress_body(raw: bytes, content_encoding: str) -> bytes:
+    if "gzip" not in content_encoding and not raw.startswith(b"\x1f\x8b"):
+        if len(raw) > MAX_BULK_METADATA_BYTES:
+            raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail="Metadata payload too large.")
+        return raw
+    try:
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        data = decompressor.decompress(raw, MAX_BULK_METADATA_BYTES + 1)
+    except zlib.error as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Invalid gzip data: {e}")
+    if len(data) > MAX_BULK_METADATA_BYTES or decompressor.unconsumed_tail:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail="Decompressed metadata payload too large.")
+    return data
+
+def _parse_bulk_slides(body: bytes, content_type: str) -> List[Dict[str, Any]]:
+    """
+    Accepts either a JSON object {"slides": [{"slide_index": 0, "shapes": [...]}, ...]}
+    or NDJSON with one {"slide_index": ..., "shapes": [...]} record per line.
+    """
+    try:
+        text = body.decode("utf-8")
+        if "ndjson" in content_type or "jsonl" in content_type:
+            return [json.loads(line) for line in text.splitlines() if line.strip()]
+        parsed = json.loads(text)
+    except (UnicodeDecodeError, json.JSONDecodeError) as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Invalid JSON data provided: {e}")
+    slides = parsed.get("slides") if isinstance(parsed, dict) else parsed
+    if not isinstance(slides, list):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Expected a list of slide records under 'slides'.")
+    return slides
+
+def _validate_bulk_slides(slides: List[Any]) -> Dict[int, List[Dict[str, Any]]]:
+    """Validates every record in one pass and reports all problems together."""
+    errors: List[str] = []
+    by_index: Dict[int, List[Dict[str, Any]]] = {}
+    for pos, record in enumerate(slides):
+        if not isinstance(record, dict):
+            errors.append(f"record {pos}: not an object")
+            continue
+        index, shapes = record.get("slide_index"), record.get("shapes")
+        if not isinstance(index, int) or isinstance(index, bool) or index < 0:
+            errors.append(f"record {pos}: 'slide_index' must be a non-negative integer")
+            continue
+        if index in by_index:
+            errors.append(f"record {pos}: duplicate slide_index {index}")
+            continue
+        if not isinstance(shapes, list):
+            errors.append(f"slide {index}: 'shapes' must be a list")
+            continue
+        bad = [i for i, shape in enumerate(shapes) if not isinstance(shape, dict) or "id" not in shape]
+        if bad:
+            errors.append(f"slide {index}: shapes at positions {bad[:10]} are missing an 'id'")
+            continue
+        by_index[index] = shapes
+    if errors:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=errors)
+    return by_index
+
+def _write_metadata_atomically(workspace: Workspace, by_index: Dict[int, List[Dict[str, Any]]]) -> Dict[int, str]:
+    """
+    Writes all slides into a new sibling directory and repoints the metadata_dir
+    symlink at it with a single rename, so readers see either the previous
+    metadata set or the complete new one, never a missing directory. The first
+    bulk upload into a plain metadata directory has to move it aside before the
+    symlink takes its place; only that one swap is not atomic.
+    """
+    target_dir = workspace.metadata_dir
+    version_dir = f"{target_dir}.v-{uuid.uuid4().hex}"
+    link_tmp = f"{target_dir}.link-{uuid.uuid4().hex}"
+    os.makedirs(version_dir)
+    hashes: Dict[int, str] = {}
+    try:
+        for index, shapes in sorted(by_index.items()):
+            encoded = json.dumps(shapes, separators=(",", ":")).encode("utf-8")
+            with open(os.path.join(version_dir, f"metadata_{index}.json"), "wb") as f:
+                f.write(encoded)
+            hashes[index] = hashlib.sha256(encoded).hexdigest()
+
+        os.symlink(os.path.basename(version_dir), link_tmp)
+        if os.path.islink(target_dir):
+            retired_dir = os.path.realpath(target_dir)
+        elif os.path.isdir(target_dir):
+            retired_dir = f"{target_dir}.old-{uuid.uuid4().hex}"
+            os.replace(target_dir, retired_dir)
+        else:
+            retired_dir = None
+        os.replace(link_tmp, target_dir)
+        if retired_dir:
+            shutil.rmtree(retired_dir, ignore_errors=True)
+    except Exception:
+        for path in (link_tmp, version_dir):
+            if os.path.islink(path):
+                os.unlink(path)
+            else:
+                shutil.rmtree(path, ignore_errors=True)
+        raise
+    return hashes
+
+async def _read_body(request: Request) -> bytes:
+    """The request body, refused with 413 as soon as it exceeds MAX_BULK_METADATA_BYTES (compressed or not)."""
+    too_large = HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail="Metadata payload too large.")
+    try:
+        declared = int(request.headers.get("content-length", "0"))
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid Content-Length.")
+    if declared > MAX_BULK_METADATA_BYTES:
+        raise too_large
+    chunks, received = [], 0
+    async for chunk in request.stream():
+        received += len(chunk)
+        if received > MAX_BULK_METADATA_BYTES:
+            raise too_large
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+# --- Bulk Metadata Upload Handler ---
+@router.post(
+    "/bulk",
+    status_code=status.HTTP_200_OK,
+    response_model=dict
+)
+async def upload_metadata_bulk(request: Request, deck_id: str = Query(DEFAULT_DECK_ID)):
+    """
+    Receives the whole deck's shape metadata in one (optionally gzip-compressed)
+    JSON or NDJSON body and replaces the deck's metadata directory in one step.
+    Returns a sha256 content hash per slide.
+    """
+    workspace = get_workspace(deck_id)
+    raw = await _read_body(request)
+    body = _decompress_body(raw, request.headers.get("content-encoding", "").lower())
+    by_index = _validate_bulk_slides(_parse_bulk_slides(body, request.headers.get("content-type", "").lower()))
+
+    try:
+        async with workspace.lock:
+            os.makedirs(os.path.dirname(workspace.metadata_dir), exist_ok=True)
+            hashes = await asyncio.to_thread(_write_metadata_atomically, workspace, by_index)
+            store = get_metadata_store()
+            await asyncio.to_thread(store.delete_deck, workspace.deck_id)
+            await asyncio.to_thread(store.replace_slides, workspace.deck_id, by_index)
+            await asyncio.to_thread(get_shared_state().mark_metadata_cleared, workspace.deck_id)
+        schedule_layout_analysis(workspace.deck_id, by_index.keys())
+    except OSError as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Failed to save metadata files due to IO error: {e}")
+
+    logger.info(f"[UPLOAD] Bulk metadata saved for deck '{workspace.deck_id}': {len(hashes)} slides ({len(raw)} bytes received)")
+    return {
+        "message": "Metadata saved successfully.",
+        "deck_id": workspace.deck_id,
+        "slides_saved": len(hashes),
+        "hashes": {str(index): digest for index, digest in hashes.items()}
+    }
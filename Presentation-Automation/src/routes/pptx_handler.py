@@ -1,20 +1,35 @@
-from fastapi import APIRouter, HTTPException, Body, status
+from fastapi import APIRouter, HTTPException, Body, Query, Request, status
 from pydantic import BaseModel, Field
-import base64, os, shutil, aiofiles, logging
-from pptx import Presentation
+import asyncio, base64, json, os, re, shutil, time, uuid, aiofiles, logging
+from typing import Dict
 from utils.utils import convert_pptx_to_pdf, generate_slide_context
+from utils.pptx_reader import SlideReader
+from utils.shape_metadata import EMU_PER_PX
+from utils.slide_manifest import load_manifest, save_manifest, changed_slides
+from utils.workspace import DEFAULT_DECK_ID, DeckLock, Workspace, discard_lock, get_workspace
+from utils.load_files import invalidate_slide_contexts
+from utils.metadata_store import get_metadata_store
+from utils.layout_analysis import schedule_layout_analysis
 
 router = APIRouter()
 
 # --- Configuration ---
-SAVE_DIR = "./uploaded_pptx"
-os.makedirs(SAVE_DIR, exist_ok=True)
-SLIDE_IMAGE_DIR = "./uploaded_pptx/slide_images"
+UPLOADS_DIR = "./uploaded_pptx/uploads"
+STREAM_CHUNK_SIZE = 1024 * 1024
+MAX_PPTX_BYTES = 512 * 1024 * 1024
+UPLOAD_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+UPLOAD_SESSION_TTL_SECONDS = 24 * 3600  # chunked uploads untouched this long are deleted
 
 # --- Pydantic Model ---
 class PPTXPayload(BaseModel):
     base64: str = Field(..., description="Base64 encoded content of the PPTX file")
     filename: str = "presentation.pptx"
+    deck_id: str = Field(DEFAULT_DECK_ID, description="Deck/session id that owns the uploaded files")
+
+class ChunkedUploadInit(BaseModel):
+    filename: str = "presentation.pptx"
+    deck_id: str = DEFAULT_DECK_ID
+    total_size: int | None = Field(None, description="Expected size in bytes, if known")
 
 # --- Logging ---
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -39,60 +54,261 @@ def clear_directory_contents(directory_path: str):
         except Exception as e:
             logger.error(f"Failed to delete {file_path}. Reason: {e}")
 
-cleared_once = False
+def _validate_pptx_filename(filename: str) -> str:
+    safe_filename = os.path.basename(filename)
+    if not safe_filename.lower().endswith(".pptx"):
+        raise HTTPException(status_code=400, detail="Invalid file type. Only .pptx supported.")
+    return safe_filename
 
-# --- Upload + Process Route ---
-@router.post("", status_code=status.HTTP_200_OK, response_model=dict)
-async def upload_pptx(payload: PPTXPayload = Body(...)):
+async def _process_pptx(workspace: Workspace, staged_path: str, safe_filename: str) -> dict:
     """
-    Receives a Base64-encoded PPTX file, saves it, then processes it:
+    Moves a fully written PPTX into the deck's workspace and processes it:
     - Converts to PDF
     - Generates slide image + XML for each slide
     - Saves image bytes in a .txt file for each slide
+    - Extracts per-shape metadata (metadata_N.json) from each slide's XML
     """
-    global cleared_once
-    try:
-        safe_filename = os.path.basename(payload.filename)
-        if not safe_filename.lower().endswith(".pptx"):
-             raise HTTPException(status_code=400, detail="Invalid file type. Only .pptx supported.")
-        pptx_path = os.path.join(SAVE_DIR, safe_filename)
-        pptx_bytes = base64.b64decode(payload.base64)
-
-        async with aiofiles.open(pptx_path, "wb") as f:
-            await f.write(pptx_bytes)
+    async with workspace.lock:
+        workspace.ensure_dirs()
+        pptx_path = workspace.pptx_path(safe_filename)
+        os.replace(staged_path, pptx_path)
         logger.info(f"PPTX file saved temporarily at {pptx_path}")
 
         # output folder
-        pptx_name = os.path.splitext(safe_filename)[0]
-        slide_dir = os.path.join(SLIDE_IMAGE_DIR, pptx_name)
-        pdf_output_dir = os.path.join(slide_dir, "converted_pdfs")
-        os.makedirs(pdf_output_dir, exist_ok=True)
-
+        slide_dir = workspace.slides_dir
         clear_directory_contents(slide_dir)
-        os.makedirs(pdf_output_dir, exist_ok=True)
+        clear_directory_contents(workspace.metadata_dir)
+        invalidate_slide_contexts(workspace.deck_id)
+        store = get_metadata_store()
+        store.delete_deck(workspace.deck_id)
+        os.makedirs(workspace.pdf_dir, exist_ok=True)
         logger.info(f"Cleared and ensured directories exist for: {slide_dir}")
 
         # Convert to PDF
-        pdf_path = convert_pptx_to_pdf(pptx_path, output_dir=pdf_output_dir)
-        prs = Presentation(pptx_path)
+        pdf_path = await asyncio.to_thread(
+            convert_pptx_to_pdf, pptx_path, workspace.pdf_dir, os.path.join(workspace.root, "lo_profile")
+        )
 
-        # Generate context for each slide
-        for idx, _ in enumerate(prs.slides):
-            slide_number = idx
-            logger.info(f"Processing slide {slide_number}...")
-            generate_slide_context(prs, slide_number, pdf_path, slide_dir)
+        # Generate context for each slide (off the event loop so other decks keep being served).
+        # Slides are read lazily from the zip; masters, layouts and media are only touched as needed.
+        slide_size = None
+        def _generate_all() -> Dict[int, dict]:
+            nonlocal slide_size
+            manifest = {}
+            with SlideReader(pptx_path) as reader:
+                if reader.slide_size_emu:
+                    slide_size = tuple(round(v / EMU_PER_PX, 2) for v in reader.slide_size_emu)
+                for slide_number in range(len(reader)):
+                    logger.info(f"Processing slide {slide_number}...")
+                    context = generate_slide_context(reader, slide_number, pdf_path, slide_dir, metadata_dir=workspace.metadata_dir)
+                    store.replace_slide(workspace.deck_id, slide_number, context["shape_metadata"])
+                    manifest[slide_number] = context["manifest_entry"]
+            return manifest
+        manifest = await asyncio.to_thread(_generate_all)
 
-        return {
-            "status": "success",
-            "message": f"File saved and processed: {safe_filename}",
-            "slides_processed": len(prs.slides)
-        }
+        # Compare renders with the previous upload; derived work for unchanged slides is reused via their hashes
+        slides_changed = changed_slides(load_manifest(workspace.manifest_path), manifest)
+        save_manifest(workspace.manifest_path, manifest, slide_size)
+        logger.info(f"Deck '{workspace.deck_id}': {len(manifest) - len(slides_changed)} of {len(manifest)} slides visually unchanged")
 
-    except base64.binascii.Error:
-        logger.error("Base64 decoding error", exc_info=True)
-        raise HTTPException(status_code=400, detail="Invalid Base64 data")
+    # Cleanup diagnostics for every slide, computed off the request path
+    schedule_layout_analysis(workspace.deck_id, manifest.keys())
+
+    return {
+        "status": "success",
+        "message": f"File saved and processed: {safe_filename}",
+        "deck_id": workspace.deck_id,
+        "slides_processed": len(manifest),
+        "slides_changed": slides_changed
+    }
+
+def _staging_path(workspace: Workspace) -> str:
+    os.makedirs(workspace.root, exist_ok=True)
+    return os.path.join(workspace.root, f".incoming-{uuid.uuid4().hex}.pptx")
+
+async def _run_processing(workspace: Workspace, staged_path: str, safe_filename: str) -> dict:
+    try:
+        return await _process_pptx(workspace, staged_path, safe_filename)
     except FileNotFoundError as e:
         logger.error("File conversion error", exc_info=True)
         raise HTTPException(status_code=500, detail=f"PDF not generated: {e}")
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Server error: {e}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Server error: {e}")
+    finally:
+        if os.path.exists(staged_path):
+            os.unlink(staged_path)
+
+# --- Upload + Process Route ---
+@router.post("", status_code=status.HTTP_200_OK, response_model=dict)
+async def upload_pptx(payload: PPTXPayload = Body(...)):
+    """
+    Receives a Base64-encoded PPTX file, saves it, then processes it.
+    Kept for older clients; prefer /stream or the chunked endpoints for large decks.
+    """
+    workspace = get_workspace(payload.deck_id)
+    safe_filename = _validate_pptx_filename(payload.filename)
+    try:
+        pptx_bytes = base64.b64decode(payload.base64)
+    except base64.binascii.Error:
+        logger.error("Base64 decoding error", exc_info=True)
+        raise HTTPException(status_code=400, detail="Invalid Base64 data")
+
+    staged_path = _staging_path(workspace)
+    async with aiofiles.open(staged_path, "wb") as f:
+        await f.write(pptx_bytes)
+    del pptx_bytes
+    return await _run_processing(workspace, staged_path, safe_filename)
+
+# --- Streamed Binary Upload Route ---
+@router.post("/stream", status_code=status.HTTP_200_OK, response_model=dict)
+async def upload_pptx_stream(
+    request: Request,
+    deck_id: str = Query(DEFAULT_DECK_ID),
+    filename: str = Query("presentation.pptx")
+):
+    """
+    Receives the PPTX as a raw application/octet-stream body (or a multipart
+    form with a 'file' field) and streams it to disk in chunks, so memory per
+    upload stays bounded regardless of deck size.
+    """
+    workspace = get_workspace(deck_id)
+    content_type = request.headers.get("content-type", "")
+    if not content_type.startswith("multipart/form-data"):
+        _validate_pptx_filename(filename)
+    staged_path = _staging_path(workspace)
+    written = 0
+    try:
+        async with aiofiles.open(staged_path, "wb") as f:
+            if content_type.startswith("multipart/form-data"):
+                form = await request.form()
+                upload = form.get("file")
+                if upload is None or not hasattr(upload, "read"):
+                    raise HTTPException(status_code=400, detail="Multipart upload must contain a 'file' field.")
+                filename = upload.filename or filename
+                while chunk := await upload.read(STREAM_CHUNK_SIZE):
+                    written += len(chunk)
+                    if written > MAX_PPTX_BYTES:
+                        raise HTTPException(status_code=413, detail="PPTX file too large.")
+                    await f.write(chunk)
+            else:
+                async for chunk in request.stream():
+                    written += len(chunk)
+                    if written > MAX_PPTX_BYTES:
+                        raise HTTPException(status_code=413, detail="PPTX file too large.")
+                    await f.write(chunk)
+        safe_filename = _validate_pptx_filename(filename)
+        if written == 0:
+            raise HTTPException(status_code=400, detail="Empty upload body.")
+    except BaseException:
+        if os.path.exists(staged_path):
+            os.unlink(staged_path)
+        raise
+
+    logger.info(f"Streamed {written} bytes for deck '{workspace.deck_id}'")
+    return await _run_processing(workspace, staged_path, safe_filename)
+
+# --- Resumable Chunked Upload Routes ---
+def _upload_paths(upload_id: str) -> tuple[str, str]:
+    if not UPLOAD_ID_PATTERN.match(upload_id):
+        raise HTTPException(status_code=400, detail="Invalid upload id.")
+    return os.path.join(UPLOADS_DIR, f"{upload_id}.part"), os.path.join(UPLOADS_DIR, f"{upload_id}.json")
+
+def _upload_lock(upload_id: str) -> DeckLock:
+    """Serializes the chunk writes and completion of one upload, across workers."""
+    return DeckLock(f"upload:{upload_id}", os.path.join(UPLOADS_DIR, f"{upload_id}.lock"))
+
+def _remove_upload_files(upload_id: str, keep_part: bool = False):
+    part_path, info_path = _upload_paths(upload_id)
+    for path in ([] if keep_part else [part_path]) + [info_path, os.path.join(UPLOADS_DIR, f"{upload_id}.lock")]:
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+    discard_lock(f"upload:{upload_id}")
+
+def _sweep_stale_uploads():
+    """Deletes the files of chunked uploads that were abandoned for UPLOAD_SESSION_TTL_SECONDS."""
+    if not os.path.isdir(UPLOADS_DIR):
+        return
+    last_touched: Dict[str, float] = {}
+    for entry in os.scandir(UPLOADS_DIR):
+        upload_id = entry.name.split(".", 1)[0]
+        if UPLOAD_ID_PATTERN.match(upload_id):
+            try:
+                last_touched[upload_id] = max(last_touched.get(upload_id, 0.0), entry.stat().st_mtime)
+            except FileNotFoundError:
+                continue
+    cutoff = time.time() - UPLOAD_SESSION_TTL_SECONDS
+    for upload_id, touched in last_touched.items():
+        if touched < cutoff:
+            logger.info(f"Removing chunked upload {upload_id}, idle since {time.ctime(touched)}")
+            _remove_upload_files(upload_id)
+
+def _load_upload_info(upload_id: str) -> tuple[str, dict]:
+    part_path, info_path = _upload_paths(upload_id)
+    if not os.path.exists(info_path):
+        raise HTTPException(status_code=404, detail=f"Unknown upload id: {upload_id}")
+    with open(info_path, "r", encoding="utf-8") as f:
+        return part_path, json.load(f)
+
+@router.post("/chunks", status_code=status.HTTP_201_CREATED, response_model=dict)
+async def start_chunked_upload(payload: ChunkedUploadInit = Body(...)):
+    """Opens a resumable upload. Chunks are then PUT in order with their byte offset."""
+    workspace = get_workspace(payload.deck_id)
+    safe_filename = _validate_pptx_filename(payload.filename)
+    if payload.total_size is not None and not 0 < payload.total_size <= MAX_PPTX_BYTES:
+        raise HTTPException(status_code=413, detail="PPTX file too large.")
+
+    await asyncio.to_thread(_sweep_stale_uploads)
+    upload_id = uuid.uuid4().hex
+    part_path, info_path = _upload_paths(upload_id)
+    os.makedirs(UPLOADS_DIR, exist_ok=True)
+    open(part_path, "wb").close()
+    with open(info_path, "w", encoding="utf-8") as f:
+        json.dump({"deck_id": workspace.deck_id, "filename": safe_filename, "total_size": payload.total_size}, f)
+    logger.info(f"Started chunked upload {upload_id} for deck '{workspace.deck_id}'")
+    return {"upload_id": upload_id, "offset": 0, "chunk_size": STREAM_CHUNK_SIZE}
+
+@router.get("/chunks/{upload_id}", status_code=status.HTTP_200_OK, response_model=dict)
+async def get_chunked_upload(upload_id: str):
+    """Reports how many bytes have been received so an interrupted client knows where to resume."""
+    part_path, info = _load_upload_info(upload_id)
+    return {"upload_id": upload_id, "offset": os.path.getsize(part_path), **info}
+
+@router.put("/chunks/{upload_id}", status_code=status.HTTP_200_OK, response_model=dict)
+async def put_chunk(upload_id: str, request: Request, offset: int = Query(..., ge=0)):
+    _upload_paths(upload_id)
+    async with _upload_lock(upload_id):
+        # Under the lock, so a retried or duplicated chunk sees the size its predecessor left behind
+        part_path, info = _load_upload_info(upload_id)
+        current = os.path.getsize(part_path)
+        if offset != current:
+            raise HTTPException(status_code=409, detail={"message": "Offset mismatch.", "offset": current})
+
+        written = 0
+        async with aiofiles.open(part_path, "ab") as f:
+            async for chunk in request.stream():
+                written += len(chunk)
+                if current + written > MAX_PPTX_BYTES:
+                    await f.truncate(current)
+                    raise HTTPException(status_code=413, detail="PPTX file too large.")
+                await f.write(chunk)
+    return {"upload_id": upload_id, "offset": current + written}
+
+@router.post("/chunks/{upload_id}/complete", status_code=status.HTTP_200_OK, response_model=dict)
+async def complete_chunked_upload(upload_id: str):
+    _upload_paths(upload_id)
+    async with _upload_lock(upload_id):
+        part_path, info = _load_upload_info(upload_id)
+        size = os.path.getsize(part_path)
+        if info.get("total_size") is not None and size != info["total_size"]:
+            raise HTTPException(status_code=409, detail={"message": "Upload incomplete.", "offset": size})
+        if size == 0:
+            raise HTTPException(status_code=400, detail="Empty upload.")
+
+        workspace = get_workspace(info["deck_id"])
+        staged_path = _staging_path(workspace)
+        os.replace(part_path, staged_path)
+        os.unlink(_upload_paths(upload_id)[1])
+    _remove_upload_files(upload_id, keep_part=True)
+    return await _run_processing(workspace, staged_path, info["filename"])
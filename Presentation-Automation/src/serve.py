@@ -0,0 +1,41 @@
+# serve.py
+"""
+Production entry point: runs main:app in several uvicorn worker processes (no reload).
+
+    python src/serve.py --workers 4        # or WEB_CONCURRENCY=4; defaults to the CPU count
+
+Workers share everything through the local disk: deck workspaces, the SQLite metadata and
+shared-state database (utils/metadata_store.py, utils/shared_state.py), cross-process deck
+locks and the derived cache. Prometheus metrics are aggregated through PROMETHEUS_MULTIPROC_DIR.
+"""
+import os, shutil, argparse, logging, tempfile
+import uvicorn
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+def _prepare_metrics_dir(workers: int):
+    """Multi-process metrics need an empty directory shared by all workers, set before they import prometheus_client."""
+    if workers <= 1:
+        return
+    metrics_dir = os.environ.get("PROMETHEUS_MULTIPROC_DIR") or os.path.join(tempfile.gettempdir(), "presentation-automation-metrics")
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+    os.makedirs(metrics_dir)
+    os.environ["PROMETHEUS_MULTIPROC_DIR"] = metrics_dir
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the Slide Enhancement API with multiple workers.")
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", "0")) or os.cpu_count() or 1)
+    args = parser.parse_args(argv)
+
+    # Workers import "main" from this directory
+    src_dir = os.path.dirname(os.path.abspath(__file__))
+    _prepare_metrics_dir(args.workers)
+    logger.info(f"Starting {args.workers} worker(s) on {args.host}:{args.port}")
+    uvicorn.run("main:app", host=args.host, port=args.port, workers=args.workers, app_dir=src_dir,
+                proxy_headers=True, log_level="info")
+
+if __name__ == "__main__":
+    main()
@@ -7,14 +7,13 @@ Office.onReady(async (info) => {
   }
   runButton.onclick = async () => {
     console.log("Starting slide processing...");
-    let metadataComplete = false;
     let pptxComplete = false;
     let userInstructionComplete = false;
     let currentSlideIndex = null;
     let totalSlides = 0; 
     const instruction = document.getElementById("instructionInput").value;
+    // Shape metadata is extracted server-side from the uploaded PPTX, so only the deck itself is sent.
     await Promise.allSettled([
-      extractAllSlideShapes().then(() => (metadataComplete = true)).catch(() => {}),
       sendPptxAsBase64ToBackend().then(() => (pptxComplete = true)).catch(() => {}),
       getCurrentSlideIndex().then(({ currentSlideIndex: index, totalSlides: total }) => {
         currentSlideIndex = index;
@@ -23,7 +22,7 @@ Office.onReady(async (info) => {
       }).catch(() => {})
     ]);
 
-    if (metadataComplete && pptxComplete) {
+    if (pptxComplete) {
       userInstructionComplete = true;
       try {
         const payload = {
@@ -57,15 +56,6 @@ Office.onReady(async (info) => {
     } else {
       console.warn("Not all parallel tasks completed successfully.");
     }
-    if (!metadataComplete) {
-      try {
-        console.log("Retrying slide metadata extraction...");
-        await extractAllSlideShapes();
-        metadataComplete = true;
-      } catch (err) {
-        console.error("Slide metadata extraction failed on retry:", err);
-      }
-    }
     if (!pptxComplete) {
       try {
         console.log("Retrying PPTX upload...");
@@ -75,7 +65,7 @@ Office.onReady(async (info) => {
         console.error("PPTX upload failed on retry:", err);
       }
     }
-    if (metadataComplete && pptxComplete && userInstructionComplete) {
+    if (pptxComplete && userInstructionComplete) {
       console.log("All data successfully sent to backend.");
     } else {
       console.warn("Some tasks did not complete successfully.");
@@ -120,6 +110,18 @@ async function getCurrentSlideIndex() {
   }
 }
 
+// Each document gets its own backend workspace so concurrent users don't overwrite each other's uploads.
+function getDeckId() {
+  const settings = Office.context.document.settings;
+  let deckId = settings.get("deckId");
+  if (!deckId) {
+    deckId = (crypto.randomUUID ? crypto.randomUUID() : `${Date.now()}-${Math.random().toString(36).slice(2)}`).replace(/[^A-Za-z0-9_-]/g, "");
+    settings.set("deckId", deckId);
+    settings.saveAsync();
+  }
+  return deckId;
+}
+
 async function sendInstructionToBackend(payload) { 
   const response = await fetch('http://localhost:8000/process_instruction', {
     method: 'POST',
@@ -129,7 +131,8 @@ async function sendInstructionToBackend(payload) {
     body: JSON.stringify({
       instruction: payload.instruction, 
       slide_index: payload.slide_index, 
-      total_slides: payload.total_slides 
+      total_slides: payload.total_slides,
+      deck_id: getDeckId()
     }),
   });
   return response;
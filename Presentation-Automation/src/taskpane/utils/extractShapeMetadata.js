@@ -2,6 +2,7 @@
 async function extractAllSlideShapes() {
     console.log("[Sync Metadata] Starting full metadata extraction...");
     let overallSuccess = true;
+    const allSlideMetadata = [];
   
     try {
         await PowerPoint.run(async (context) => {
@@ -112,32 +113,22 @@ async function extractAllSlideShapes() {
                 }
   
                 if (slideSuccess && currentSlideMetadata.length > 0) {
-                    console.log(`[Sync Metadata] Slide ${s} processed. Uploading metadata_${s}.json...`);
-                    try {
-                        const response = await fetch("http://localhost:8000/upload-metadata", {
-                            method: "POST",
-                            headers: { "Content-Type": "application/json" },
-                            body: JSON.stringify({
-                                filename: `metadata_${s}.json`,
-                                path: "slide_images/metadata",
-                                data: currentSlideMetadata
-                            })
-                        });
-  
-                        if (!response.ok) {
-                            throw new Error(`Upload failed with status ${response.status}`);
-                        }
-                        const result = await response.json();
-                        console.log(`[Sync Metadata] Slide ${s} metadata uploaded:`, result);
-                    } catch (uploadError) {
-                        console.error(`[Sync Metadata] Upload failed for Slide ${s}:`, uploadError);
-                        overallSuccess = false;
-                    }
+                    allSlideMetadata.push({ slide_index: s, shapes: currentSlideMetadata });
                 } else if (slideSuccess) {
                     console.log(`[Sync Metadata] Slide ${s} had no shapes to upload.`);
                 }
             }
         });
+        if (allSlideMetadata.length > 0) {
+            console.log(`[Sync Metadata] Uploading metadata for ${allSlideMetadata.length} slides in one request...`);
+            try {
+                const result = await uploadMetadataBulk(allSlideMetadata);
+                console.log("[Sync Metadata] Bulk metadata uploaded:", result);
+            } catch (uploadError) {
+                console.error("[Sync Metadata] Bulk metadata upload failed:", uploadError);
+                overallSuccess = false;
+            }
+        }
         console.log("[Sync Metadata] Finished processing all slides.");
         return overallSuccess;
     } catch (error) {
@@ -146,6 +137,26 @@ async function extractAllSlideShapes() {
     }
   }
   
+  async function uploadMetadataBulk(slides) {
+    const json = JSON.stringify({ slides });
+    const headers = { "Content-Type": "application/json" };
+    let body = json;
+    if (typeof CompressionStream !== "undefined") {
+        const stream = new Blob([json]).stream().pipeThrough(new CompressionStream("gzip"));
+        body = await new Response(stream).arrayBuffer();
+        headers["Content-Encoding"] = "gzip";
+    }
+    const response = await fetch(`http://localhost:8000/upload-metadata/bulk?deck_id=${encodeURIComponent(getDeckId())}`, {
+        method: "POST",
+        headers,
+        body
+    });
+    if (!response.ok) {
+        throw new Error(`Upload failed with status ${response.status}`);
+    }
+    return response.json();
+  }
+
   function isOverlapping(shapeA, shapeB) {
     return !(
         shapeA.left + shapeA.width < shapeB.left ||
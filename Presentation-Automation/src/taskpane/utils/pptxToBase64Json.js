@@ -24,31 +24,22 @@ async function sendPptxAsBase64ToBackend() {
                             return offset + slice.length;
                         }, 0);
                         const blob = new Blob([combined.buffer], { type: "application/vnd.openxmlformats-officedocument.presentationml.presentation" });
-                        const reader = new FileReader();
-                        reader.onloadend = () => {
-                            const base64 = reader.result.split(',')[1];
-                            const payload = {
-                                filename: "presentation.pptx",
-                                filetype: blob.type,
-                                createdAt: new Date().toISOString(),
-                                base64: base64
-                            };
-                            fetch("http://localhost:8000/upload-pptx", {
-                                method: "POST",
-                                headers: { "Content-Type": "application/json" },
-                                body: JSON.stringify(payload)
-                            })
-                            .then(response => response.json())
-                            .then(data => {
-                                console.log("Backend response:", data);
-                                resolve(data);
-                            })
-                            .catch(err => {
-                                console.error("Error sending to backend:", err);
-                                reject(err);
-                            });
-                        };
-                        reader.readAsDataURL(blob);
+                        // Send the raw bytes; the backend streams them to disk instead of parsing a base64 JSON body.
+                        const query = new URLSearchParams({ deck_id: getDeckId(), filename: "presentation.pptx" });
+                        fetch(`http://localhost:8000/upload-pptx/stream?${query}`, {
+                            method: "POST",
+                            headers: { "Content-Type": "application/octet-stream" },
+                            body: blob
+                        })
+                        .then(response => response.json())
+                        .then(data => {
+                            console.log("Backend response:", data);
+                            resolve(data);
+                        })
+                        .catch(err => {
+                            console.error("Error sending to backend:", err);
+                            reject(err);
+                        });
                         file.closeAsync();
                     } else {
                         collectSlices(received);
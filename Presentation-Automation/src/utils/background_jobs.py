@@ -0,0 +1,36 @@
+# utils/background_jobs.py
+import asyncio, logging
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Low-priority work enqueued by request handlers (e.g. layout analysis after an upload). One worker per
+# process runs the jobs one at a time in a thread, so they never compete with requests for more than a
+# single thread. A job enqueued again before it ran is only run once, with the latest arguments.
+
+_pending: Dict[Hashable, Tuple[Callable[..., Any], tuple]] = {}
+_queue: Optional[asyncio.Queue] = None
+_worker: Optional[asyncio.Task] = None
+
+async def _run_jobs():
+    while True:
+        key = await _queue.get()
+        job = _pending.pop(key, None)
+        if job is None:
+            continue
+        fn, args = job
+        try:
+            await asyncio.to_thread(fn, *args)
+        except Exception as e:
+            logger.warning(f"Background job {key} failed: {e}")
+
+def enqueue(key: Hashable, fn: Callable[..., Any], *args):
+    """Schedules fn(*args) on the background worker; call from the event loop."""
+    global _queue, _worker
+    if _worker is None or _worker.done():
+        _queue = asyncio.Queue()
+        _pending.clear()
+        _worker = asyncio.get_running_loop().create_task(_run_jobs())
+    if key not in _pending:
+        _queue.put_nowait(key)
+    _pending[key] = (fn, args)
@@ -0,0 +1,136 @@
+# utils/context_cache.py
+import time, hashlib, logging, threading
+from collections import OrderedDict
+from typing import Any, List, Optional, Tuple
+from config.config import (LLM_CONTEXT_CACHE, CONTEXT_CACHE_TTL_SECONDS, CONTEXT_CACHE_MIN_TOKENS, CONTEXT_CACHE_MAX_ENTRIES,
+                           CONTEXT_CACHE_RETRY_SECONDS, GEMINI_FLASH_2_0_MODEL, GEMINI_FLASH_2_0_MODEL_LITE)
+from utils.metrics import observe_context_cache
+
+logger = logging.getLogger(__name__)
+
+# Gemini explicit context caching: a call's static prefix (agent instructions, slide XML, slide image)
+# is uploaded once as cached content and later calls send only their own parts plus its name.
+# Prefixes under CONTEXT_CACHE_MIN_TOKENS (the provider minimum) are sent inline as before, and so
+# are ones whose creation just failed, until CONTEXT_CACHE_RETRY_SECONDS have passed. The registry
+# holds at most CONTEXT_CACHE_MAX_ENTRIES; the least recently used entry is deleted from the provider
+# when it is evicted, so a re-uploaded deck's old slides stop costing storage once they fall out.
+# benchmarks/stub_llm_server.py implements cachedContents for local runs.
+
+# Caching needs a pinned model version
+_VERSIONED_MODELS = {"gemini-2.0-flash": GEMINI_FLASH_2_0_MODEL, "gemini-2.0-flash-lite": GEMINI_FLASH_2_0_MODEL_LITE}
+# A 1024px render is tiled into up to four 258-token tiles
+_IMAGE_TOKEN_ESTIMATE = 4 * 258
+# Re-create shortly before the provider expires the entry
+_EXPIRY_MARGIN_SECONDS = 30
+
+# prefix key -> (cached content name, expires at), or (None, retry at) after a failed creation; LRU order
+_registry: "OrderedDict[str, Tuple[Optional[str], float]]" = OrderedDict()
+_registry_lock = threading.Lock()
+
+def _inline_bytes(part: Any) -> Optional[bytes]:
+    data = getattr(getattr(part, "inline_data", None), "data", None)
+    return data if isinstance(data, (bytes, bytearray)) else None
+
+def _prefix_key(model: str, prefix: List[Any]) -> str:
+    digest = hashlib.sha256(model.encode("utf-8"))
+    for part in prefix:
+        data = _inline_bytes(part)
+        digest.update(b"\0img" + hashlib.sha256(data).digest() if data is not None else b"\0txt" + str(part).encode("utf-8"))
+    return digest.hexdigest()
+
+def estimate_tokens(parts: List[Any]) -> int:
+    return sum(_IMAGE_TOKEN_ESTIMATE if _inline_bytes(part) is not None else len(str(part)) // 4 for part in parts)
+
+def _as_part(part: Any):
+    from google.genai import types
+    return types.Part.from_text(text=part) if isinstance(part, str) else part
+
+def _is_missing_cache(error: Exception) -> bool:
+    """The provider dropped the entry (expired or evicted) before we expected."""
+    return getattr(error, "code", None) in (403, 404) and "cach" in str(error).lower()
+
+def _delete(client: Any, names: List[str]):
+    """Best-effort removal of evicted cached contents; the provider expires them anyway."""
+    for name in names:
+        try:
+            client.caches.delete(name=name)
+        except Exception as e:
+            logger.debug(f"Deleting cached content {name} failed: {e}")
+
+def _store(key: str, entry: Tuple[Optional[str], float]) -> List[str]:
+    """Records the entry as most recently used; returns the names of live cached contents evicted for room."""
+    now = time.time()
+    with _registry_lock:
+        _registry[key] = entry
+        _registry.move_to_end(key)
+        evicted = []
+        while len(_registry) > CONTEXT_CACHE_MAX_ENTRIES:
+            name, until = _registry.popitem(last=False)[1]
+            if name is not None and until > now:
+                evicted.append(name)
+    return evicted
+
+def _cached_content(client: Any, model: str, prefix: List[Any], call_site: str) -> Optional[str]:
+    """Name of a live cached content for this prefix, created on first use; None to send the prefix inline."""
+    key = _prefix_key(model, prefix)
+    now = time.time()
+    with _registry_lock:
+        entry = _registry.get(key)
+        if entry is not None:
+            name, until = entry
+            if name is None and until > now:
+                return None
+            if name is not None and until - _EXPIRY_MARGIN_SECONDS > now:
+                _registry.move_to_end(key)
+                observe_context_cache(call_site, "reused")
+                return name
+
+    from google.genai import types
+    try:
+        cache = client.caches.create(model=model, config=types.CreateCachedContentConfig(
+            contents=[types.Content(role="user", parts=[_as_part(part) for part in prefix])],
+            ttl=f"{CONTEXT_CACHE_TTL_SECONDS}s",
+            display_name=f"{call_site}-{key[:12]}",
+        ))
+    except Exception as e:
+        logger.warning(f"Context cache creation for {call_site} failed, sending prefix inline for {CONTEXT_CACHE_RETRY_SECONDS}s: {e}")
+        observe_context_cache(call_site, "refused")
+        _delete(client, _store(key, (None, now + CONTEXT_CACHE_RETRY_SECONDS)))
+        return None
+    evicted = _store(key, (cache.name, now + CONTEXT_CACHE_TTL_SECONDS))
+    observe_context_cache(call_site, "created")
+    if evicted:
+        observe_context_cache(call_site, "evicted")
+        _delete(client, evicted)
+    return cache.name
+
+def forget(model: str, prefix: List[Any]):
+    with _registry_lock:
+        _registry.pop(_prefix_key(model, prefix), None)
+
+def generate(client: Any, model: str, prefix: List[Any], contents: List[Any], call_site: str) -> Any:
+    """client.models.generate_content for prefix + contents, referencing the prefix from the context cache when it is worth it."""
+    if not prefix or LLM_CONTEXT_CACHE == "off" or estimate_tokens(prefix) < CONTEXT_CACHE_MIN_TOKENS:
+        if prefix:
+            observe_context_cache(call_site, "inline")
+        return client.models.generate_content(model=model, contents=[*prefix, *contents])
+
+    from google.genai import types
+    cache_model = _VERSIONED_MODELS.get(model, model)
+    name = _cached_content(client, cache_model, prefix, call_site)
+    if name is None:
+        return client.models.generate_content(model=model, contents=[*prefix, *contents])
+    try:
+        return client.models.generate_content(model=cache_model, contents=contents,
+                                              config=types.GenerateContentConfig(cached_content=name))
+    except Exception as e:
+        if not _is_missing_cache(e):
+            raise
+        logger.info(f"Cached content {name} for {call_site} is gone; re-creating it")
+        observe_context_cache(call_site, "expired")
+        forget(cache_model, prefix)
+        name = _cached_content(client, cache_model, prefix, call_site)
+        if name is None:
+            return client.models.generate_content(model=model, contents=[*prefix, *contents])
+        return client.models.generate_content(model=cache_model, contents=contents,
+                                              config=types.GenerateContentConfig(cached_content=name))
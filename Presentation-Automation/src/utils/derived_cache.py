@@ -0,0 +1,90 @@
+# utils/derived_cache.py
+import os, json, hashlib, logging
+from typing import Any, Callable, Dict, Iterable, Optional
+from config.config import DERIVED_CACHE_DIR, DERIVED_CACHE_ENABLED, GEMINI_FLASH_2_0_MODEL
+from utils.slide_manifest import byte_hash
+from utils.telemetry import llm_span, record_llm_response
+
+logger = logging.getLogger(__name__)
+
+def render_key(slide_context: Dict[str, Any]) -> Optional[str]:
+    """
+    sha256 of the slide render's bytes, the key for everything derived from it. Content-addressed, so
+    the shared cache only ever serves an artifact for a byte-identical render (whatever deck it came
+    from) and edited slides never see each other's artifacts. Taken from the manifest when the context
+    was loaded from disk, otherwise computed once and kept on the context.
+    """
+    if slide_context.get("slide_image_sha256"):
+        return slide_context["slide_image_sha256"]
+    if not slide_context.get("slide_image_bytes"):
+        return None
+    slide_context["slide_image_sha256"] = byte_hash(slide_context["slide_image_bytes"])
+    return slide_context["slide_image_sha256"]
+
+def derived_path(key: str, name: str) -> str:
+    """Path for an artifact derived from a render. Lives outside the deck workspaces, so re-uploads keep it."""
+    return os.path.join(DERIVED_CACHE_DIR, key[:2], key, name)
+
+def read_derived(key: Optional[str], name: str) -> Optional[bytes]:
+    if not DERIVED_CACHE_ENABLED or not key:
+        return None
+    try:
+        with open(derived_path(key, name), "rb") as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+def write_derived(key: Optional[str], name: str, data: bytes):
+    if not DERIVED_CACHE_ENABLED or not key:
+        return
+    path = derived_path(key, name)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.warning(f"Could not write derived artifact {path}: {e}")
+
+def _cached_text(data: Optional[bytes]) -> Optional[str]:
+    if data is None:
+        return None
+    try:
+        return json.loads(data)["text"]
+    except (ValueError, KeyError, TypeError):
+        return None
+
+def cached_llm_text(slide_context: Dict[str, Any], namespace: str, contents: Iterable[Any],
+                    generate: Callable[[], Any], validate: Callable[[str], bool],
+                    model: str = GEMINI_FLASH_2_0_MODEL) -> str:
+    """
+    Returns the response text for a slide-image LLM call; `generate` makes the call and returns the
+    genai response. An earlier response is reused when the same text parts were sent with a
+    byte-identical render: non-text parts (images) are represented by the render key, so callers must
+    put anything that changes an image part into the text parts. Only responses that pass `validate`
+    (the call site's output check) are stored, and a stored one that fails it is ignored and replaced
+    by a fresh call. The call runs inside an llm span
+    labeled with `model`; a routed `generate` (utils/model_router.py) relabels it with the model that
+    actually answered.
+    """
+    contents = list(contents)
+    key = render_key(slide_context)
+    text_parts = [part for part in contents if isinstance(part, str)]
+    prompt_digest = hashlib.sha256(json.dumps([model, text_parts]).encode("utf-8")).hexdigest()
+    name = f"llm_{namespace}_{prompt_digest[:32]}.json"
+
+    with llm_span(f"llm.{namespace}", model, contents) as span:
+        cached = _cached_text(read_derived(key, name))
+        if cached is not None and validate(cached):
+            span.set_attribute("llm.cache_hit", True)
+            logger.info(f"Reusing cached {namespace} response for render {key}")
+            return cached
+        if cached is not None:
+            logger.info(f"Cached {namespace} response for render {key} fails validation; calling the model again")
+        response = generate()
+        text = getattr(response, "text", None) or ""
+        record_llm_response(span, response, text)
+    if text and validate(text):
+        write_derived(key, name, json.dumps({"text": text}).encode("utf-8"))
+    return text
@@ -0,0 +1,74 @@
+# utils/image_crops.py
+import logging
+from io import BytesIO
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from PIL import Image
+from config.config import (
+    RENDER_DPI, MODEL_IMAGE_FORMAT, MODEL_IMAGE_LONG_EDGE,
+    ROI_CROP_PADDING_PX, ROI_CROP_MAX_AREA_FRACTION, ROI_THUMBNAIL_LONG_EDGE
+)
+from utils.image_prep import encode_model_image
+
+logger = logging.getLogger(__name__)
+
+PX_TO_IMAGE = RENDER_DPI / 72
+
+def shapes_bounding_box(shapes: Iterable[Dict[str, Any]]) -> Optional[Tuple[float, float, float, float]]:
+    """Union box (left, top, right, bottom) of the shapes, in metadata px."""
+    boxes = []
+    for shape in shapes:
+        try:
+            left, top = float(shape["left"]), float(shape["top"])
+            boxes.append((left, top, left + float(shape["width"]), top + float(shape["height"])))
+        except (KeyError, TypeError, ValueError):
+            continue
+    if not boxes:
+        return None
+    return min(b[0] for b in boxes), min(b[1] for b in boxes), max(b[2] for b in boxes), max(b[3] for b in boxes)
+
+def get_region_crop(slide_context: Dict[str, Any], shapes: List[Dict[str, Any]],
+                    padding: float = ROI_CROP_PADDING_PX, with_thumbnail: bool = True) -> Optional[Dict[str, Any]]:
+    """
+    Padded crop of the region covering `shapes` (from the full-resolution PNG, re-encoded like the
+    model image), plus an optional low-res full-slide thumbnail. Returns None when the shapes cover
+    most of the slide, so the caller should send the whole slide instead.
+
+    Crops are memoized on the slide context by shape-id set, so repeated sub-tasks on the same shapes
+    reuse them and a re-upload (which replaces the context) drops them.
+    """
+    png_bytes = slide_context.get("slide_image_bytes")
+    if not png_bytes or not shapes:
+        return None
+    key = (frozenset(str(shape.get("id")) for shape in shapes), round(padding, 2), with_thumbnail)
+    cache = slide_context.setdefault("roi_crops", {})
+    if key in cache:
+        return cache[key]
+
+    box = shapes_bounding_box(shapes)
+    if box is None:
+        return None
+    with Image.open(BytesIO(png_bytes)) as image:
+        image.load()
+        width, height = image.size
+        left = max(0, int((box[0] - padding) * PX_TO_IMAGE))
+        top = max(0, int((box[1] - padding) * PX_TO_IMAGE))
+        right = min(width, int((box[2] + padding) * PX_TO_IMAGE + 0.5))
+        bottom = min(height, int((box[3] + padding) * PX_TO_IMAGE + 0.5))
+
+        if right <= left or bottom <= top or (right - left) * (bottom - top) > ROI_CROP_MAX_AREA_FRACTION * width * height:
+            cache[key] = None
+            return None
+
+        crop_bytes, mime = encode_model_image(image.crop((left, top, right, bottom)), long_edge=MODEL_IMAGE_LONG_EDGE, fmt=MODEL_IMAGE_FORMAT)
+        thumbnail = encode_model_image(image, long_edge=ROI_THUMBNAIL_LONG_EDGE)[0] if with_thumbnail else None
+
+    crop = {
+        "crop_bytes": crop_bytes,
+        "thumbnail_bytes": thumbnail,
+        "mime_type": mime,
+        # Region covered by the crop, in the same px units as the shape metadata
+        "region": tuple(round(v / PX_TO_IMAGE, 2) for v in (left, top, right, bottom)),
+    }
+    cache[key] = crop
+    logger.info(f"Prepared region crop for shapes {sorted(key[0])}: {len(crop_bytes)} bytes")
+    return crop
@@ -0,0 +1,78 @@
+# utils/image_prep.py
+import logging
+from io import BytesIO
+from typing import Any, Dict, Optional, Tuple
+from PIL import Image
+from config.config import MODEL_IMAGE_LONG_EDGE, MODEL_IMAGE_FORMAT, MODEL_IMAGE_QUALITY
+
+logger = logging.getLogger(__name__)
+
+_MIME_TYPES = {"JPEG": "image/jpeg", "WEBP": "image/webp", "PNG": "image/png"}
+_EXTENSIONS = {"JPEG": ".jpg", "WEBP": ".webp", "PNG": ".png"}
+
+def model_image_suffix(fmt: str = MODEL_IMAGE_FORMAT, grayscale: bool = False) -> str:
+    """File suffix for a slide's model-sized image, e.g. "_model.jpg" or "_model_gray.webp"."""
+    return f"_model{'_gray' if grayscale else ''}{_EXTENSIONS.get(fmt.upper(), '.jpg')}"
+
+def model_image_mime(fmt: str = MODEL_IMAGE_FORMAT) -> str:
+    return _MIME_TYPES.get(fmt.upper(), _MIME_TYPES["JPEG"])
+
+def encode_model_image(
+    image: Image.Image,
+    long_edge: int = MODEL_IMAGE_LONG_EDGE,
+    fmt: str = MODEL_IMAGE_FORMAT,
+    quality: int = MODEL_IMAGE_QUALITY,
+    grayscale: bool = False
+) -> Tuple[bytes, str]:
+    """Downscales (on a copy) and encodes an already decoded image. Returns (bytes, mime_type)."""
+    fmt = fmt.upper() if fmt.upper() in _MIME_TYPES else "JPEG"
+    if grayscale:
+        image = image.convert("L")
+    elif image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+    else:
+        image = image.copy()
+    if max(image.size) > long_edge:
+        image.thumbnail((long_edge, long_edge), Image.LANCZOS)
+    buffered = BytesIO()
+    save_kwargs = {"quality": quality} if fmt in ("JPEG", "WEBP") else {}
+    if fmt == "JPEG":
+        save_kwargs["optimize"] = True
+    image.save(buffered, format=fmt, **save_kwargs)
+    return buffered.getvalue(), _MIME_TYPES[fmt]
+
+def prepare_model_image(
+    image_bytes: bytes,
+    long_edge: int = MODEL_IMAGE_LONG_EDGE,
+    fmt: str = MODEL_IMAGE_FORMAT,
+    quality: int = MODEL_IMAGE_QUALITY,
+    grayscale: bool = False
+) -> Tuple[bytes, str]:
+    """
+    Downscales a rendered slide so its long edge is at most `long_edge` px and re-encodes it
+    as JPEG/WebP for LLM calls. Returns (bytes, mime_type). The full-resolution PNG is untouched.
+    """
+    with Image.open(BytesIO(image_bytes)) as image:
+        image.load()
+        return encode_model_image(image, long_edge, fmt, quality, grayscale)
+
+def get_model_image(slide_context: Dict[str, Any], grayscale: bool = False) -> Tuple[Optional[bytes], str]:
+    """
+    Returns the model-sized (bytes, mime_type) for a loaded slide context. Uses the variant
+    produced at ingestion when present, otherwise prepares it from the full PNG once and
+    memoizes it on the context so later agents and refiner iterations reuse it.
+    """
+    variants = slide_context.setdefault("model_image_variants", {})
+    key = "gray" if grayscale else "color"
+    if key in variants:
+        return variants[key]
+
+    if not grayscale and slide_context.get("slide_model_image_bytes"):
+        variant = (slide_context["slide_model_image_bytes"], slide_context.get("slide_model_image_mime", model_image_mime()))
+    elif slide_context.get("slide_image_bytes"):
+        variant = prepare_model_image(slide_context["slide_image_bytes"], grayscale=grayscale)
+        logger.info(f"Prepared {key} model image on demand ({len(slide_context['slide_image_bytes'])} -> {len(variant[0])} bytes)")
+    else:
+        return None, _MIME_TYPES["PNG"]
+    variants[key] = variant
+    return variant
@@ -0,0 +1,165 @@
+# utils/layout_analysis.py
+import logging, statistics
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from config.config import (LAYOUT_ANALYSIS_ENABLED, LAYOUT_ALIGN_TOLERANCE_PX,
+                           LAYOUT_SIZE_TOLERANCE, LAYOUT_GAP_TOLERANCE_PX)
+from utils.metadata_store import get_metadata_store
+from utils.slide_manifest import load_slide_size
+from utils.workspace import get_workspace
+from utils import background_jobs
+
+logger = logging.getLogger(__name__)
+
+# Geometry-only layout diagnostics per slide, computed from the shape metadata in the background after
+# uploads (utils/background_jobs.py) and stored next to it. cleanup_agent serves general cleanup requests
+# from them as expanded tasks, with only a narrow image check (text overflow, clutter) left to the model.
+# All coordinates are metadata px (points); the slide size comes from the deck's p:sldSz.
+
+# Bump when the analysis changes so stored results are recomputed
+ANALYSIS_VERSION = 2
+
+def _boxes(shapes: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Top-level shapes with usable geometry; group children move with their group."""
+    boxes = []
+    for shape in shapes:
+        if shape.get("parentGroupId"):
+            continue
+        try:
+            left, top, width, height = (float(shape[key]) for key in ("left", "top", "width", "height"))
+        except (KeyError, TypeError, ValueError):
+            continue
+        if width <= 0 or height <= 0:
+            continue
+        boxes.append({"id": str(shape.get("id", "")), "type": shape.get("type"),
+                      "left": left, "top": top, "right": left + width, "bottom": top + height,
+                      "width": width, "height": height})
+    return boxes
+
+def _overflow(boxes: List[Dict[str, Any]], slide_size: Tuple[float, float]) -> List[Dict[str, Any]]:
+    slide_width, slide_height = slide_size
+    issues = []
+    for box in boxes:
+        sides = [side for side, out in (("left", box["left"] < -1), ("top", box["top"] < -1),
+                                        ("right", box["right"] > slide_width + 1),
+                                        ("bottom", box["bottom"] > slide_height + 1)) if out]
+        if sides:
+            issues.append({"kind": "overflow", "shape_ids": [box["id"]], "sides": sides})
+    return issues
+
+def _clusters(boxes: List[Dict[str, Any]], key: str, tolerance: float, relative: bool = False) -> List[List[Dict[str, Any]]]:
+    """Runs of boxes whose `key` values lie within `tolerance` (a fraction of it, if relative) of the run's first value."""
+    clusters, current = [], []
+    for box in sorted(boxes, key=lambda box: box[key]):
+        if current and box[key] - current[0][key] > (tolerance * current[0][key] if relative else tolerance):
+            clusters.append(current)
+            current = []
+        current.append(box)
+    if current:
+        clusters.append(current)
+    return [cluster for cluster in clusters if len(cluster) > 1]
+
+def _misalignment(boxes: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Edges that are nearly but not exactly aligned, which reads as a mistake rather than a choice."""
+    issues = []
+    for edge in ("left", "top"):
+        for cluster in _clusters(boxes, edge, LAYOUT_ALIGN_TOLERANCE_PX):
+            values = [box[edge] for box in cluster]
+            if max(values) - min(values) > 0.5:
+                issues.append({"kind": "misalignment", "shape_ids": [box["id"] for box in cluster],
+                               "edge": edge, "position": round(statistics.median(values), 2)})
+    return issues
+
+def _inconsistent_sizes(boxes: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Shapes of the same type and nearly the same size that differ by more than a pixel."""
+    issues = []
+    by_type: Dict[Any, List[Dict[str, Any]]] = {}
+    for box in boxes:
+        by_type.setdefault(box["type"], []).append(box)
+    for shape_type, group in by_type.items():
+        for cluster in _clusters(group, "width", LAYOUT_SIZE_TOLERANCE, relative=True):
+            base_height = statistics.median(box["height"] for box in cluster)
+            similar = [box for box in cluster if abs(box["height"] - base_height) <= base_height * LAYOUT_SIZE_TOLERANCE]
+            if len(similar) < 2:
+                continue
+            widths, heights = [box["width"] for box in similar], [box["height"] for box in similar]
+            if max(widths) - min(widths) > 1 or max(heights) - min(heights) > 1:
+                issues.append({"kind": "inconsistent_sizes", "shape_ids": [box["id"] for box in similar], "shape_type": shape_type,
+                               "width": round(statistics.median(widths), 2), "height": round(statistics.median(heights), 2)})
+    return issues
+
+def _uneven_gaps(boxes: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Rows (or columns) of three or more shapes whose spacing varies."""
+    issues = []
+    for axis, line_key, start, end in (("horizontal", "top", "left", "right"), ("vertical", "left", "top", "bottom")):
+        for line in _clusters(boxes, line_key, LAYOUT_ALIGN_TOLERANCE_PX):
+            if len(line) < 3:
+                continue
+            line = sorted(line, key=lambda box: box[start])
+            gaps = [b[start] - a[end] for a, b in zip(line, line[1:])]
+            if min(gaps) < 0:
+                continue  # overlapping shapes are not a distributed row
+            if max(gaps) - min(gaps) > LAYOUT_GAP_TOLERANCE_PX:
+                issues.append({"kind": "uneven_gaps", "shape_ids": [box["id"] for box in line], "axis": axis,
+                               "gaps": [round(gap, 2) for gap in gaps], "gap": round(statistics.mean(gaps), 2)})
+    return issues
+
+def analyze_layout(shapes: List[Dict[str, Any]], slide_size: Tuple[float, float]) -> Dict[str, Any]:
+    boxes = _boxes(shapes)
+    issues = _overflow(boxes, slide_size) + _misalignment(boxes) + _inconsistent_sizes(boxes) + _uneven_gaps(boxes)
+    return {"version": ANALYSIS_VERSION, "slide_size": list(slide_size), "shapes_analyzed": len(boxes), "issues": issues}
+
+def precompute_layout(deck_id: str, slide_index: int):
+    """Background job: analyzes a slide's stored shapes and saves the result against their digest."""
+    store = get_metadata_store()
+    digest, shapes = store.slide_with_digest(deck_id, slide_index)
+    if digest is None:
+        return
+    slide_size = load_slide_size(get_workspace(deck_id).manifest_path)
+    store.put_layout_analysis(deck_id, slide_index, digest, analyze_layout(shapes, slide_size))
+    logger.debug(f"Layout analysis stored for deck '{deck_id}' slide {slide_index}")
+
+def schedule_layout_analysis(deck_id: str, slide_indices: Iterable[int]):
+    """Queues precompute_layout for the slides on the low-priority background worker."""
+    if not LAYOUT_ANALYSIS_ENABLED:
+        return
+    for slide_index in slide_indices:
+        background_jobs.enqueue(("layout", deck_id, slide_index), precompute_layout, deck_id, slide_index)
+
+def get_layout_analysis(deck_id: str, slide_index: int) -> Optional[Dict[str, Any]]:
+    """The precomputed analysis if it matches the slide's current metadata, else None."""
+    if not LAYOUT_ANALYSIS_ENABLED:
+        return None
+    analysis = get_metadata_store().get_layout_analysis(deck_id, slide_index)
+    return analysis if analysis and analysis.get("version") == ANALYSIS_VERSION else None
+
+def _targets(shape_ids: List[str]) -> str:
+    return ", ".join(f"shape {shape_id}" for shape_id in shape_ids)
+
+def cleanup_tasks(analysis: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Expanded tasks in cleanup_agent's Output B shape (task_description, action, target_element_hint, params)."""
+    slide_width, slide_height = analysis["slide_size"]
+    tasks = []
+    for issue in analysis.get("issues", []):
+        ids, kind = issue["shape_ids"], issue["kind"]
+        if kind == "overflow":
+            tasks.append({"action": "move_within_slide_bounds", "target_element_hint": _targets(ids),
+                          "params": {"shape_ids": ids, "sides": issue["sides"]},
+                          "task_description": f"Move (or shrink if it is larger than the slide) {_targets(ids)} so it lies fully "
+                                              f"inside the {slide_width:g}x{slide_height:g} slide; it currently extends past the "
+                                              f"{', '.join(issue['sides'])} edge."})
+        elif kind == "misalignment":
+            tasks.append({"action": "align_elements", "target_element_hint": _targets(ids),
+                          "params": {"shape_ids": ids, "alignment": issue["edge"], "position": issue["position"]},
+                          "task_description": f"Align the {issue['edge']} edges of {_targets(ids)} at {issue['position']} px; "
+                                              f"they are nearly aligned but off by a few pixels."})
+        elif kind == "inconsistent_sizes":
+            tasks.append({"action": "match_sizes", "target_element_hint": _targets(ids),
+                          "params": {"shape_ids": ids, "width": issue["width"], "height": issue["height"]},
+                          "task_description": f"Give {_targets(ids)} the same size, {issue['width']} x {issue['height']} px, "
+                                              f"keeping each shape's center in place."})
+        elif kind == "uneven_gaps":
+            tasks.append({"action": "distribute_elements", "target_element_hint": _targets(ids),
+                          "params": {"shape_ids": ids, "axis": issue["axis"], "gap": issue["gap"]},
+                          "task_description": f"Distribute {_targets(ids)} {issue['axis']}ly with an even gap of {issue['gap']} px "
+                                              f"between neighbours (currently {issue['gaps']}), keeping the first shape in place."})
+    return tasks
@@ -0,0 +1,145 @@
+# utils/llm_transport.py
+import os, json, time, hashlib, logging, threading
+from contextvars import ContextVar
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, Iterable, List, Optional
+from config.config import LLM_TRANSPORT, LLM_FIXTURE_DIR, LLM_REPLAY_LATENCY
+from config.llmProvider import get_genai_client
+from utils import context_cache
+
+logger = logging.getLogger(__name__)
+
+# live:   calls Gemini.
+# record: calls Gemini and writes every prompt/response pair (with its latency) to LLM_FIXTURE_DIR.
+# replay: serves responses from LLM_FIXTURE_DIR without any network access; unknown prompts raise
+#         FixtureNotFoundError. LLM_REPLAY_LATENCY is "recorded", "0", or a fixed number of seconds.
+# The derived-render response cache sits above this layer; disable it (DERIVED_CACHE_ENABLED=false)
+# when benchmarking so every call reaches the transport.
+TRANSPORT_MODES = ("live", "record", "replay")
+_write_lock = threading.Lock()
+
+class FixtureNotFoundError(LookupError):
+    """Replay mode was asked for a prompt that was never recorded."""
+
+class CallAbandoned(Exception):
+    """Raised instead of starting a model call whose result is no longer wanted (see abandon_when)."""
+
+# Per task; asyncio.to_thread copies it into the worker thread that makes the calls
+_abandoned: ContextVar[Optional[threading.Event]] = ContextVar("llm_calls_abandoned", default=None)
+
+def abandon_when(event: threading.Event):
+    """Model calls made later from the current context raise CallAbandoned once `event` is set; calls in flight finish."""
+    _abandoned.set(event)
+
+def _check_abandoned(call_site: str):
+    event = _abandoned.get()
+    if event is not None and event.is_set():
+        raise CallAbandoned(f"{call_site} call skipped; its result was abandoned")
+
+def _flatten(contents: Any) -> Iterable[Any]:
+    if isinstance(contents, (list, tuple)):
+        for item in contents:
+            yield from _flatten(item)
+    else:
+        yield contents
+
+def _describe(contents: Any) -> List[Dict[str, Any]]:
+    """Stable, JSON-serializable view of the prompt: text as-is, inline images by digest and size."""
+    described = []
+    for part in _flatten(contents):
+        if isinstance(part, str):
+            described.append({"text": part})
+            continue
+        inline = getattr(part, "inline_data", None)
+        data = getattr(inline, "data", None)
+        if isinstance(data, (bytes, bytearray)):
+            described.append({"image_sha256": hashlib.sha256(data).hexdigest(), "mime_type": getattr(inline, "mime_type", None), "bytes": len(data)})
+        else:
+            described.append({"repr": repr(part)})
+    return described
+
+def fixture_key(call_site: str, model: str, prompt: Any) -> str:
+    return hashlib.sha256(json.dumps([call_site, model, prompt], sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+def _fixture_path(key: str) -> str:
+    return os.path.join(LLM_FIXTURE_DIR, key[:2], f"{key}.json")
+
+def _usage(response: Any) -> Optional[Dict[str, Any]]:
+    usage = getattr(response, "usage_metadata", None)
+    if usage is None:
+        return None
+    return {field: getattr(usage, field, None) for field in ("prompt_token_count", "candidates_token_count", "total_token_count")}
+
+def _record(key: str, call_site: str, model: str, prompt: Any, text: str, usage: Optional[Dict[str, Any]], latency: float):
+    path = _fixture_path(key)
+    fixture = {"call_site": call_site, "model": model, "prompt": prompt, "text": text, "usage": usage, "latency_seconds": round(latency, 4)}
+    with _write_lock:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(fixture, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, path)
+
+def _replay(key: str, call_site: str) -> Dict[str, Any]:
+    try:
+        with open(_fixture_path(key), "r", encoding="utf-8") as f:
+            fixture = json.load(f)
+    except FileNotFoundError:
+        raise FixtureNotFoundError(f"No recorded {call_site} response for prompt {key[:12]} in {LLM_FIXTURE_DIR}")
+    delay = fixture.get("latency_seconds", 0) if LLM_REPLAY_LATENCY == "recorded" else float(LLM_REPLAY_LATENCY or 0)
+    if delay > 0:
+        time.sleep(delay)
+    return fixture
+
+def _replayed_response(fixture: Dict[str, Any]) -> Any:
+    """Stands in for a genai response: .text and .usage_metadata are all the pipeline reads."""
+    usage = fixture.get("usage")
+    return SimpleNamespace(text=fixture.get("text", ""), usage_metadata=SimpleNamespace(**usage) if usage else None)
+
+def generate_content(model: str, contents: Any, call_site: str = "default", client: Any = None, prefix: Optional[List[Any]] = None) -> Any:
+    """
+    Drop-in for client.models.generate_content(model=..., contents=...) that honours LLM_TRANSPORT.
+    `client` defaults to the shared google-genai client, which replay mode never creates.
+    `prefix` holds parts that repeat across calls (instructions, slide XML, slide image); live
+    calls reference them through the context cache, and fixtures see prefix + contents as one prompt.
+    """
+    _check_abandoned(call_site)
+    prefix = list(_flatten(prefix)) if prefix else []
+    contents = list(_flatten(contents))
+    if LLM_TRANSPORT == "live":
+        return context_cache.generate(client or get_genai_client(), model, prefix, contents, call_site)
+
+    prompt = _describe([*prefix, *contents])
+    key = fixture_key(call_site, model, prompt)
+    if LLM_TRANSPORT == "replay":
+        return _replayed_response(_replay(key, call_site))
+
+    start = time.perf_counter()
+    response = context_cache.generate(client or get_genai_client(), model, prefix, contents, call_site)
+    _record(key, call_site, model, prompt, getattr(response, "text", None) or "", _usage(response), time.perf_counter() - start)
+    return response
+
+def invoke_chain(get_chain: Callable[[], Any], inputs: Dict[str, Any], call_site: str, model: str, template: str = "") -> str:
+    """
+    Drop-in for a langchain text chain's .invoke(inputs) that honours LLM_TRANSPORT. `get_chain`
+    builds (or returns the memoized) chain and is only called when the LLM is actually reached.
+    Fixtures are keyed on the inputs plus `template`, so editing the prompt template invalidates them.
+    """
+    _check_abandoned(call_site)
+    if LLM_TRANSPORT == "live":
+        return get_chain().invoke(inputs)
+
+    prompt = [{"template_sha256": hashlib.sha256(template.encode("utf-8")).hexdigest(), "inputs": inputs}]
+    key = fixture_key(call_site, model, prompt)
+    if LLM_TRANSPORT == "replay":
+        return _replay(key, call_site).get("text", "")
+
+    start = time.perf_counter()
+    text = get_chain().invoke(inputs)
+    _record(key, call_site, model, prompt, text, None, time.perf_counter() - start)
+    return text
+
+if LLM_TRANSPORT not in TRANSPORT_MODES:
+    raise ValueError(f"LLM_TRANSPORT must be one of {TRANSPORT_MODES}, got '{LLM_TRANSPORT}'")
+if LLM_TRANSPORT != "live":
+    logger.info(f"LLM transport in {LLM_TRANSPORT} mode (fixtures: {LLM_FIXTURE_DIR})")
@@ -4,26 +4,74 @@ import aiofiles
 from typing import Dict, Any
 from fastapi import HTTPException, status
 import logging
+from utils.workspace import Workspace
+from utils.image_prep import model_image_mime, model_image_suffix
+from utils.slide_manifest import load_manifest
+from utils.telemetry import traced
+from utils.metrics import set_slide_cache_size
+from utils.shared_state import get_shared_state
 
 logger = logging.getLogger(__name__)
 
-CONTEXT_BASE_DIR = "uploaded_pptx/slide_images/presentation" 
+# --- Per-deck slide context cache ---
+# Per process. Entries are tagged with the deck's shared generation, so a re-upload handled by any
+# worker invalidates them everywhere.
+slide_context_cache: Dict[str, Dict[int, Dict[str, Any]]] = {}
+_cache_generation: Dict[str, int] = {}
 
-async def load_slide_contexts(target_slides: list[int]) -> Dict[int, Dict[str, Any]]:
+def _cached_slide_bytes() -> int:
+    total = 0
+    for deck in list(slide_context_cache.values()):
+        for context in list(deck.values()):
+            total += sum(len(context.get(k) or b"") for k in ("slide_image_bytes", "slide_model_image_bytes", "slide_image_base64", "slide_xml_structure"))
+    return total
+
+def _publish_cache_size():
+    set_slide_cache_size(sum(len(deck) for deck in list(slide_context_cache.values())), _cached_slide_bytes())
+
+def _drop_local(deck_id: str) -> bool:
+    _cache_generation.pop(deck_id, None)
+    dropped = slide_context_cache.pop(deck_id, None) is not None
+    _publish_cache_size()
+    return dropped
+
+def invalidate_slide_contexts(deck_id: str):
+    """Drops every cached slide context for a deck in all workers, e.g. after it is re-uploaded."""
+    get_shared_state().bump_generation(deck_id)
+    if _drop_local(deck_id):
+        logger.info(f"Invalidated cached slide context for deck '{deck_id}'")
+
+@traced("pipeline.load_context")
+async def get_slide_contexts(workspace: Workspace, target_slides: list[int]) -> Dict[int, Dict[str, Any]]:
+    generation = get_shared_state().generation(workspace.deck_id)
+    if _cache_generation.get(workspace.deck_id, generation) != generation and _drop_local(workspace.deck_id):
+        logger.info(f"Deck '{workspace.deck_id}' was re-uploaded by another worker; reloading slide contexts")
+    _cache_generation[workspace.deck_id] = generation
+    deck_cache = slide_context_cache.setdefault(workspace.deck_id, {})
+    uncached = [i for i in target_slides if i not in deck_cache]
+    if uncached:
+        logger.info(f"Loading context for uncached slides of deck '{workspace.deck_id}': {uncached}")
+        deck_cache.update(await load_slide_contexts(workspace, uncached))
+        _publish_cache_size()
+    return {i: deck_cache[i] for i in target_slides if i in deck_cache}
+
+async def load_slide_contexts(workspace: Workspace, target_slides: list[int]) -> Dict[int, Dict[str, Any]]:
     loaded_context_dict: Dict[int, Dict[str, Any]] = {}
     if not target_slides:
         logger.warning("No target slide indices provided. Skipping context load.")
         return loaded_context_dict
 
     try:
-        all_files_in_dir = os.listdir(CONTEXT_BASE_DIR)
+        context_dir = workspace.slides_dir
+        all_files_in_dir = os.listdir(context_dir)
         all_files_set = set(all_files_in_dir)
+        manifest = load_manifest(workspace.manifest_path)
 
         for index in target_slides:
             slide_context: Dict[str, Any] = {}
-            xml_path = os.path.join(CONTEXT_BASE_DIR, f"slide{index}.xml")
-            img_txt_path = os.path.join(CONTEXT_BASE_DIR, f"slide{index}_image.txt")
-            img_png_path = os.path.join(CONTEXT_BASE_DIR, f"slide{index}.png")
+            xml_path = os.path.join(context_dir, f"slide{index}.xml")
+            img_txt_path = os.path.join(context_dir, f"slide{index}_image.txt")
+            img_png_path = os.path.join(context_dir, f"slide{index}.png")
 
             if f"slide{index}.xml" not in all_files_set:
                 raise HTTPException(
@@ -46,6 +94,15 @@ async def load_slide_contexts(target_slides: list[int]) -> Dict[int, Dict[str, A
                     slide_context["slide_image_bytes"] = await f.read()
             else:
                 slide_context["slide_image_bytes"] = None
+
+            model_name = f"slide{index}{model_image_suffix()}"
+            if model_name in all_files_set:
+                async with aiofiles.open(os.path.join(context_dir, model_name), "rb") as f:
+                    slide_context["slide_model_image_bytes"] = await f.read()
+                slide_context["slide_model_image_mime"] = model_image_mime()
+            if index in manifest:
+                slide_context["slide_image_phash"] = manifest[index].get("phash")
+                slide_context["slide_image_sha256"] = manifest[index].get("sha256")
             loaded_context_dict[index] = slide_context
         return loaded_context_dict
 
@@ -0,0 +1,187 @@
+# utils/metadata_store.py
+import os, json, sqlite3, hashlib, threading, logging
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from utils.shape_table import ShapeTable
+
+logger = logging.getLogger(__name__)
+
+# --- Configuration ---
+METADATA_DB_PATH = "./uploaded_pptx/metadata.sqlite3"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS shapes (
+    deck_id TEXT NOT NULL,
+    slide_index INTEGER NOT NULL,
+    shape_id TEXT NOT NULL,
+    z_index INTEGER NOT NULL,
+    type TEXT,
+    parent_group_id TEXT,
+    text TEXT,
+    x0 REAL, y0 REAL, x1 REAL, y1 REAL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (deck_id, slide_index, shape_id)
+);
+CREATE INDEX IF NOT EXISTS idx_shapes_type ON shapes (deck_id, slide_index, type);
+CREATE INDEX IF NOT EXISTS idx_shapes_x ON shapes (deck_id, slide_index, x0, x1);
+CREATE INDEX IF NOT EXISTS idx_shapes_y ON shapes (deck_id, slide_index, y0, y1);
+CREATE TABLE IF NOT EXISTS layout_analysis (
+    deck_id TEXT NOT NULL,
+    slide_index INTEGER NOT NULL,
+    shapes_digest TEXT NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (deck_id, slide_index)
+);
+"""
+
+def _num(value: Any) -> Optional[float]:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+class MetadataStore:
+    """Embedded SQLite store for shape metadata with indexed lookups by deck, slide, id, type, region and text."""
+    def __init__(self, db_path: str = METADATA_DB_PATH):
+        if db_path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)  # other workers may hold the write lock
+        self._conn.row_factory = sqlite3.Row
+        if db_path != ":memory:":
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+
+    # --- Writes ---
+    def _rows(self, deck_id: str, slide_index: int, shapes: Iterable[Dict[str, Any]]):
+        for z, shape in enumerate(shapes):
+            left, top = _num(shape.get("left")), _num(shape.get("top"))
+            width, height = _num(shape.get("width")) or 0.0, _num(shape.get("height")) or 0.0
+            yield (
+                deck_id, slide_index, str(shape.get("id", "")), shape.get("zIndex", z), shape.get("type"),
+                shape.get("parentGroupId"), shape.get("text") or "",
+                left, top,
+                left + width if left is not None else None,
+                top + height if top is not None else None,
+                json.dumps(shape, separators=(",", ":")),
+            )
+
+    def replace_slide(self, deck_id: str, slide_index: int, shapes: List[Dict[str, Any]]):
+        self.replace_slides(deck_id, {slide_index: shapes})
+
+    def replace_slides(self, deck_id: str, slides: Dict[int, List[Dict[str, Any]]]):
+        """Replaces the given slides of a deck in one transaction."""
+        with self._lock, self._conn:
+            for slide_index, shapes in slides.items():
+                self._conn.execute("DELETE FROM shapes WHERE deck_id = ? AND slide_index = ?", (deck_id, slide_index))
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO shapes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    self._rows(deck_id, slide_index, shapes),
+                )
+
+    def delete_deck(self, deck_id: str):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM shapes WHERE deck_id = ?", (deck_id,))
+            self._conn.execute("DELETE FROM layout_analysis WHERE deck_id = ?", (deck_id,))
+
+    # --- Derived per-slide analysis (utils/layout_analysis.py) ---
+    def _slide_rows(self, deck_id: str, slide_index: int) -> List[str]:
+        return [row["data"] for row in self._conn.execute(
+            "SELECT data FROM shapes WHERE deck_id = ? AND slide_index = ? ORDER BY z_index", (deck_id, slide_index)
+        ).fetchall()]
+
+    @staticmethod
+    def _digest(rows: List[str]) -> Optional[str]:
+        return hashlib.sha256("\n".join(rows).encode("utf-8")).hexdigest() if rows else None
+
+    def slide_with_digest(self, deck_id: str, slide_index: int) -> Tuple[Optional[str], List[Dict[str, Any]]]:
+        """A slide's shapes plus a digest of them, read together; (None, []) for a slide without metadata."""
+        with self._lock:
+            rows = self._slide_rows(deck_id, slide_index)
+        return self._digest(rows), [json.loads(row) for row in rows]
+
+    def put_layout_analysis(self, deck_id: str, slide_index: int, shapes_digest: str, analysis: Dict[str, Any]):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO layout_analysis VALUES (?, ?, ?, ?)",
+                (deck_id, slide_index, shapes_digest, json.dumps(analysis, separators=(",", ":"))),
+            )
+
+    def get_layout_analysis(self, deck_id: str, slide_index: int) -> Optional[Dict[str, Any]]:
+        """The stored analysis, only if it was computed from the slide's current shapes."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT shapes_digest, data FROM layout_analysis WHERE deck_id = ? AND slide_index = ?", (deck_id, slide_index)
+            ).fetchone()
+            if row is None or row["shapes_digest"] != self._digest(self._slide_rows(deck_id, slide_index)):
+                return None
+        return json.loads(row["data"])
+
+    # --- Queries ---
+    def _query(self, sql: str, params: tuple) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute(sql + " ORDER BY z_index", params).fetchall()
+        return [json.loads(row["data"]) for row in rows]
+
+    def has_slide(self, deck_id: str, slide_index: int) -> bool:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM shapes WHERE deck_id = ? AND slide_index = ? LIMIT 1", (deck_id, slide_index)
+            ).fetchone()
+        return row is not None
+
+    def get_slide(self, deck_id: str, slide_index: int) -> List[Dict[str, Any]]:
+        return self._query("SELECT data FROM shapes WHERE deck_id = ? AND slide_index = ?", (deck_id, slide_index))
+
+    def get_shapes(self, deck_id: str, slide_index: int, shape_ids: Iterable[str]) -> List[Dict[str, Any]]:
+        ids = [str(shape_id) for shape_id in shape_ids]
+        if not ids:
+            return []
+        placeholders = ",".join("?" * len(ids))
+        return self._query(
+            f"SELECT data FROM shapes WHERE deck_id = ? AND slide_index = ? AND shape_id IN ({placeholders})",
+            (deck_id, slide_index, *ids),
+        )
+
+    def get_shape(self, deck_id: str, slide_index: int, shape_id: str) -> Optional[Dict[str, Any]]:
+        shapes = self.get_shapes(deck_id, slide_index, [shape_id])
+        return shapes[0] if shapes else None
+
+    def by_type(self, deck_id: str, slide_index: int, shape_type: str) -> List[Dict[str, Any]]:
+        return self._query(
+            "SELECT data FROM shapes WHERE deck_id = ? AND slide_index = ? AND type = ?", (deck_id, slide_index, shape_type)
+        )
+
+    def in_region(self, deck_id: str, slide_index: int, left: float, top: float, right: float, bottom: float,
+                  contained: bool = False) -> List[Dict[str, Any]]:
+        """Shapes intersecting (or, with contained=True, fully inside) the given box, in the metadata's px units."""
+        if contained:
+            clause = "x0 >= ? AND y0 >= ? AND x1 <= ? AND y1 <= ?"
+            params = (left, top, right, bottom)
+        else:
+            clause = "x0 <= ? AND x1 >= ? AND y0 <= ? AND y1 >= ?"
+            params = (right, left, bottom, top)
+        return self._query(
+            f"SELECT data FROM shapes WHERE deck_id = ? AND slide_index = ? AND {clause}", (deck_id, slide_index, *params)
+        )
+
+    def by_text(self, deck_id: str, slide_index: int, needle: str) -> List[Dict[str, Any]]:
+        escaped = needle.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        return self._query(
+            "SELECT data FROM shapes WHERE deck_id = ? AND slide_index = ? AND text LIKE ? ESCAPE '\\'",
+            (deck_id, slide_index, f"%{escaped}%"),
+        )
+
+    def snapshot(self, deck_id: str, slide_index: int) -> ShapeTable:
+        """One indexed query into a ShapeTable; further .snapshot() calls on it only copy geometry."""
+        return ShapeTable(self.get_slide(deck_id, slide_index))
+
+_store: Optional[MetadataStore] = None
+_store_lock = threading.Lock()
+
+def get_metadata_store() -> MetadataStore:
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = MetadataStore()
+    return _store
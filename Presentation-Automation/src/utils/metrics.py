@@ -0,0 +1,85 @@
+# utils/metrics.py
+import os, logging
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+
+logger = logging.getLogger(__name__)
+
+# Seconds; spans both sub-second LLM/cache work and multi-second LibreOffice conversions
+_LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2, 4, 8, 16, 32, 64, 128)
+
+STAGE_SECONDS = Histogram(
+    "pipeline_stage_seconds", "Latency of pipeline and ingestion stages (span name as stage).",
+    ["stage"], buckets=_LATENCY_BUCKETS,
+)
+LLM_CALL_SECONDS = Histogram(
+    "llm_call_seconds", "Latency of LLM calls per call site, including cache lookups.",
+    ["call_site"], buckets=_LATENCY_BUCKETS,
+)
+LLM_CALLS = Counter("llm_calls_total", "LLM calls per call site.", ["call_site"])
+LLM_ERRORS = Counter("llm_errors_total", "Failed LLM calls per call site; kind is rate_limited (429) or error.", ["call_site", "kind"])
+LLM_CACHE_HITS = Counter("llm_cache_hits_total", "LLM calls answered from the derived-render cache.", ["call_site"])
+LLM_CONTEXT_CACHE = Counter(
+    "llm_context_cache_total", "Prompt prefixes per call site by outcome: created, reused, expired, evicted, refused or inline.",
+    ["call_site", "result"],
+)
+DIRECT_TASKS = Counter(
+    "direct_tasks_total", "Sub-tasks whose description was synthesized without a category-agent LLM call.", ["agent"],
+)
+SPECULATIONS = Counter(
+    "speculative_agent_total", "Category-agent calls started before classification, by outcome: committed, discarded or failed.", ["result"],
+)
+MODEL_TIERS = Counter(
+    "llm_model_tier_total", "LLM calls per call site by first tier and outcome: lite accepted/escalated or full routed.",
+    ["call_site", "tier", "outcome"],
+)
+REFINER_IMAGES = Counter(
+    "refiner_image_total", "Refiner calls by slide image sent: crop (target region plus thumbnail), full or none.", ["kind"],
+)
+# Gauges are summed over live workers when serve.py runs several (PROMETHEUS_MULTIPROC_DIR set)
+REQUESTS_IN_FLIGHT = Gauge("http_requests_in_flight", "HTTP requests currently being handled.", multiprocess_mode="livesum")
+CACHED_SLIDES = Gauge("slide_context_cache_slides", "Slide contexts held in the in-memory cache.", multiprocess_mode="livesum")
+CACHED_BYTES = Gauge("slide_context_cache_bytes", "Approximate image and XML bytes held by cached slide contexts.", multiprocess_mode="livesum")
+
+def observe_stage(stage: str, seconds: float):
+    STAGE_SECONDS.labels(stage=stage).observe(seconds)
+
+def observe_llm_call(call_site: str, seconds: float, error: BaseException = None, cache_hit: bool = False):
+    LLM_CALLS.labels(call_site=call_site).inc()
+    LLM_CALL_SECONDS.labels(call_site=call_site).observe(seconds)
+    if cache_hit:
+        LLM_CACHE_HITS.labels(call_site=call_site).inc()
+    if error is not None:
+        LLM_ERRORS.labels(call_site=call_site, kind="rate_limited" if _is_rate_limit(error) else "error").inc()
+
+def observe_context_cache(call_site: str, result: str):
+    LLM_CONTEXT_CACHE.labels(call_site=call_site, result=result).inc()
+
+def observe_direct_task(agent: str):
+    DIRECT_TASKS.labels(agent=agent).inc()
+
+def observe_speculation(result: str):
+    SPECULATIONS.labels(result=result).inc()
+
+def observe_refiner_image(kind: str):
+    REFINER_IMAGES.labels(kind=kind).inc()
+
+def observe_model_tier(call_site: str, tier: str, outcome: str):
+    MODEL_TIERS.labels(call_site=call_site, tier=tier, outcome=outcome).inc()
+
+def _is_rate_limit(error: BaseException) -> bool:
+    code = getattr(error, "code", None) or getattr(error, "status_code", None)
+    return code == 429 or type(error).__name__ == "ResourceExhausted" or "429" in str(error)[:200]
+
+def set_slide_cache_size(slides: int, size_bytes: int):
+    """Updated by the slide context cache whenever it changes."""
+    CACHED_SLIDES.set(slides)
+    CACHED_BYTES.set(size_bytes)
+
+def render_metrics():
+    """(body, content_type) in the Prometheus text exposition format, aggregated over all workers in multi-worker mode."""
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -0,0 +1,129 @@
+# utils/model_router.py
+import re, json, logging, threading
+from typing import Any, Callable, Dict, Iterable, List, Optional, TypeVar
+from config.config import MODEL_TIERING, MODEL_TIER_THRESHOLD, GEMINI_FLASH_2_0_MODEL, GEMINI_FLASH_2_0_MODEL_LITE
+from utils import llm_transport
+from utils.context_cache import estimate_tokens
+from utils.metrics import observe_model_tier
+from utils.telemetry import set_span_attributes
+
+logger = logging.getLogger(__name__)
+
+# Complexity-based tiering: each call is scored from its call site, prompt size, whether it carries an
+# image and how often the lite model's output failed validation there recently. Calls scoring below
+# MODEL_TIER_THRESHOLD go to the lite model first and are retried on the full model when the lite
+# answer fails the caller's validation (or the call errors).
+
+# Configured model per tier; langchain callers map tiers to the matching clients in config/llmProvider.py
+MODELS = {"lite": GEMINI_FLASH_2_0_MODEL_LITE, "full": GEMINI_FLASH_2_0_MODEL}
+
+# Inherent difficulty per call site: classification maps text to a fixed schema; the task-description
+# agents restate one sub-task (cleanup_visual only checks the image for overflow and clutter); the refiner does geometry against the image and codegen writes Office.js.
+_SITE_WEIGHT = {"classify": 0.1, "formatting": 0.25, "cleanup": 0.3, "cleanup_visual": 0.2, "visual_enhancement": 0.35,
+                "refiner": 0.9, "codegen": 0.8}
+_DEFAULT_SITE_WEIGHT = 0.6
+_TOKENS_FOR_MAX_SIZE_WEIGHT = 8000  # prompts this long add the full 0.4
+_IMAGE_WEIGHT = 0.15
+_FAILURE_WEIGHT = 0.5
+# Exponential moving average of lite validation failures per call site; calls routed to the full model
+# only because of that history let it fade slowly, so the lite model is retried now and then
+_FAILURE_DECAY = 0.9
+_FORGIVE_DECAY = 0.99
+
+_lite_failure_rate: Dict[str, float] = {}
+_rate_lock = threading.Lock()
+
+T = TypeVar("T")
+
+def _has_image(parts: Iterable[Any]) -> bool:
+    return any(isinstance(getattr(getattr(part, "inline_data", None), "data", None), (bytes, bytearray)) for part in parts)
+
+def _task_complexity(call_site: str, parts: List[Any]) -> float:
+    return (_SITE_WEIGHT.get(call_site, _DEFAULT_SITE_WEIGHT)
+            + 0.4 * min(estimate_tokens(parts) / _TOKENS_FOR_MAX_SIZE_WEIGHT, 1.0)
+            + (_IMAGE_WEIGHT if _has_image(parts) else 0.0))
+
+def complexity(call_site: str, parts: List[Any]) -> float:
+    """0 (trivial) to ~2; below MODEL_TIER_THRESHOLD the lite model is tried first."""
+    with _rate_lock:
+        failure_rate = _lite_failure_rate.get(call_site, 0.0)
+    return _task_complexity(call_site, parts) + _FAILURE_WEIGHT * failure_rate
+
+def choose_tier(call_site: str, parts: List[Any]) -> str:
+    if MODEL_TIERING == "off":
+        return "full"
+    if complexity(call_site, parts) < MODEL_TIER_THRESHOLD:
+        return "lite"
+    if _task_complexity(call_site, parts) < MODEL_TIER_THRESHOLD:
+        # Kept off the lite model only by its failure history; let that fade so lite gets retried later
+        with _rate_lock:
+            _lite_failure_rate[call_site] = _lite_failure_rate.get(call_site, 0.0) * _FORGIVE_DECAY
+    return "full"
+
+def _record_lite_outcome(call_site: str, failed: bool):
+    with _rate_lock:
+        rate = _lite_failure_rate.get(call_site, 0.0)
+        _lite_failure_rate[call_site] = rate * _FAILURE_DECAY + (1 - _FAILURE_DECAY) * (1.0 if failed else 0.0)
+
+def _answered_by(tier: str):
+    """Labels the enclosing LLM span with the model that produced the answer."""
+    set_span_attributes(**{"llm.model": MODELS[tier], "llm.tier": tier})
+
+def call_tiered(call_site: str, parts: List[Any], call: Callable[[str], T], validate: Callable[[T], bool]) -> T:
+    """call(tier) on the chosen tier; a lite result that raises or fails validate() is redone on the full tier."""
+    if choose_tier(call_site, parts) == "lite":
+        try:
+            result = call("lite")
+            valid = validate(result)
+        except llm_transport.CallAbandoned:
+            raise
+        except llm_transport.FixtureNotFoundError:
+            # Replaying fixtures recorded before tiering (or with it off); not a verdict on the lite model
+            _answered_by("full")
+            return call("full")
+        except Exception as e:
+            logger.info(f"Lite model call for {call_site} failed, escalating: {e}")
+            valid = False
+        _record_lite_outcome(call_site, failed=not valid)
+        if valid:
+            observe_model_tier(call_site, "lite", "accepted")
+            _answered_by("lite")
+            return result
+        observe_model_tier(call_site, "lite", "escalated")
+    else:
+        observe_model_tier(call_site, "full", "routed")
+    _answered_by("full")
+    return call("full")
+
+def generate_content(contents: Any, call_site: str, validate: Callable[[str], bool], prefix: Optional[List[Any]] = None) -> Any:
+    """llm_transport.generate_content on the tier chosen for the call; validate() receives the response text."""
+    parts = [*(prefix or []), *(contents if isinstance(contents, list) else [contents])]
+    return call_tiered(
+        call_site, parts,
+        lambda tier: llm_transport.generate_content(MODELS[tier], contents, call_site=call_site, prefix=prefix),
+        lambda response: validate(getattr(response, "text", None) or ""),
+    )
+
+# --- Output validators shared by the call sites ---
+def _json_object(text: str) -> Optional[Dict[str, Any]]:
+    match = re.search(r'(\{[\s\S]*\})', text)
+    if not match:
+        return None
+    try:
+        parsed = json.loads(match.group(1))
+    except json.JSONDecodeError:
+        return None
+    return parsed if isinstance(parsed, dict) else None
+
+def has_json_keys(*any_of: str) -> Callable[[str], bool]:
+    """Validator: the text contains a JSON object with at least one of the keys."""
+    def validate(text: str) -> bool:
+        parsed = _json_object(text)
+        return parsed is not None and any(key in parsed for key in any_of)
+    return validate
+
+def has_all_json_keys(*keys: str) -> Callable[[str], bool]:
+    def validate(text: str) -> bool:
+        parsed = _json_object(text)
+        return parsed is not None and all(key in parsed for key in keys)
+    return validate
@@ -0,0 +1,133 @@
+# utils/pptx_reader.py
+import posixpath, zipfile, threading, logging
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+from lxml import etree
+
+logger = logging.getLogger(__name__)
+
+NS = {
+    "p": "http://schemas.openxmlformats.org/presentationml/2006/main",
+    "r": "http://schemas.openxmlformats.org/officeDocument/2006/relationships",
+    "rel": "http://schemas.openxmlformats.org/package/2006/relationships",
+}
+PRESENTATION_PART = "ppt/presentation.xml"
+SLIDE_TREE_CACHE_SIZE = 8
+
+
+_REL_SLIDE = "/slide"
+_REL_LAYOUT = "/slideLayout"
+_REL_MASTER = "/slideMaster"
+
+def _parse(data: bytes) -> etree._Element:
+    # Same whitespace handling as python-pptx, so pretty-printed slide XML is unchanged.
+    # A parser per call: lxml parser objects must not be shared between threads.
+    return etree.fromstring(data, etree.XMLParser(remove_blank_text=True, resolve_entities=False))
+
+def _rels_path(part_name: str) -> str:
+    directory, filename = posixpath.split(part_name)
+    return posixpath.join(directory, "_rels", f"{filename}.rels")
+
+class SlideReader:
+    """
+    Lazy, zip-level view of a PPTX. Only ppt/presentation.xml (and its rels) are parsed up front
+    to get slide order and slide size; individual slide, layout and master parts are read from the zip on demand,
+    with a small LRU of parsed trees. Use as a context manager, or call close().
+    """
+    def __init__(self, pptx_path: str, cache_size: int = SLIDE_TREE_CACHE_SIZE):
+        self.pptx_path = pptx_path
+        self._zip = zipfile.ZipFile(pptx_path, "r")
+        self._lock = threading.Lock()
+        self._cache_size = cache_size
+        self._trees: "OrderedDict[str, etree._Element]" = OrderedDict()
+        self._rels: Dict[str, Dict[str, Tuple[str, str]]] = {}
+        try:
+            self.slide_parts, self.slide_size_emu = self._read_presentation()
+        except Exception:
+            self._zip.close()
+            raise
+
+    def __enter__(self) -> "SlideReader":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._zip.close()
+
+    def __len__(self) -> int:
+        return len(self.slide_parts)
+
+    # --- Parts ---
+    def _read(self, part_name: str) -> bytes:
+        with self._lock:
+            return self._zip.read(part_name)
+
+    def part(self, part_name: str) -> etree._Element:
+        """Parsed root element of a package part, served from the LRU when recently used."""
+        with self._lock:
+            if part_name in self._trees:
+                self._trees.move_to_end(part_name)
+                return self._trees[part_name]
+        root = _parse(self._read(part_name))
+        with self._lock:
+            self._trees[part_name] = root
+            while len(self._trees) > self._cache_size:
+                self._trees.popitem(last=False)
+        return root
+
+    def rels(self, part_name: str) -> Dict[str, Tuple[str, str]]:
+        """rId -> (relationship type, resolved part name) for internal relationships of a part."""
+        if part_name not in self._rels:
+            rels = {}
+            try:
+                root = _parse(self._read(_rels_path(part_name)))
+            except KeyError:
+                root = None
+            if root is not None:
+                base = posixpath.dirname(part_name)
+                for rel in root.iterfind("rel:Relationship", NS):
+                    if rel.get("TargetMode") == "External":
+                        continue
+                    target = rel.get("Target", "")
+                    resolved = target.lstrip("/") if target.startswith("/") else posixpath.normpath(posixpath.join(base, target))
+                    rels[rel.get("Id")] = (rel.get("Type", ""), resolved)
+            self._rels[part_name] = rels
+        return self._rels[part_name]
+
+    def _related(self, part_name: str, rel_suffix: str) -> Optional[str]:
+        return next((target for rel_type, target in self.rels(part_name).values() if rel_type.endswith(rel_suffix)), None)
+
+    def _read_presentation(self) -> Tuple[List[str], Optional[Tuple[int, int]]]:
+        """Slide part names in presentation order, and the slide size (p:sldSz cx, cy) in EMU if declared."""
+        presentation = _parse(self._read(PRESENTATION_PART))
+        rels = self.rels(PRESENTATION_PART)
+        parts = []
+        for sld_id in presentation.iterfind("p:sldIdLst/p:sldId", NS):
+            rel = rels.get(sld_id.get(f"{{{NS['r']}}}id"))
+            if rel and rel[0].endswith(_REL_SLIDE):
+                parts.append(rel[1])
+        size = presentation.find("p:sldSz", NS)
+        try:
+            slide_size = (int(size.get("cx")), int(size.get("cy"))) if size is not None else None
+        except (TypeError, ValueError):
+            slide_size = None
+        return parts, slide_size
+
+    # --- Slides ---
+    def slide_element(self, slide_index: int) -> etree._Element:
+        """<p:sld> root of the slide at presentation order `slide_index` (0-based)."""
+        return self.part(self.slide_parts[slide_index])
+
+    def layout_element(self, slide_index: int) -> Optional[etree._Element]:
+        layout = self._related(self.slide_parts[slide_index], _REL_LAYOUT)
+        return self.part(layout) if layout else None
+
+    def master_element(self, slide_index: int) -> Optional[etree._Element]:
+        layout = self._related(self.slide_parts[slide_index], _REL_LAYOUT)
+        master = self._related(layout, _REL_MASTER) if layout else None
+        return self.part(master) if master else None
+
+    def slide_xml(self, slide_index: int) -> str:
+        return etree.tostring(self.slide_element(slide_index), encoding="unicode", pretty_print=True, method="xml")
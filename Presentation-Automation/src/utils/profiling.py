@@ -0,0 +1,155 @@
+# utils/profiling.py
+import os, sys, glob, json, time, uuid, logging, threading
+from collections import defaultdict
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional, Tuple
+from config.config import PROFILING_TOKEN, PROFILE_DIR, PROFILE_MAX_KEPT, PROFILE_SAMPLE_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+# Stage timings of the request being profiled; shared with to_thread workers and gathered tasks
+# because both copy the context (and with it this list).
+_stage_log: ContextVar[Optional[List[Dict[str, Any]]]] = ContextVar("profile_stage_log", default=None)
+
+# Leaf frames of threads that are parked rather than working; dropped from the samples
+_IDLE_FRAMES = {("selectors.py", "select"), ("thread.py", "_worker"), ("threading.py", "wait")}
+
+Frame = Tuple[str, str, int]
+
+def profile_requested(headers, query_params) -> bool:
+    """A request opts in with `X-Profile: <PROFILING_TOKEN>` or `?profile=<PROFILING_TOKEN>`; off when no token is configured."""
+    if not PROFILING_TOKEN:
+        return False
+    return PROFILING_TOKEN in (headers.get("x-profile"), query_params.get("profile"))
+
+def record_stage(name: str, seconds: float):
+    """Called by the telemetry helpers for every finished span; no-op outside a profiled request."""
+    log = _stage_log.get()
+    if log is not None:
+        log.append({"stage": name, "seconds": round(seconds, 4), "ended_at": round(time.perf_counter(), 4)})
+
+class SamplingProfiler:
+    """
+    Wall-clock sampler over sys._current_frames(): every `interval` seconds it records the Python
+    stack of every thread, so work handed to asyncio.to_thread shows up too. Samples from other
+    requests served at the same time land in the same profile.
+    """
+    def __init__(self, interval: float = PROFILE_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.samples: Dict[str, List[Tuple[Tuple[Frame, ...], float]]] = defaultdict(list)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+        self.started_at = self.stopped_at = None
+
+    def start(self):
+        self.started_at = time.perf_counter()
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.stopped_at = time.perf_counter()
+
+    def _run(self):
+        last = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            now = time.perf_counter()
+            self._sample(now - last)
+            last = now
+
+    def _sample(self, weight: float):
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == self._thread.ident:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append((code.co_name, code.co_filename, code.co_firstlineno))
+                frame = frame.f_back
+            if not stack or (os.path.basename(stack[0][1]), stack[0][0]) in _IDLE_FRAMES:
+                continue
+            stack.reverse()
+            self.samples[names.get(ident, str(ident))].append((tuple(stack), weight))
+
+    def speedscope(self, name: str) -> Dict[str, Any]:
+        """Profile in speedscope's file format (one sampled profile per thread); open at speedscope.app."""
+        frames, index = [], {}
+        profiles = []
+        duration = (self.stopped_at or time.perf_counter()) - self.started_at
+        for thread_name, samples in sorted(self.samples.items()):
+            stacks, weights = [], []
+            for stack, weight in samples:
+                ids = []
+                for frame in stack:
+                    if frame not in index:
+                        index[frame] = len(frames)
+                        frames.append({"name": frame[0], "file": frame[1], "line": frame[2]})
+                    ids.append(index[frame])
+                stacks.append(ids)
+                weights.append(round(weight, 6))
+            profiles.append({"type": "sampled", "name": thread_name, "unit": "seconds", "startValue": 0,
+                             "endValue": round(duration, 6), "samples": stacks, "weights": weights})
+        return {"$schema": "https://www.speedscope.app/file-format-schema.json", "name": name,
+                "exporter": "presentation-automation", "shared": {"frames": frames}, "profiles": profiles}
+
+class RequestProfile:
+    """Sampler plus stage log for one request; save() writes <id>.speedscope.json and <id>.json to PROFILE_DIR."""
+    def __init__(self, method: str, path: str):
+        self.profile_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        self.method, self.path = method, path
+        self.profiler = SamplingProfiler()
+        self.stages: List[Dict[str, Any]] = []
+        self._token = None
+
+    def start(self):
+        self._token = _stage_log.set(self.stages)
+        self.profiler.start()
+
+    def stop(self):
+        self.profiler.stop()
+        _stage_log.reset(self._token)
+
+    def summary(self, status_code: Optional[int]) -> Dict[str, Any]:
+        started = self.profiler.started_at
+        totals = defaultdict(lambda: {"count": 0, "seconds": 0.0})
+        for stage in self.stages:
+            totals[stage["stage"]]["count"] += 1
+            totals[stage["stage"]]["seconds"] += stage["seconds"]
+        return {
+            "profile_id": self.profile_id,
+            "method": self.method,
+            "path": self.path,
+            "status_code": status_code,
+            "wall_seconds": round(self.profiler.stopped_at - started, 4),
+            "samples": sum(len(samples) for samples in self.profiler.samples.values()),
+            "sample_interval": self.profiler.interval,
+            # Stages overlap (nested spans, parallel slides), so totals can exceed wall time
+            "stage_totals": {name: {"count": t["count"], "seconds": round(t["seconds"], 4)}
+                             for name, t in sorted(totals.items(), key=lambda item: -item[1]["seconds"])},
+            "stages": [{"stage": s["stage"], "seconds": s["seconds"], "ended_at": round(s["ended_at"] - started, 4)} for s in self.stages],
+            "speedscope_file": f"{self.profile_id}.speedscope.json",
+        }
+
+    def save(self, status_code: Optional[int] = None) -> str:
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        summary = self.summary(status_code)
+        with open(os.path.join(PROFILE_DIR, summary["speedscope_file"]), "w", encoding="utf-8") as f:
+            json.dump(self.profiler.speedscope(f"{self.method} {self.path}"), f)
+        summary_path = os.path.join(PROFILE_DIR, f"{self.profile_id}.json")
+        with open(summary_path, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+        prune_profiles()
+        logger.info(f"Saved request profile {self.profile_id} ({summary['wall_seconds']}s, {summary['samples']} samples)")
+        return summary_path
+
+def prune_profiles(keep: int = PROFILE_MAX_KEPT):
+    """Deletes all but the newest `keep` profiles."""
+    summaries = sorted(glob.glob(os.path.join(PROFILE_DIR, "*.json")), key=os.path.getmtime, reverse=True)
+    summaries = [path for path in summaries if not path.endswith(".speedscope.json")]
+    for path in summaries[keep:]:
+        for stale in (path, path[:-len(".json")] + ".speedscope.json"):
+            try:
+                os.remove(stale)
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,101 @@
+# utils/set_of_marks.py
+import hashlib, logging
+from io import BytesIO
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from PIL import Image, ImageDraw, ImageFont
+from config.config import SET_OF_MARKS_LABEL_SIZE_PX, MODEL_IMAGE_FORMAT
+from utils.image_crops import PX_TO_IMAGE
+from utils.image_prep import encode_model_image, model_image_mime
+from utils.derived_cache import render_key, read_derived, write_derived
+
+logger = logging.getLogger(__name__)
+
+# High-contrast colors cycled per shape so neighbouring boxes are distinguishable
+_PALETTE = [(230, 25, 75), (60, 180, 75), (0, 130, 200), (245, 130, 48), (145, 30, 180),
+            (70, 240, 240), (240, 50, 230), (128, 128, 0), (0, 128, 128), (170, 110, 40)]
+_GROUP_COLOR = (128, 128, 128)
+
+def marks_version(render: str, shapes: Iterable[Dict[str, Any]]) -> str:
+    """Identifies a slide version: the render's sha256 plus the ids and geometry that get drawn on it."""
+    digest = hashlib.sha1(render.encode())
+    for shape in shapes:
+        digest.update(repr((shape.get("id"), shape.get("left"), shape.get("top"), shape.get("width"), shape.get("height"))).encode())
+    return digest.hexdigest()[:16]
+
+def _label_font(size: int):
+    try:
+        return ImageFont.load_default(size=size)
+    except TypeError:  # Pillow < 10.1 has no scalable default font
+        return ImageFont.load_default()
+
+def annotate_slide(image: Image.Image, shapes: List[Dict[str, Any]]) -> Image.Image:
+    """
+    Returns a copy of the slide render with every shape's bounding box outlined and labeled with
+    its id. Boxes are drawn in z-order; groups get a thin gray outline so their children stay readable.
+    Labels sit at the box's top-left corner and are pushed down when they would cover an earlier label.
+    """
+    annotated = image.convert("RGB")
+    draw = ImageDraw.Draw(annotated)
+    font = _label_font(max(10, int(SET_OF_MARKS_LABEL_SIZE_PX * PX_TO_IMAGE)))
+    line_width = max(2, int(PX_TO_IMAGE))
+    placed: List[Tuple[int, int, int, int]] = []
+
+    for n, shape in enumerate(shapes):
+        try:
+            left, top = float(shape["left"]) * PX_TO_IMAGE, float(shape["top"]) * PX_TO_IMAGE
+            right = left + float(shape["width"]) * PX_TO_IMAGE
+            bottom = top + float(shape["height"]) * PX_TO_IMAGE
+        except (KeyError, TypeError, ValueError):
+            continue
+        if right - left < 1 and bottom - top < 1:
+            continue
+        is_group = shape.get("type") == "Group"
+        color = _GROUP_COLOR if is_group else _PALETTE[n % len(_PALETTE)]
+        draw.rectangle((left, top, max(left, right), max(top, bottom)), outline=color, width=1 if is_group else line_width)
+
+        label = str(shape.get("id", ""))
+        text_left, text_top, text_right, text_bottom = draw.textbbox((0, 0), label, font=font)
+        w, h = text_right - text_left + 2 * line_width, text_bottom - text_top + 2 * line_width
+        x = int(min(max(0, left), annotated.width - w))
+        y = int(min(max(0, top), annotated.height - h))
+        for _ in range(8):
+            if not any(x < px1 and px0 < x + w and y < py1 and py0 < y + h for px0, py0, px1, py1 in placed):
+                break
+            y = min(y + h, annotated.height - h)
+        placed.append((x, y, x + w, y + h))
+        draw.rectangle((x, y, x + w, y + h), fill=color)
+        draw.text((x + line_width - text_left, y + line_width - text_top), label, fill=(255, 255, 255), font=font)
+    return annotated
+
+def get_marked_image(slide_context: Dict[str, Any], shapes: List[Dict[str, Any]]) -> Tuple[Optional[bytes], str]:
+    """
+    Model-sized (bytes, mime_type) of the set-of-marks render for the shapes' current version.
+    Memoized on the slide context and in the derived-artifact cache under the render's sha256, so
+    each slide version is annotated once, including across re-uploads of an unchanged slide.
+    """
+    png_bytes = slide_context.get("slide_image_bytes")
+    if not png_bytes or not shapes:
+        return None, model_image_mime()
+    render = render_key(slide_context)
+    version = marks_version(render, shapes)
+    cache = slide_context.setdefault("marked_images", {})
+    if version in cache:
+        return cache[version]
+
+    mime = model_image_mime(MODEL_IMAGE_FORMAT)
+    name = f"marks_{version}{_extension(mime)}"
+    cached = read_derived(render, name)
+    if cached is not None:
+        cache[version] = (cached, mime)
+        return cache[version]
+
+    with Image.open(BytesIO(png_bytes)) as image:
+        image.load()
+        marked_bytes, mime = encode_model_image(annotate_slide(image, shapes), fmt=MODEL_IMAGE_FORMAT)
+    write_derived(render, name, marked_bytes)
+    cache[version] = (marked_bytes, mime)
+    logger.info(f"Prepared set-of-marks image {version} for {len(shapes)} shapes ({len(marked_bytes)} bytes)")
+    return cache[version]
+
+def _extension(mime: str) -> str:
+    return {"image/webp": ".webp", "image/png": ".png"}.get(mime, ".jpg")
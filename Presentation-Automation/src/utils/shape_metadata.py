@@ -0,0 +1,200 @@
+# utils/shape_metadata.py
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+from lxml import etree
+
+logger = logging.getLogger(__name__)
+
+NS = {
+    "p": "http://schemas.openxmlformats.org/presentationml/2006/main",
+    "a": "http://schemas.openxmlformats.org/drawingml/2006/main",
+}
+# Office.js reports geometry in points, which the prompts treat as "px" on a ~960x540 slide.
+EMU_PER_PX = 12700
+
+_SHAPE_TAGS = {f"{{{NS['p']}}}{tag}" for tag in ("sp", "pic", "graphicFrame", "grpSp", "cxnSp")}
+_ALIGN_MAP = {"l": "Left", "ctr": "Center", "r": "Right", "just": "Justify", "dist": "Distributed"}
+_GRAPHIC_TYPES = {"table": "Table", "chart": "Chart", "diagram": "SmartArt", "ole": "Ole"}
+
+Box = Tuple[float, float, float, float]
+
+# Layout placeholders without an xfrm inherit from the master placeholder of this base type (as in python-pptx)
+_MASTER_PH_TYPES = {"ctrTitle": "title", "title": "title", "dt": "dt", "ftr": "ftr", "sldNum": "sldNum"}
+
+def _placeholder_boxes(part_element) -> List[Tuple[Any, Optional[Box]]]:
+    boxes = []
+    sp_tree = part_element.find("p:cSld/p:spTree", NS) if part_element is not None else None
+    for sp in (sp_tree.iter(f"{{{NS['p']}}}sp") if sp_tree is not None else ()):
+        ph = sp.find("p:nvSpPr/p:nvPr/p:ph", NS)
+        if ph is not None:
+            boxes.append((ph, _xfrm(sp)[0]))
+    return boxes
+
+def layout_placeholder_geometry(layout_element, master_element=None) -> Dict[str, Box]:
+    """
+    Geometry (EMU) of the layout placeholders a slide inherits from, keyed by "idx:<n>" and
+    "type:<t>", for slide placeholders that have no xfrm of their own. Read straight from the
+    layout (and, for layout placeholders without geometry, master) part XML.
+    """
+    geometry: Dict[str, Box] = {}
+    try:
+        master = {ph.get("type", "obj"): box for ph, box in _placeholder_boxes(master_element) if box}
+        for ph, box in _placeholder_boxes(layout_element):
+            ph_type = ph.get("type", "obj")
+            box = box or master.get(_MASTER_PH_TYPES.get(ph_type, "body"))
+            if box is None:
+                continue
+            geometry.setdefault(f"idx:{ph.get('idx', '0')}", box)
+            geometry.setdefault(f"type:{ph.get('type', 'body')}", box)
+    except Exception as e:
+        logger.warning(f"Could not resolve layout placeholder geometry: {e}")
+    return geometry
+
+def _xfrm(el) -> Tuple[Optional[Box], Optional[Box]]:
+    """Returns ((off_x, off_y, ext_cx, ext_cy), (ch_off_x, ch_off_y, ch_ext_cx, ch_ext_cy)) in EMU."""
+    xfrm = el.find("p:spPr/a:xfrm", NS)
+    if xfrm is None:
+        xfrm = el.find("p:grpSpPr/a:xfrm", NS)
+    if xfrm is None:
+        xfrm = el.find("p:xfrm", NS)
+    if xfrm is None:
+        return None, None
+
+    def pair(tag, a, b):
+        node = xfrm.find(tag, NS)
+        return (int(node.get(a, 0)), int(node.get(b, 0))) if node is not None else None
+
+    off, ext = pair("a:off", "x", "y"), pair("a:ext", "cx", "cy")
+    ch_off, ch_ext = pair("a:chOff", "x", "y"), pair("a:chExt", "cx", "cy")
+    box = off + ext if off and ext else None
+    child = ch_off + ch_ext if ch_off and ch_ext else None
+    return box, child
+
+def _shape_type(el) -> str:
+    tag = etree.QName(el).localname
+    if tag == "grpSp":
+        return "Group"
+    if tag == "pic":
+        # SVG pictures surface as "Graphic" in Office.js
+        return "Graphic" if el.xpath(".//*[local-name()='svgBlip']") else "Image"
+    if tag == "cxnSp":
+        return "Line"
+    if tag == "graphicFrame":
+        data = el.find(".//a:graphicData", NS)
+        uri = data.get("uri", "") if data is not None else ""
+        return next((name for key, name in _GRAPHIC_TYPES.items() if uri.endswith(key) or f"/{key}" in uri), "Unsupported")
+    if el.find("p:nvSpPr/p:nvPr/p:ph", NS) is not None:
+        return "Placeholder"
+    if el.find("p:nvSpPr/p:cNvSpPr", NS) is not None and el.find("p:nvSpPr/p:cNvSpPr", NS).get("txBox") == "1":
+        return "TextBox"
+    if el.find("p:spPr/a:custGeom", NS) is not None:
+        return "Freeform"
+    return "GeometricShape"
+
+def _text_and_font(el) -> Tuple[str, Dict[str, Any], Optional[str]]:
+    font = {"name": None, "size": None, "bold": False, "italic": False}
+    paragraphs = el.findall(".//a:p", NS)
+    text = "\n".join("".join(t.text or "" for t in p.iterfind(".//a:t", NS)) for p in paragraphs).strip()
+
+    rpr = el.find(".//a:r/a:rPr", NS)
+    if rpr is None:
+        rpr = el.find(".//a:endParaRPr", NS)
+    if rpr is not None:
+        latin = rpr.find("a:latin", NS)
+        font["name"] = latin.get("typeface") if latin is not None else None
+        font["size"] = int(rpr.get("sz")) / 100 if rpr.get("sz") else None
+        font["bold"] = rpr.get("b") in ("1", "true")
+        font["italic"] = rpr.get("i") in ("1", "true")
+
+    ppr = el.find(".//a:p/a:pPr[@algn]", NS)
+    text_align = _ALIGN_MAP.get(ppr.get("algn")) if ppr is not None else None
+    return text, font, text_align
+
+def _find_overlaps(entries: List[Dict[str, Any]], ancestors: Dict[str, set]):
+    """Sweep-line overlap detection on the x axis; same edge semantics as isOverlapping() in the add-in."""
+    order = sorted(range(len(entries)), key=lambda i: entries[i]["left"])
+    for pos, i in enumerate(order):
+        a = entries[i]
+        a_right = a["left"] + a["width"]
+        for j in order[pos + 1:]:
+            b = entries[j]
+            if b["left"] > a_right:
+                break
+            if a["top"] + a["height"] < b["top"] or a["top"] > b["top"] + b["height"]:
+                continue
+            if a["id"] in ancestors[b["id"]] or b["id"] in ancestors[a["id"]]:
+                continue
+            a["overlapsWith"].append(b["id"])
+            b["overlapsWith"].append(a["id"])
+
+def extract_shape_metadata(slide_element, slide_index: int, placeholder_geometry: Optional[Dict[str, Box]] = None) -> List[Dict[str, Any]]:
+    """
+    Builds the same per-shape records the add-in's extractAllSlideShapes() uploads
+    (metadata_N.json), directly from a slide's <p:sld> element. Group children are
+    included with parentGroupId set and coordinates mapped out of the group's
+    child coordinate space.
+    """
+    placeholder_geometry = placeholder_geometry or {}
+    entries: List[Dict[str, Any]] = []
+    ancestors: Dict[str, set] = {}
+
+    def walk(container, parent_id: Optional[str], parent_chain: set, transform):
+        for el in container:
+            if el.tag not in _SHAPE_TAGS:
+                continue
+            c_nv_pr = el.find("./*/p:cNvPr", NS)
+            if c_nv_pr is None:
+                continue
+            shape_id = c_nv_pr.get("id", "")
+            box, child_space = _xfrm(el)
+            if box is None:
+                ph = el.find("./*/p:nvPr/p:ph", NS)
+                if ph is not None:
+                    box = placeholder_geometry.get(f"idx:{ph.get('idx', '0')}") or placeholder_geometry.get(f"type:{ph.get('type', 'body')}")
+            x, y, cx, cy = transform(box) if box else (0, 0, 0, 0)
+
+            shape_type = _shape_type(el)
+            text, font, text_align = _text_and_font(el) if shape_type != "Group" else ("", {"name": None, "size": None, "bold": False, "italic": False}, None)
+            name = c_nv_pr.get("name", "")
+            entries.append({
+                "id": shape_id,
+                "name": f"Google Shape;{shape_id};p{slide_index + 1}",
+                "parentGroupId": parent_id,
+                "top": y / EMU_PER_PX,
+                "left": x / EMU_PER_PX,
+                "width": cx / EMU_PER_PX,
+                "height": cy / EMU_PER_PX,
+                "text": text,
+                "type": shape_type,
+                "altText": c_nv_pr.get("descr", ""),
+                "zIndex": len(entries),
+                "isLikelyIcon": shape_type == "Graphic" or "icon" in name.lower(),
+                "slideIndex": slide_index,
+                "overlapsWith": [],
+                "font": font,
+                "textAlign": text_align,
+            })
+            ancestors[shape_id] = parent_chain
+
+            if shape_type == "Group" and box:
+                child_transform = transform
+                if child_space and child_space[2] and child_space[3]:
+                    ch_x, ch_y, ch_cx, ch_cy = child_space
+                    sx, sy = box[2] / ch_cx, box[3] / ch_cy
+
+                    def child_transform(child_box, _outer=transform, _box=box, _ch=(ch_x, ch_y), _s=(sx, sy)):
+                        return _outer((
+                            _box[0] + (child_box[0] - _ch[0]) * _s[0],
+                            _box[1] + (child_box[1] - _ch[1]) * _s[1],
+                            child_box[2] * _s[0],
+                            child_box[3] * _s[1],
+                        ))
+                walk(el, shape_id, parent_chain | {shape_id}, child_transform)
+
+    sp_tree = slide_element.find("p:cSld/p:spTree", NS)
+    if sp_tree is None:
+        logger.warning(f"Slide {slide_index} has no shape tree.")
+        return []
+    walk(sp_tree, None, set(), lambda box: box)
+    _find_overlaps(entries, ancestors)
+    return entries
@@ -0,0 +1,131 @@
+# utils/shape_table.py
+import json
+from typing import Any, Dict, Iterable, List, Optional
+import numpy as np
+
+GEOMETRY_FIELDS = ("left", "top", "width", "height")
+_GEOMETRY_COLUMN = {name: col for col, name in enumerate(GEOMETRY_FIELDS)}
+PROMPT_PRECISION = 2
+
+class ShapeTable:
+    """
+    Struct-of-arrays view of one slide's shapes for simulation hot loops.
+
+    Geometry lives in an (n, 4) float64 array addressed through an id -> row index;
+    every other field is kept in the shared, read-only source records. A snapshot
+    copies only the geometry array (plus any per-row overrides), and prompt
+    serialization reuses the pre-encoded static part of each record.
+    """
+    def __init__(self, shapes: List[Dict[str, Any]]):
+        self.ids: List[str] = [str(shape.get("id", "")) for shape in shapes]
+        self.index: Dict[str, int] = {shape_id: row for row, shape_id in enumerate(self.ids)}
+        self.geometry = np.array(
+            [[_as_float(shape.get(name)) for name in GEOMETRY_FIELDS] for shape in shapes], dtype=np.float64
+        ).reshape(len(shapes), len(GEOMETRY_FIELDS))
+        self._records = shapes
+        self._overrides: Dict[int, Dict[str, Any]] = {}
+        self._static_json: Optional[List[str]] = None
+
+    @classmethod
+    def _from_parts(cls, other: "ShapeTable") -> "ShapeTable":
+        table = cls.__new__(cls)
+        table.ids, table.index, table._records, table._static_json = other.ids, other.index, other._records, other._static_json
+        table.geometry = other.geometry.copy()
+        table._overrides = {row: dict(values) for row, values in other._overrides.items()}
+        return table
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __bool__(self) -> bool:
+        return bool(self.ids)
+
+    def snapshot(self) -> "ShapeTable":
+        return ShapeTable._from_parts(self)
+
+    # --- Reads ---
+    def has(self, shape_id: str, prop: str) -> bool:
+        row = self.index.get(str(shape_id))
+        return row is not None and (prop in _GEOMETRY_COLUMN or prop in self._records[row] or prop in self._overrides.get(row, {}))
+
+    def get(self, shape_id: str) -> Optional[Dict[str, Any]]:
+        row = self.index.get(str(shape_id))
+        return self._record(row) if row is not None else None
+
+    def _record(self, row: int) -> Dict[str, Any]:
+        record = dict(self._records[row])
+        record.update((name, v) for name, v in zip(GEOMETRY_FIELDS, self.geometry[row].tolist()) if v == v)
+        record.update(self._overrides.get(row, {}))
+        return record
+
+    def to_list(self) -> List[Dict[str, Any]]:
+        return [self._record(row) for row in range(len(self.ids))]
+
+    # --- Writes ---
+    def rows_for(self, shape_ids: Iterable[str]) -> np.ndarray:
+        return np.fromiter((self.index[i] for i in map(str, shape_ids) if i in self.index), dtype=np.intp)
+
+    def update(self, shape_ids: Iterable[str], prop: str, value: Any) -> List[str]:
+        """Sets one property on many shapes; geometry columns are updated in a single vectorized assignment."""
+        shape_ids = [str(i) for i in shape_ids]
+        found = [i for i in shape_ids if i in self.index]
+        if prop in _GEOMETRY_COLUMN:
+            self.geometry[self.rows_for(found), _GEOMETRY_COLUMN[prop]] = float(value)
+        else:
+            for shape_id in found:
+                self._overrides.setdefault(self.index[shape_id], {})[prop] = value
+        return found
+
+    def translate(self, shape_ids: Iterable[str], dx: float = 0.0, dy: float = 0.0):
+        rows = self.rows_for(shape_ids)
+        self.geometry[rows, 0] += dx
+        self.geometry[rows, 1] += dy
+
+    def scale(self, shape_ids: Iterable[str], sx: float = 1.0, sy: float = 1.0):
+        rows = self.rows_for(shape_ids)
+        self.geometry[rows, 2] *= sx
+        self.geometry[rows, 3] *= sy
+
+    # --- Serialization ---
+    def _static_fragments(self) -> List[str]:
+        if self._static_json is None:
+            fragments = []
+            for record in self._records:
+                static = {k: v for k, v in record.items() if k not in _GEOMETRY_COLUMN and k != "id" and not _is_empty(v)}
+                if isinstance(static.get("font"), dict):
+                    font = {k: v for k, v in static.pop("font").items() if not _is_empty(v)}
+                    if font:
+                        static["font"] = font
+                fragments.append(json.dumps(static, separators=(",", ":"), ensure_ascii=False)[1:-1])
+            self._static_json = fragments
+        return self._static_json
+
+    def to_prompt_json(self) -> str:
+        """
+        Compact JSON array for prompts: geometry rounded to PROMPT_PRECISION, empty/default
+        fields dropped, no indentation. Static fields are encoded once per table lineage.
+        """
+        fragments = self._static_fragments()
+        geometry = np.round(self.geometry, PROMPT_PRECISION).tolist()
+        parts = []
+        for row, shape_id in enumerate(self.ids):
+            head = f'{{"id":{json.dumps(shape_id)},' + ",".join(f'"{name}":{_fmt(v)}' for name, v in zip(GEOMETRY_FIELDS, geometry[row]))
+            extra = fragments[row]
+            if row in self._overrides:
+                extra = json.dumps({**json.loads("{" + extra + "}"), **self._overrides[row]}, separators=(",", ":"), ensure_ascii=False)[1:-1]
+            parts.append(head + ("," + extra if extra else "") + "}")
+        return "[" + ",".join(parts) + "]"
+
+def _as_float(value: Any) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return float("nan")
+
+def _is_empty(value: Any) -> bool:
+    return value is None or value is False or (isinstance(value, (str, list, dict)) and not value)
+
+def _fmt(value: float) -> str:
+    if value != value:
+        return "null"
+    return str(int(value)) if value == int(value) else repr(value)
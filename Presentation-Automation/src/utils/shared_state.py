@@ -0,0 +1,76 @@
+# utils/shared_state.py
+import os, sqlite3, threading, logging
+from typing import Optional
+from utils.metadata_store import METADATA_DB_PATH
+
+logger = logging.getLogger(__name__)
+
+# Per-deck state that every worker process must agree on. Lives next to the shape metadata in the
+# same SQLite file (WAL), so one local database backs a multi-worker node.
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS deck_state (
+    deck_id TEXT PRIMARY KEY,
+    generation INTEGER NOT NULL DEFAULT 0,
+    metadata_cleared INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+class SharedState:
+    """
+    - generation: bumped whenever a deck's slide files are replaced; workers compare it with the
+      generation their in-memory slide contexts were loaded at and reload when it moved.
+    - metadata_cleared: whether the first per-slide metadata upload since the deck's slides were
+      last replaced already cleared its old metadata, so only one worker does it. Reset by every
+      generation bump, so each re-upload starts a new metadata session.
+    """
+    def __init__(self, db_path: str = METADATA_DB_PATH):
+        if db_path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        if db_path != ":memory:":
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+
+    def generation(self, deck_id: str) -> int:
+        with self._lock:
+            row = self._conn.execute("SELECT generation FROM deck_state WHERE deck_id = ?", (deck_id,)).fetchone()
+        return row[0] if row else 0
+
+    def bump_generation(self, deck_id: str) -> int:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO deck_state (deck_id, generation) VALUES (?, 1) "
+                "ON CONFLICT(deck_id) DO UPDATE SET generation = generation + 1, metadata_cleared = 0",
+                (deck_id,),
+            )
+            return self._conn.execute("SELECT generation FROM deck_state WHERE deck_id = ?", (deck_id,)).fetchone()[0]
+
+    def claim_metadata_clear(self, deck_id: str) -> bool:
+        """True for exactly one caller per deck: the one that should clear the old metadata."""
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "INSERT INTO deck_state (deck_id, metadata_cleared) VALUES (?, 1) "
+                "ON CONFLICT(deck_id) DO UPDATE SET metadata_cleared = 1 WHERE metadata_cleared = 0",
+                (deck_id,),
+            )
+            return cursor.rowcount == 1
+
+    def mark_metadata_cleared(self, deck_id: str):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO deck_state (deck_id, metadata_cleared) VALUES (?, 1) "
+                "ON CONFLICT(deck_id) DO UPDATE SET metadata_cleared = 1",
+                (deck_id,),
+            )
+
+_state: Optional[SharedState] = None
+_state_lock = threading.Lock()
+
+def get_shared_state() -> SharedState:
+    global _state
+    if _state is None:
+        with _state_lock:
+            if _state is None:
+                _state = SharedState()
+    return _state
@@ -0,0 +1,81 @@
+# utils/slide_manifest.py
+import os, json, hashlib, logging
+from io import BytesIO
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from PIL import Image
+
+from config.config import SLIDE_WIDTH_PX, SLIDE_HEIGHT_PX
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_VERSION = 1
+_HASH_SIZE = 8
+_DCT_SIZE = 32
+
+def _dct_matrix(n: int) -> np.ndarray:
+    k = np.arange(n)[:, None]
+    matrix = np.cos(np.pi * k * (2 * np.arange(n)[None, :] + 1) / (2 * n)) * np.sqrt(2.0 / n)
+    matrix[0] /= np.sqrt(2.0)
+    return matrix
+
+_DCT = _dct_matrix(_DCT_SIZE)
+
+def perceptual_hash(image_bytes: bytes) -> str:
+    """
+    64-bit DCT perceptual hash (pHash) of a render as 16 hex chars. Identical-looking renders
+    hash the same even when the PNG bytes differ (encoder, metadata, anti-aliasing noise).
+    """
+    with Image.open(BytesIO(image_bytes)) as image:
+        small = image.convert("L").resize((_DCT_SIZE, _DCT_SIZE), Image.LANCZOS, reducing_gap=2.0)
+    pixels = np.asarray(small, dtype=np.float64)
+    low = (_DCT @ pixels @ _DCT.T)[:_HASH_SIZE, :_HASH_SIZE].flatten()
+    bits = low > np.median(low[1:])
+    return f"{int(''.join('1' if b else '0' for b in bits), 2):016x}"
+
+def byte_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+def slide_entry(image_bytes: bytes, slide_xml: Optional[str] = None) -> Dict[str, Any]:
+    """Manifest record for one rendered slide."""
+    entry = {"phash": perceptual_hash(image_bytes), "sha256": byte_hash(image_bytes)}
+    if slide_xml is not None:
+        entry["xml_sha256"] = byte_hash(slide_xml.encode("utf-8"))
+    return entry
+
+# --- Manifest file ---
+def load_manifest(path: str) -> Dict[int, Dict[str, Any]]:
+    """slide index -> entry; empty when the deck has never been ingested or the file is unreadable."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return {int(k): v for k, v in data.get("slides", {}).items()}
+    except FileNotFoundError:
+        return {}
+    except (ValueError, AttributeError) as e:
+        logger.warning(f"Ignoring unreadable slide manifest {path}: {e}")
+        return {}
+
+def save_manifest(path: str, slides: Dict[int, Dict[str, Any]], slide_size: Optional[Tuple[float, float]] = None):
+    """`slide_size` is the deck's (width, height) in metadata px, from p:sldSz."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    data = {"version": MANIFEST_VERSION, "slides": {str(k): v for k, v in sorted(slides.items())}}
+    if slide_size:
+        data["slide_size"] = list(slide_size)
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_path, path)
+
+def load_slide_size(path: str) -> Tuple[float, float]:
+    """(width, height) in metadata px of the deck's slides; the 16:9 default for decks known only from metadata."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            width, height = json.load(f)["slide_size"]
+        return float(width), float(height)
+    except (FileNotFoundError, KeyError, TypeError, ValueError):
+        return float(SLIDE_WIDTH_PX), float(SLIDE_HEIGHT_PX)
+
+def changed_slides(previous: Dict[int, Dict[str, Any]], current: Dict[int, Dict[str, Any]]) -> List[int]:
+    """Slides whose render looks different from the previous ingestion (or are new)."""
+    return sorted(i for i, entry in current.items() if previous.get(i, {}).get("phash") != entry.get("phash"))
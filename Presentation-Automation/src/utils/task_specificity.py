@@ -0,0 +1,59 @@
+# utils/task_specificity.py
+import json
+from typing import Any, Dict, Optional
+from config.config import DIRECT_TASKS_ENABLED
+
+# Classifier sub-tasks that are already fully specified ("Change title font to Arial 32pt") skip the
+# multimodal category-agent call: the task description is synthesized from action, target and params,
+# and the refiner resolves the target against the slide as usual.
+
+# action -> params of which at least one must carry a concrete value. Actions not listed here (general_*,
+# resolve_overlaps, insert_icons_contextual, ...) need the slide to be looked at and always go to the agent.
+_DIRECT_ACTIONS: Dict[str, tuple] = {
+    "change_font": ("font_name", "size", "font_size", "color", "color_hint", "bold", "italic", "underline"),
+    "change_font_size": ("size", "font_size"),
+    "change_font_color": ("color", "color_hint"),
+    "set_font_color": ("color", "color_hint"),
+    "set_text_color": ("color", "color_hint"),
+    "set_fill_color": ("color", "color_hint", "fill_color"),
+    "change_fill_color": ("color", "color_hint", "fill_color"),
+    "align_elements": ("alignment",),
+    "align_text": ("alignment",),
+    "distribute_elements": ("axis",),
+    "change_bullet_style": ("style",),
+    "set_line_spacing": ("spacing", "line_spacing"),
+    "resize_shape": ("width", "height", "scale"),
+    "standardize_font_size": ("size", "font_size"),
+}
+# Param values that ask for a judgement call rather than state one
+_VAGUE_VALUES = {"", "appropriate", "better", "professional", "modern", "consistent", "auto", "best", "nice", "suitable"}
+
+def _concrete(value: Any) -> bool:
+    if value is None:
+        return False
+    if isinstance(value, str):
+        return value.strip().lower() not in _VAGUE_VALUES
+    if isinstance(value, (list, dict)):
+        return bool(value)
+    return True
+
+def is_fully_specified(action: Optional[str], target_hint: Optional[str], params: Any) -> bool:
+    """True when a classifier sub-task can be handed to the refiner without a category-agent call."""
+    if not DIRECT_TASKS_ENABLED or not action or action not in _DIRECT_ACTIONS or not isinstance(params, dict):
+        return False
+    if not (isinstance(target_hint, str) and target_hint.strip()):
+        return False
+    if any(not _concrete(value) for value in params.values()):
+        return False
+    return any(_concrete(params.get(key)) for key in _DIRECT_ACTIONS[action])
+
+def synthesize_task_description(action: str, target_hint: Optional[str], params: Dict[str, Any],
+                                slide_number: Any, original_instruction: str) -> str:
+    """The single task description a category agent would have written (its Output A) for a specific sub-task."""
+    target = f"the element(s) matching '{target_hint}'" if target_hint else "all relevant elements"
+    settings = ", ".join(
+        f"{key.replace('_', ' ')} = {value if isinstance(value, (str, int, float)) else json.dumps(value)}"
+        for key, value in params.items()
+    )
+    return (f"On slide {slide_number}, apply '{action.replace('_', ' ')}' to {target}: {settings}. "
+            f"Leave all other properties and elements unchanged. User request: \"{original_instruction}\"")
@@ -0,0 +1,145 @@
+# utils/telemetry.py
+import functools, inspect, logging, time
+from contextlib import contextmanager
+from typing import Any, Iterable, Optional
+from opentelemetry import trace
+from config.config import OTEL_TRACES_EXPORTER
+from utils.metrics import observe_stage, observe_llm_call
+from utils.profiling import record_stage
+
+logger = logging.getLogger(__name__)
+
+SERVICE_NAME = "presentation-automation"
+tracer = trace.get_tracer(SERVICE_NAME)
+
+def setup_telemetry(app) -> bool:
+    """
+    Installs an SDK tracer provider and instruments the FastAPI app when OTEL_TRACES_EXPORTER is
+    "otlp" (OTLP/gRPC; endpoint from OTEL_EXPORTER_OTLP_ENDPOINT, default localhost:4317) or
+    "console". With "none" every span below is a no-op from the API package.
+    """
+    if OTEL_TRACES_EXPORTER in ("", "none"):
+        return False
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter
+    from opentelemetry.instrumentation.fastapi import FastAPIInstrumentor
+
+    if OTEL_TRACES_EXPORTER == "otlp":
+        from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
+        exporter = OTLPSpanExporter()
+    elif OTEL_TRACES_EXPORTER == "console":
+        exporter = ConsoleSpanExporter()
+    else:
+        logger.warning(f"Unknown OTEL_TRACES_EXPORTER '{OTEL_TRACES_EXPORTER}'; tracing disabled.")
+        return False
+
+    # Resource.create() also honours OTEL_SERVICE_NAME / OTEL_RESOURCE_ATTRIBUTES
+    provider = TracerProvider(resource=Resource.create({"service.name": SERVICE_NAME}))
+    provider.add_span_processor(BatchSpanProcessor(exporter))
+    trace.set_tracer_provider(provider)
+    FastAPIInstrumentor.instrument_app(app)
+    logger.info(f"OpenTelemetry tracing enabled ({OTEL_TRACES_EXPORTER} exporter).")
+    return True
+
+def traced(name: str, **attributes):
+    """
+    Decorator wrapping a sync or async function in a span with the given static attributes;
+    its duration is also observed in the pipeline_stage_seconds histogram under `name` and
+    logged for the request profile, if one is being taken.
+    """
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    with tracer.start_as_current_span(name, attributes=attributes):
+                        return await func(*args, **kwargs)
+                finally:
+                    elapsed = time.perf_counter() - start
+                    observe_stage(name, elapsed)
+                    record_stage(name, elapsed)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                with tracer.start_as_current_span(name, attributes=attributes):
+                    return func(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                observe_stage(name, elapsed)
+                record_stage(name, elapsed)
+        return wrapper
+    return decorator
+
+def set_span_attributes(**attributes):
+    """Adds attributes (None values skipped) to the current span, e.g. the slide a stage runs for."""
+    span = trace.get_current_span()
+    for key, value in attributes.items():
+        if value is not None:
+            span.set_attribute(key, value)
+
+def _image_bytes(contents: Iterable[Any]) -> int:
+    total = 0
+    for part in contents:
+        inline = getattr(part, "inline_data", None)
+        data = getattr(inline, "data", None)
+        if isinstance(data, (bytes, bytearray)):
+            total += len(data)
+    return total
+
+class _LLMSpan:
+    """Span proxy that remembers whether the call was marked as a cache hit, for the metrics."""
+    def __init__(self, span):
+        self.span = span
+        self.cache_hit = False
+
+    def set_attribute(self, key: str, value: Any):
+        if key == "llm.cache_hit":
+            self.cache_hit = bool(value)
+        self.span.set_attribute(key, value)
+
+@contextmanager
+def llm_span(name: str, model: str, contents: Iterable[Any]):
+    """
+    Span for one LLM call: model, prompt size in characters and inline image bytes. Callers
+    add the outcome with record_llm_response() and mark cache hits with llm.cache_hit.
+    Calls, latency, errors (429s separately) and cache hits are counted per call site
+    (the span name without its "llm." prefix).
+    """
+    contents = list(contents)
+    attributes = {
+        "llm.model": model,
+        "llm.prompt_chars": sum(len(part) for part in contents if isinstance(part, str)),
+        "llm.image_bytes": _image_bytes(contents),
+        "llm.cache_hit": False,
+    }
+    call_site = name.split(".", 1)[-1]
+    start, error = time.perf_counter(), None
+    with tracer.start_as_current_span(name, attributes=attributes) as span:
+        proxy = _LLMSpan(span)
+        try:
+            yield proxy
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            observe_llm_call(call_site, elapsed, error=error, cache_hit=proxy.cache_hit)
+            record_stage(name, elapsed)
+
+def record_llm_response(span, response: Any, text: Optional[str] = None):
+    """Token counts from a google-genai response's usage_metadata, plus the response length."""
+    usage = getattr(response, "usage_metadata", None)
+    if usage is not None:
+        for attribute, field in (("llm.input_tokens", "prompt_token_count"),
+                                 ("llm.output_tokens", "candidates_token_count"),
+                                 ("llm.total_tokens", "total_token_count")):
+            value = getattr(usage, field, None)
+            if value is not None:
+                span.set_attribute(attribute, value)
+    if text is not None:
+        span.set_attribute("llm.response_chars", len(text))
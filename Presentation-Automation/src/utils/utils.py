@@ -1,23 +1,31 @@
-import os, logging, zipfile, subprocess, base64, pptx
+import os, json, logging, subprocess, base64, pathlib
 from io import BytesIO
-from typing import Tuple, Dict
-from pptx import Presentation
+from typing import Tuple, Dict, List, Optional
 from lxml import etree
 from pdf2image import convert_from_path
-import xml.dom.minidom
-from config.config import LIBREOFFICE_PATH
+from config.config import LIBREOFFICE_PATH, RENDER_DPI
+from utils.shape_metadata import extract_shape_metadata, layout_placeholder_geometry
+from utils.image_prep import model_image_mime, model_image_suffix, prepare_model_image
+from utils.pptx_reader import SlideReader
+from utils.slide_manifest import slide_entry
+from utils.derived_cache import read_derived, write_derived
+from utils.telemetry import traced
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
-def convert_pptx_to_pdf(pptx_path: str, output_dir: str) -> str:
+@traced("ingest.convert_pdf")
+def convert_pptx_to_pdf(pptx_path: str, output_dir: str, profile_dir: Optional[str] = None) -> str:
     logger = logging.getLogger(__name__)
     os.makedirs(output_dir, exist_ok=True)
     abs_pptx_path = os.path.abspath(pptx_path)
     abs_output_dir = os.path.abspath(output_dir)
 
-    command = [
-        "soffice",
+    command = ["soffice"]
+    if profile_dir:
+        # A private LibreOffice profile per workspace lets conversions for different decks run side by side.
+        command.append(f"-env:UserInstallation={pathlib.Path(os.path.abspath(profile_dir)).as_uri()}")
+    command += [
         "--headless",
         "--convert-to", "pdf",
         "--outdir", abs_output_dir,
@@ -44,13 +52,12 @@ def convert_pptx_to_pdf(pptx_path: str, output_dir: str) -> str:
 def extract_slide_xml_from_ppt(pptx_path: str, slide_number: int) -> str:
     try:
         slide_filename = f"ppt/slides/slide{slide_number}.xml"
-        with zipfile.ZipFile(pptx_path, 'r') as zip_ref:
-            if slide_filename not in zip_ref.namelist():
+        with SlideReader(pptx_path) as reader:
+            try:
+                slide_element = reader.part(slide_filename)
+            except KeyError:
                 raise FileNotFoundError(f"Slide XML not found: {slide_filename}")
-
-            xml_content = zip_ref.read(slide_filename)
-            dom = xml.dom.minidom.parseString(xml_content)
-            pretty_xml = dom.toprettyxml()
+            pretty_xml = etree.tostring(slide_element, encoding='unicode', pretty_print=True, method='xml')
 
             logger.info(f"Extracted XML for slide {slide_number}")
             return pretty_xml
@@ -58,20 +65,19 @@ def extract_slide_xml_from_ppt(pptx_path: str, slide_number: int) -> str:
         logger.exception(f"Failed to extract XML for slide {slide_number}")
         raise
 
-def extract_slide_xml(prs: Presentation, slide_index: int) -> str:
+def extract_slide_xml(reader: SlideReader, slide_index: int) -> str:
     try:
-        slide = prs.slides[slide_index]
-        slide_element = slide._element
-        xml = etree.tostring(slide_element, encoding='unicode', pretty_print=True, method='xml')
+        xml = reader.slide_xml(slide_index)
         logger.info(f"Extracted XML using lxml for slide index {slide_index}")
         return xml
     except Exception as e:
         logger.exception(f"Error extracting XML using lxml for slide {slide_index}")
         raise
 
+@traced("ingest.rasterize")
 def generate_slide_image(pdf_path: str, slide_index: int) -> Tuple[str, bytes]:
     try:
-        images = convert_from_path(pdf_path, first_page=slide_index + 1, last_page=slide_index + 1)
+        images = convert_from_path(pdf_path, dpi=RENDER_DPI, first_page=slide_index + 1, last_page=slide_index + 1)
         image = images[0]
         buffered = BytesIO()
         image.save(buffered, format="PNG")
@@ -82,7 +88,20 @@ def generate_slide_image(pdf_path: str, slide_index: int) -> Tuple[str, bytes]:
         logger.exception(f"Error generating image for slide index {slide_index}")
         raise
 
-def generate_slide_context(prs: Presentation, slide_number: int, pdf_path: str, output_dir: str) -> Dict:
+@traced("ingest.metadata")
+def generate_slide_metadata(reader: SlideReader, slide_index: int, metadata_dir: str) -> List[Dict]:
+    """Writes metadata_N.json for a slide from its XML, mirroring what the add-in would upload."""
+    placeholder_geometry = layout_placeholder_geometry(reader.layout_element(slide_index), reader.master_element(slide_index))
+    shapes = extract_shape_metadata(reader.slide_element(slide_index), slide_index, placeholder_geometry)
+    os.makedirs(metadata_dir, exist_ok=True)
+    metadata_path = os.path.join(metadata_dir, f"metadata_{slide_index}.json")
+    with open(metadata_path, "w", encoding="utf-8") as f:
+        json.dump(shapes, f, separators=(",", ":"))
+    logger.info(f"Saved {len(shapes)} shape records for slide {slide_index} to {metadata_path}")
+    return shapes
+
+@traced("ingest.slide")
+def generate_slide_context(reader: SlideReader, slide_number: int, pdf_path: str, output_dir: str, metadata_dir: Optional[str] = None) -> Dict:
     try:
         slide_index = slide_number 
         os.makedirs(output_dir, exist_ok=True)
@@ -101,16 +120,40 @@ def generate_slide_context(prs: Presentation, slide_number: int, pdf_path: str,
         logger.info(f"Saved base64 image data for slide {slide_number} to {txt_file_path}")
 
         # Generate XML
-        xml_string = extract_slide_xml(prs, slide_index)
+        xml_string = extract_slide_xml(reader, slide_index)
         xml_path = os.path.join(output_dir, f"slide{slide_number}.xml")
         with open(xml_path, "w", encoding="utf-8") as f:
             f.write(xml_string)
         logger.info(f"Saved XML for slide {slide_number} to {xml_path}")
 
+        # Render hashes for the slide manifest: the perceptual hash only detects visual changes between
+        # uploads; the sha256 of the render keys everything derived from it
+        manifest_entry = slide_entry(img_bytes, xml_string)
+
+        # Model-sized variant used by every LLM call; the PNG above stays full resolution for display
+        model_mime = model_image_mime()
+        model_bytes = read_derived(manifest_entry["sha256"], f"model{model_image_suffix()}")
+        if model_bytes is None:
+            model_bytes, model_mime = prepare_model_image(img_bytes)
+            write_derived(manifest_entry["sha256"], f"model{model_image_suffix()}", model_bytes)
+        model_path = os.path.join(output_dir, f"slide{slide_number}{model_image_suffix()}")
+        with open(model_path, "wb") as f:
+            f.write(model_bytes)
+        logger.info(f"Saved model image for slide {slide_number} to {model_path} ({len(img_bytes)} -> {len(model_bytes)} bytes)")
+
+        # Shape metadata from the same parsed slide, so the add-in doesn't have to walk every slide first
+        shape_metadata = generate_slide_metadata(reader, slide_index, metadata_dir) if metadata_dir else None
+
         return {
             "slide_xml_structure": xml_string,
             "slide_image_base64": base64_image,
-            "slide_image_bytes": img_bytes
+            "slide_image_bytes": img_bytes,
+            "slide_model_image_bytes": model_bytes,
+            "slide_model_image_mime": model_mime,
+            "slide_image_phash": manifest_entry["phash"],
+            "slide_image_sha256": manifest_entry["sha256"],
+            "manifest_entry": manifest_entry,
+            "shape_metadata": shape_metadata
         }
     except Exception as e:
         logger.error(f"Failed to generate context for slide {slide_number}")
@@ -122,14 +165,14 @@ def update_slide_context_and_save_to_disk(pptx_path: str, base_output_dir: str)
         slide_dir = os.path.join(base_output_dir, pptx_filename)
         os.makedirs(slide_dir, exist_ok=True)
         pdf_path = convert_pptx_to_pdf(pptx_path, output_dir=slide_dir)
-        prs = pptx.Presentation(pptx_path)
         slide_context_cache = {}
 
-        for idx, _ in enumerate(prs.slides):
-            slide_number = idx + 1
-            context = generate_slide_context(prs, slide_number, pdf_path, slide_dir)
-            slide_context_cache[slide_number] = context
-            logger.info(f"Context saved for slide {slide_number}")
+        with SlideReader(pptx_path) as reader:
+            for idx in range(len(reader)):
+                slide_number = idx + 1
+                context = generate_slide_context(reader, slide_number, pdf_path, slide_dir)
+                slide_context_cache[slide_number] = context
+                logger.info(f"Context saved for slide {slide_number}")
 
         return slide_context_cache, pdf_path
     except Exception as e:
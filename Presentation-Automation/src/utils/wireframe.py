@@ -0,0 +1,102 @@
+# utils/wireframe.py
+import logging
+from io import BytesIO
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+from PIL import Image, ImageDraw, ImageFont
+from config.config import SLIDE_WIDTH_PX, SLIDE_HEIGHT_PX, WIREFRAME_SCALE
+
+logger = logging.getLogger(__name__)
+
+_FILLS = {
+    "Image": (215, 215, 215), "Graphic": (215, 215, 215), "Chart": (220, 230, 242),
+    "Table": (232, 240, 228), "SmartArt": (240, 232, 220), "Placeholder": (250, 250, 240),
+    "GeometricShape": (236, 240, 248), "Freeform": (236, 240, 248),
+}
+_OUTLINE = (60, 60, 60)
+_GROUP_OUTLINE = (150, 150, 150)
+_HIGHLIGHT = (220, 30, 30)
+_TEXT = (30, 30, 30)
+_EXCERPT_CHARS = 60
+_fonts: Dict[int, Any] = {}
+
+def _font(size: int):
+    if size not in _fonts:
+        try:
+            _fonts[size] = ImageFont.load_default(size=size)
+        except TypeError:  # Pillow < 10.1 has no scalable default font
+            _fonts[size] = ImageFont.load_default()
+    return _fonts[size]
+
+def _box(shape: Dict[str, Any]) -> Optional[Tuple[float, float, float, float]]:
+    try:
+        left, top = float(shape["left"]), float(shape["top"])
+        return left, top, left + float(shape["width"]), top + float(shape["height"])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+def render_wireframe(shapes: Iterable[Dict[str, Any]], scale: float = WIREFRAME_SCALE,
+                     highlight_ids: Optional[Set[str]] = None, slide_size: Optional[Tuple[float, float]] = None) -> Image.Image:
+    """
+    Draws a wireframe of a slide from its shape metadata alone: boxes filled by shape type in
+    z-order, a one-line text excerpt at the shape's font size, and the shape id. Highlighted ids
+    get a red outline. The canvas is the slide size (`slide_size`, see slide_manifest.load_slide_size;
+    16:9 by default), grown if shapes extend past it.
+    """
+    slide_width, slide_height = slide_size or (SLIDE_WIDTH_PX, SLIDE_HEIGHT_PX)
+    shapes = sorted((s for s in shapes if _box(s)), key=lambda s: s.get("zIndex", 0))
+    highlight_ids = highlight_ids or set()
+    right = max([slide_width] + [_box(s)[2] for s in shapes])
+    bottom = max([slide_height] + [_box(s)[3] for s in shapes])
+    image = Image.new("RGB", (int(right * scale) + 1, int(bottom * scale) + 1), (255, 255, 255))
+    draw = ImageDraw.Draw(image)
+    id_font = _font(max(8, int(8 * scale)))
+
+    for shape in shapes:
+        x0, y0, x1, y1 = (v * scale for v in _box(shape))
+        x1, y1 = max(x0, x1), max(y0, y1)
+        shape_id, shape_type = str(shape.get("id", "")), shape.get("type")
+        highlighted = shape_id in highlight_ids
+        outline = _HIGHLIGHT if highlighted else (_GROUP_OUTLINE if shape_type == "Group" else _OUTLINE)
+        if shape_type == "Group":
+            draw.rectangle((x0, y0, x1, y1), outline=outline, width=2 if highlighted else 1)
+            continue
+        draw.rectangle((x0, y0, x1, y1), fill=_FILLS.get(shape_type), outline=outline, width=2 if highlighted else 1)
+        if shape_type in ("Image", "Graphic"):
+            draw.line((x0, y0, x1, y1), fill=_GROUP_OUTLINE)
+            draw.line((x0, y1, x1, y0), fill=_GROUP_OUTLINE)
+
+        text = (shape.get("text") or "").split("\n", 1)[0][:_EXCERPT_CHARS]
+        if text and x1 - x0 > 4:
+            font_info = shape.get("font") or {}
+            font = _font(max(6, int(float(font_info.get("size") or 12) * scale)))
+            while text and draw.textlength(text, font=font) > x1 - x0 - 4:
+                text = text[:-1]
+            if text:
+                draw.text((x0 + 2, y0 + 2), text, fill=_TEXT, font=font)
+        draw.text((x0 + 1, y1 - 1), shape_id, fill=outline, font=id_font, anchor="lb")
+    return image
+
+def changed_shape_ids(before: List[Dict[str, Any]], after: List[Dict[str, Any]]) -> Set[str]:
+    """Ids whose geometry or text differs between two metadata states."""
+    previous = {str(s.get("id")): s for s in before}
+    keys = ("left", "top", "width", "height", "text")
+    return {
+        str(s.get("id")) for s in after
+        if str(s.get("id")) not in previous or any(previous[str(s.get("id"))].get(k) != s.get(k) for k in keys)
+    }
+
+def render_before_after(before: List[Dict[str, Any]], after: List[Dict[str, Any]], scale: float = WIREFRAME_SCALE,
+                        slide_size: Optional[Tuple[float, float]] = None) -> Image.Image:
+    """Before and after wireframes side by side, with changed shapes highlighted in both."""
+    changed = changed_shape_ids(before, after)
+    left, right = render_wireframe(before, scale, changed, slide_size), render_wireframe(after, scale, changed, slide_size)
+    gap = int(16 * scale)
+    combined = Image.new("RGB", (left.width + gap + right.width, max(left.height, right.height)), (128, 128, 128))
+    combined.paste(left, (0, 0))
+    combined.paste(right, (left.width + gap, 0))
+    return combined
+
+def wireframe_png(image: Image.Image) -> bytes:
+    buffered = BytesIO()
+    image.save(buffered, format="PNG", optimize=False, compress_level=1)
+    return buffered.getvalue()
@@ -0,0 +1,116 @@
+# utils/workspace.py
+import os, re, asyncio, logging
+from typing import Dict
+from fastapi import HTTPException, status
+try:
+    import fcntl
+except ImportError:  # Windows dev setups run a single worker
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# --- Configuration ---
+WORKSPACE_ROOT = "./uploaded_pptx/decks"
+DEFAULT_DECK_ID = "default"
+DECK_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+_deck_locks: Dict[str, asyncio.Lock] = {}
+
+class DeckLock:
+    """
+    Per-deck lock held across worker processes: an asyncio.Lock orders coroutines within this
+    process, then a non-blocking flock on <deck root>/.lock, polled without blocking the event
+    loop, orders the processes.
+    """
+    POLL_SECONDS = 0.05
+
+    def __init__(self, deck_id: str, path: str):
+        self.path = path
+        self._local = _deck_locks.get(deck_id)
+        if self._local is None:
+            self._local = _deck_locks[deck_id] = asyncio.Lock()
+        self._fd = None
+
+    async def __aenter__(self):
+        await self._local.acquire()
+        if fcntl is None:
+            return self
+        fd = None
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            while True:
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    break
+                except BlockingIOError:
+                    await asyncio.sleep(self.POLL_SECONDS)
+        except BaseException:
+            if fd is not None:
+                os.close(fd)
+            self._local.release()
+            raise
+        self._fd = fd
+        return self
+
+    async def __aexit__(self, *exc_info):
+        try:
+            if self._fd is not None:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+                os.close(self._fd)
+                self._fd = None
+        finally:
+            self._local.release()
+
+def discard_lock(key: str):
+    """Drops the in-process lock for a key that will not be locked again (e.g. a finished upload)."""
+    lock = _deck_locks.get(key)
+    if lock is not None and not lock.locked():
+        del _deck_locks[key]
+
+class Workspace:
+    """
+    On-disk layout for a single deck/session. Every path the upload routes,
+    context loader and agents read or write is derived from here, so two decks
+    never share a directory.
+    """
+    def __init__(self, deck_id: str = DEFAULT_DECK_ID, root: str = WORKSPACE_ROOT):
+        if not DECK_ID_PATTERN.match(deck_id or ""):
+            raise ValueError(f"Invalid deck id: {deck_id!r}")
+        self.deck_id = deck_id
+        self.root = os.path.join(root, deck_id)
+        self.slides_dir = os.path.join(self.root, "slide_images", "presentation")
+        self.metadata_dir = os.path.join(self.root, "slide_images", "metadata")
+        self.pdf_dir = os.path.join(self.slides_dir, "converted_pdfs")
+        # Per-slide render hashes from the last ingestion; kept across re-uploads to detect unchanged slides
+        self.manifest_path = os.path.join(self.root, "manifest.json")
+
+    def __repr__(self) -> str:
+        return f"Workspace(deck_id={self.deck_id!r})"
+
+    def pptx_path(self, filename: str = "presentation.pptx") -> str:
+        return os.path.join(self.root, os.path.basename(filename))
+
+    def slide_file(self, slide_number: int, suffix: str) -> str:
+        """e.g. slide_file(3, ".xml") -> .../slide3.xml, slide_file(3, "_tasks.json") -> .../slide3_tasks.json"""
+        return os.path.join(self.slides_dir, f"slide{slide_number}{suffix}")
+
+    def metadata_file(self, slide_number: int) -> str:
+        return os.path.join(self.metadata_dir, f"metadata_{slide_number}.json")
+
+    def ensure_dirs(self):
+        for path in (self.root, self.slides_dir, self.metadata_dir):
+            os.makedirs(path, exist_ok=True)
+
+    @property
+    def lock(self) -> DeckLock:
+        """Serializes ingestion for this deck only, across all workers; other decks proceed concurrently."""
+        return DeckLock(self.deck_id, os.path.join(self.root, ".lock"))
+
+def get_workspace(deck_id: str = DEFAULT_DECK_ID) -> Workspace:
+    """Resolves a deck id from a request into a Workspace, rejecting ids that could escape the root."""
+    try:
+        return Workspace(deck_id)
+    except ValueError as e:
+        logger.warning(f"Rejected workspace request: {e}")
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))